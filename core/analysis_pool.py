@@ -0,0 +1,221 @@
+"""
+analysis_pool.py — 多痛點分析的執行層
+
+一次 /api/analyze 可能帶有多個痛點。每個痛點的本地引擎
+（jieba 斷詞、TF-IDF 匹配、動態組裝）是 CPU 密集工作，
+在處理請求的執行緒中依序執行無法利用多核心。
+
+此模組：
+  1. 把各痛點的本地引擎（roadmap_generator.build_local_stage）交給
+     預先暖機的 ProcessPoolExecutor 平行執行
+  2. 每個痛點的本地結果一完成，就在父程序的 event loop 上發出社群搜尋
+     （I/O 密集，與其他痛點的本地引擎同時進行）
+  3. 整個請求有截止時間；逾時時取消尚未完成的工作：本地結果已完成的
+     痛點仍會回傳（社群結果為空），其餘為 None。用戶端斷線時全部取消
+  4. lazy 模式：社群結果只含重排序後的摘要（不抓詳情），並以分頁回傳；
+     其餘頁由 /api/community/candidates 取得，詳情由 /api/community/<id> 按需取得
+
+子程序數由環境變數 N8N_CONSULTANT_POOL_WORKERS 設定（預設 CPU 數；
+0 = 不使用子程序，改在父程序的執行緒中執行）。
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from core import profiling
+from core.n8n_async import CANCEL_POLL_INTERVAL, AsyncN8nClient
+from core.request_log import stage
+from core.roadmap_generator import assemble_roadmap, build_local_stage
+
+log = logging.getLogger(__name__)
+
+# 單一請求（所有痛點）的截止時間（秒）
+REQUEST_DEADLINE = 30.0
+# 每個痛點取回的社群模板數
+COMMUNITY_RESULTS = 5
+# lazy 模式每頁的社群摘要數與上限
+COMMUNITY_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 20
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _warm_worker():
+    """子程序啟動時預先載入 jieba 詞典與方案庫索引"""
+    build_local_stage("每天手動整理客戶資料，希望自動寄送週報", "")
+
+
+def default_workers():
+    value = os.environ.get("N8N_CONSULTANT_POOL_WORKERS")
+    return int(value) if value not in (None, "") else (os.cpu_count() or 1)
+
+
+def get_pool(workers=None):
+    """
+    取得程序共用的子程序池（第一次使用時建立並暖機）。
+
+    Returns
+    -------
+    ProcessPoolExecutor or None — workers 為 0 時回傳 None
+    """
+    global _pool, _pool_workers
+    workers = default_workers() if workers is None else workers
+    if workers <= 0:
+        return None
+    if _pool is None or _pool_workers != workers:
+        with _pool_lock:
+            if _pool is None or _pool_workers != workers:
+                if _pool is not None:
+                    _pool.shutdown(wait=False, cancel_futures=True)
+                # spawn：不複製父程序的執行緒與 SQLite / socket 狀態
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_warm_worker,
+                )
+                _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_workers = None
+
+
+def paginate(items, page=1, page_size=COMMUNITY_PAGE_SIZE):
+    """
+    Returns
+    -------
+    (list, dict) — 該頁項目與分頁資訊 {page, page_size, total, has_more}
+    """
+    page = max(1, page)
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+    start = (page - 1) * page_size
+    info = {
+        "page": page,
+        "page_size": page_size,
+        "total": len(items),
+        "has_more": start + page_size < len(items),
+    }
+    return items[start:start + page_size], info
+
+
+async def _analyze_one(client, pool, pain_point, industry, department, community, locals_done, i,
+                       lazy=False, page_size=COMMUNITY_PAGE_SIZE):
+    loop = asyncio.get_running_loop()
+    # 各痛點的階段耗時累計到請求日誌（同時進行的痛點會重疊）
+    with stage("local"):
+        if pool is None:
+            # 請求剖析中：執行本地引擎的執行緒也納入剖析
+            profile = profiling.current()
+            build = build_local_stage if profile is None else profile.wrap(build_local_stage)
+            local = await loop.run_in_executor(None, build, pain_point, industry, department)
+        else:
+            local = await asyncio.wrap_future(
+                pool.submit(build_local_stage, pain_point, industry, department)
+            )
+    locals_done[i] = local
+
+    community_results = []
+    page_info = None
+    if community:
+        analysis = local["analysis"]
+        try:
+            with stage("community"):
+                if lazy:
+                    candidates = await client.search_candidates(
+                        analysis.get("keywords", []), industry, analysis,
+                    )
+                    community_results, page_info = paginate(candidates, 1, page_size)
+                else:
+                    community_results = await client.search_and_enrich(
+                        analysis.get("keywords", []), industry, COMMUNITY_RESULTS, analysis,
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Community search failed: %r", e)
+    roadmap = assemble_roadmap(local, community_results, industry, department, pain_point)
+    if page_info is not None:
+        roadmap["community_page"] = page_info
+    return roadmap
+
+
+def analyze_many(pain_points, industry, department=None, deadline=REQUEST_DEADLINE,
+                 cancel_check=None, community=True, workers=None, client=None,
+                 lazy=False, page_size=COMMUNITY_PAGE_SIZE):
+    """
+    平行產生多個痛點的路徑圖。
+
+    Parameters
+    ----------
+    pain_points : list[str]
+    deadline : float — 整個請求的秒數上限
+    cancel_check : callable() -> bool, optional — 回傳 True 時取消（用戶端已斷線）
+    community : bool — 是否搜尋社群模板
+    workers : int, optional — 子程序數（預設 default_workers()）
+    client : AsyncN8nClient, optional
+    lazy : bool — 社群結果只回傳第一頁摘要（附 community_page 分頁資訊）
+    page_size : int — lazy 模式每頁的摘要數
+
+    Returns
+    -------
+    list — 與 pain_points 對應的路徑圖。截止時間內社群搜尋未完成的項目
+           社群結果為空；本地引擎也未完成的項目為 None。
+           被取消時拋出 asyncio.CancelledError。
+    """
+    pool = get_pool(workers)
+
+    async def _runner():
+        n8n = client or AsyncN8nClient()
+        locals_done = {}
+        tasks = [
+            asyncio.ensure_future(
+                _analyze_one(n8n, pool, pp, industry, department, community, locals_done, i,
+                             lazy, page_size)
+            )
+            for i, pp in enumerate(pain_points)
+        ]
+        loop = asyncio.get_running_loop()
+        end = loop.time() + deadline
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = end - loop.time()
+                if remaining <= 0:
+                    break
+                _, pending = await asyncio.wait(
+                    pending, timeout=min(remaining, CANCEL_POLL_INTERVAL),
+                )
+                if cancel_check is not None and cancel_check():
+                    raise asyncio.CancelledError("client disconnected")
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        results = []
+        for i, task in enumerate(tasks):
+            if task.cancelled():
+                local = locals_done.get(i)
+                results.append(local and assemble_roadmap(
+                    local, [], industry, department, pain_points[i],
+                ))
+            elif task.exception() is not None:
+                log.error("Analysis failed", exc_info=task.exception())
+                results.append(None)
+            else:
+                results.append(task.result())
+        return results
+
+    return asyncio.run(_runner())
@@ -0,0 +1,392 @@
+"""
+catalog_artifact.py — 以 mmap 開啟的二進位方案庫
+
+把 data/*.json、方案庫的 TF-IDF 矩陣與社群模板鏡像編譯成單一、
+有版本的二進位檔。啟動時不再解析 JSON 或重新計算 TF-IDF：
+檔案以 mmap 唯讀開啟，數值陣列透過 numpy.frombuffer 直接指向
+映射的記憶體，多個 worker 程序共用同一份 page cache。
+
+檔案格式（little-endian）：
+  MAGIC (8 bytes) | FORMAT_VERSION (u32) | 目錄長度 (u32) | 目錄 JSON
+  之後為各區段，每段起點對齊 ALIGN bytes。
+
+目錄記錄每個區段的 offset（自資料起點算起）/ length / dtype，以及：
+  tables — JSON 檔的紀錄表：key 字串表 + 每筆紀錄的 JSON 字串表，
+           存取時才解碼單筆紀錄
+  tfidf  — 向量化參數、詞彙字串表、idf 與 CSR 陣列（data / indices / indptr）
+  fingerprint — data/*.json 內容雜湊；與目前資料不符時視為過期
+
+建立：
+  python -m core.catalog_artifact [輸出路徑] [--no-templates]
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+
+MAGIC = b"N8NCAT\x00\x00"
+# 格式版本；修改區段配置時遞增
+FORMAT_VERSION = 1
+ALIGN = 64
+_HEADER = struct.Struct("<8sII")
+
+# 編譯進檔案的資料檔（檔名 → 最外層的 key）
+DATA_FILES = {
+    "industry_mapping": "industries",
+    "n8n_solutions": "solutions",
+    "tool_library": "tools",
+    "universal_logic": "dimensions",
+}
+TEMPLATES_TABLE = "templates"
+
+
+def default_path():
+    """預設路徑：環境變數 N8N_CONSULTANT_CATALOG，否則為快取目錄下的 catalog.bin"""
+    from core.paths import CACHE_DIR
+    return os.environ.get("N8N_CONSULTANT_CATALOG", os.path.join(CACHE_DIR, "catalog.bin"))
+
+
+def data_fingerprint(data_dir=DATA_DIR):
+    """data/*.json 內容與格式版本的雜湊"""
+    digest = hashlib.sha1(str(FORMAT_VERSION).encode())
+    for name in sorted(DATA_FILES):
+        with open(os.path.join(data_dir, f"{name}.json"), "rb") as f:
+            digest.update(name.encode("utf-8"))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _json_params(params):
+    """向量化參數正規化成 JSON 形式（tuple → list），方便比對"""
+    return json.loads(json.dumps(params, sort_keys=True))
+
+
+# ── 寫入 ──
+
+class _Writer:
+    def __init__(self):
+        self.sections = {}
+        self._chunks = []
+        self._size = 0
+
+    def add(self, name, payload, dtype=None):
+        """加入一個區段（bytes 或 numpy 陣列），回傳區段名稱"""
+        if isinstance(payload, np.ndarray):
+            dtype = payload.dtype.str
+            payload = np.ascontiguousarray(payload).tobytes()
+        pad = -self._size % ALIGN
+        if pad:
+            self._chunks.append(b"\x00" * pad)
+            self._size += pad
+        self.sections[name] = {"offset": self._size, "length": len(payload), "dtype": dtype}
+        self._chunks.append(payload)
+        self._size += len(payload)
+        return name
+
+    def add_strings(self, name, strings):
+        """字串表：offsets（uint64，n+1 個）+ UTF-8 blob"""
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return {
+            "offsets": self.add(f"{name}.offsets", offsets),
+            "blob": self.add(f"{name}.blob", b"".join(encoded)),
+        }
+
+    def add_table(self, name, collection):
+        """JSON 紀錄表（dict 依 key、list 依位置）"""
+        if isinstance(collection, dict):
+            kind, keys, values = "dict", list(collection), list(collection.values())
+        else:
+            kind, keys, values = "list", [], list(collection)
+        return {
+            "kind": kind,
+            "keys": self.add_strings(f"{name}.keys", keys),
+            "values": self.add_strings(
+                f"{name}.values",
+                [json.dumps(v, ensure_ascii=False, separators=(",", ":")) for v in values],
+            ),
+        }
+
+    def write(self, path, toc):
+        toc_bytes = json.dumps(dict(toc, sections=self.sections), ensure_ascii=False).encode("utf-8")
+        head = _HEADER.pack(MAGIC, FORMAT_VERSION, len(toc_bytes)) + toc_bytes
+        head += b"\x00" * (-len(head) % ALIGN)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(head)
+            for chunk in self._chunks:
+                f.write(chunk)
+        # 以 replace 切換：已 mmap 舊檔的程序仍可讀取舊內容
+        os.replace(tmp, path)
+
+
+def build(path=None, data_dir=DATA_DIR, include_templates=True, store=None):
+    """
+    編譯方案庫成二進位檔。
+
+    Parameters
+    ----------
+    path : str, optional — 輸出路徑（預設 default_path()）
+    include_templates : bool — 是否包含 enrichment_store 中的社群模板鏡像
+    store : EnrichmentStore, optional — 模板來源（預設為 get_store()）
+
+    Returns
+    -------
+    dict — 目錄摘要（fingerprint、各紀錄表筆數、模板數）
+    """
+    from core.matcher import TFIDF_PARAMS, fit_index
+
+    path = path or default_path()
+    writer = _Writer()
+    tables = {}
+    counts = {}
+    for name, key in DATA_FILES.items():
+        with open(os.path.join(data_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+            collection = json.load(f)[key]
+        tables[name] = writer.add_table(name, collection)
+        tables[name]["wrapper"] = key
+        counts[name] = len(collection)
+        if name == "n8n_solutions":
+            solutions = collection
+
+    vectorizer, matrix = fit_index(solutions)
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    tfidf = {
+        "params": _json_params(TFIDF_PARAMS),
+        "shape": list(matrix.shape),
+        "vocab": writer.add_strings("tfidf.vocab", terms),
+        "idf": writer.add("tfidf.idf", np.asarray(vectorizer.idf_, dtype="<f8")),
+        "data": writer.add("tfidf.data", matrix.data.astype("<f8", copy=False)),
+        "indices": writer.add("tfidf.indices", matrix.indices),
+        "indptr": writer.add("tfidf.indptr", matrix.indptr.astype(matrix.indices.dtype, copy=False)),
+    }
+
+    template_count = 0
+    if include_templates:
+        if store is None:
+            from core.enrichment_store import get_store
+            store = get_store()
+        mirror = {}
+        for wf_id, enrich_version, version, checked_at, payload, node_types in store.iter_rows():
+            mirror[wf_id] = [enrich_version, version, checked_at, payload, node_types]
+        tables[TEMPLATES_TABLE] = writer.add_table(TEMPLATES_TABLE, mirror)
+        template_count = len(mirror)
+
+    toc = {
+        "fingerprint": data_fingerprint(data_dir),
+        "tables": tables,
+        "tfidf": tfidf,
+    }
+    writer.write(path, toc)
+    if os.path.abspath(path) == os.path.abspath(default_path()):
+        reset_catalog()
+    return {"path": path, "fingerprint": toc["fingerprint"], "tables": counts, "templates": template_count}
+
+
+# ── 讀取 ──
+
+class StringTable(Sequence):
+    """mmap 上的字串表；存取時才解碼單一字串"""
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        i %= len(self)
+        return str(self._blob[int(self._offsets[i]):int(self._offsets[i + 1])], "utf-8")
+
+
+class RecordList(Sequence):
+    """
+    list 型 JSON 紀錄表：以位置存取。每次存取都解碼出新的物件
+    （或交給 decode 轉換），不會共用可變狀態。
+    """
+
+    def __init__(self, values, decode=None):
+        self._values = values
+        self._decode = decode
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, i):
+        record = json.loads(self._values[i])
+        return self._decode(record) if self._decode else record
+
+
+class RecordMap(Mapping):
+    """dict 型 JSON 紀錄表：以 key 存取，key → 位置的對照在第一次查詢時建立"""
+
+    def __init__(self, keys, values, decode=None):
+        self._keys = keys
+        self._records = RecordList(values, decode)
+        self._positions = None
+
+    def _position(self, key):
+        if self._positions is None:
+            self._positions = {k: i for i, k in enumerate(self._keys)}
+        return self._positions.get(key)
+
+    def __getitem__(self, key):
+        pos = self._position(key)
+        if pos is None:
+            raise KeyError(key)
+        return self._records[pos]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __contains__(self, key):
+        return self._position(key) is not None
+
+
+class CatalogArtifact:
+    """
+    以 mmap 開啟的方案庫檔案。
+
+    Parameters
+    ----------
+    path : str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        magic, version, toc_length = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a catalog artifact")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {version}, expected {FORMAT_VERSION}")
+        start = _HEADER.size
+        self.toc = json.loads(bytes(self._view[start:start + toc_length]))
+        self.fingerprint = self.toc["fingerprint"]
+        end = start + toc_length
+        self._data_start = end + (-end % ALIGN)
+
+    def _section(self, name):
+        info = self.toc["sections"][name]
+        offset = self._data_start + info["offset"]
+        return self._view[offset:offset + info["length"]]
+
+    def array(self, name):
+        """區段的 numpy 陣列（唯讀、直接指向 mmap）"""
+        info = self.toc["sections"][name]
+        dtype = np.dtype(info["dtype"])
+        return np.frombuffer(self._mmap, dtype=dtype, count=info["length"] // dtype.itemsize,
+                             offset=self._data_start + info["offset"])
+
+    def strings(self, spec):
+        return StringTable(self.array(spec["offsets"]), self._section(spec["blob"]))
+
+    def has_table(self, name):
+        return name in self.toc["tables"]
+
+    def table(self, name, decode=None):
+        """
+        取得紀錄表（data 檔名，或 TEMPLATES_TABLE）。
+
+        Returns
+        -------
+        RecordMap (原始為 dict) 或 RecordList (原始為 list)
+        """
+        spec = self.toc["tables"][name]
+        values = self.strings(spec["values"])
+        if spec["kind"] == "dict":
+            return RecordMap(self.strings(spec["keys"]), values, decode)
+        return RecordList(values, decode)
+
+    def tfidf_params(self):
+        return self.toc["tfidf"]["params"]
+
+    def vocabulary(self):
+        """詞彙 → 欄位索引"""
+        return {term: i for i, term in enumerate(self.strings(self.toc["tfidf"]["vocab"]))}
+
+    def idf(self):
+        return self.array(self.toc["tfidf"]["idf"])
+
+    def tfidf_matrix(self):
+        """方案庫 TF-IDF 矩陣（tfidf.CsrMatrix，陣列直接指向 mmap）"""
+        from core.tfidf import CsrMatrix
+
+        spec = self.toc["tfidf"]
+        return CsrMatrix(self.array(spec["data"]), self.array(spec["indices"]),
+                         self.array(spec["indptr"]), spec["shape"])
+
+
+_catalog = None
+_catalog_loaded = False
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    取得程序共用的方案庫檔案；不存在、格式不符或與目前 data/*.json
+    不一致時回傳 None（呼叫端改走 JSON 路徑）。
+    """
+    global _catalog, _catalog_loaded
+    if not _catalog_loaded:
+        with _catalog_lock:
+            if not _catalog_loaded:
+                path = default_path()
+                if os.path.exists(path):
+                    try:
+                        catalog = CatalogArtifact(path)
+                        if catalog.fingerprint == data_fingerprint():
+                            _catalog = catalog
+                        else:
+                            log.warning("%s is stale; rebuild with `python -m core.catalog_artifact`", path)
+                    except (OSError, ValueError) as e:
+                        log.warning("Ignoring %s: %s", path, e)
+                _catalog_loaded = True
+    return _catalog
+
+
+def reset_catalog():
+    """下次 get_catalog() 時重新開啟檔案（重建之後使用）"""
+    global _catalog, _catalog_loaded
+    with _catalog_lock:
+        _catalog = None
+        _catalog_loaded = False
+
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    include_templates = "--no-templates" not in argv
+    paths = [a for a in argv if not a.startswith("--")]
+    summary = build(paths[0] if paths else None, include_templates=include_templates)
+    print(f"✅ {summary['path']}")
+    for name, count in summary["tables"].items():
+        print(f"   {name}: {count}")
+    print(f"   templates: {summary['templates']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+compact.py — 方案庫與社群模板的精簡記憶體表示
+
+快取中的方案與增強模板原本都是巢狀 dict，每筆都重複帶著
+name / type / desc / step / duration 等 key，重複的值（節點類型、
+"1~2 週" 之類的時程、分類）也各自是獨立的字串物件。
+
+此模組以 __slots__ 類別保存同樣的資料：
+  1. 不為每筆記錄建立 __dict__，key 只存在類別上
+  2. 節點類型、時程、分類、關鍵字等重複值以 sys.intern 共用
+  3. 清單改存 tuple；只在序列化前以 to_dict() 還原成 dict
+
+to_dict() 的輸出與原始 dict 相等（依欄位宣告順序；未宣告的 key 保留在最後）。
+"""
+
+import sys
+
+_MISSING = object()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class _Compact:
+    """
+    精簡記錄的共用邏輯。子類別宣告：
+      FIELDS   — 欄位名稱（即 __slots__，依輸出順序）
+      INTERNED — 值需 intern 的欄位
+      LISTS    — 值為字串清單的欄位（存成 tuple，元素 intern）
+      CHILDREN — 值為子記錄清單的欄位 → 子記錄類別
+      NESTED   — 值為單一子記錄的欄位 → 子記錄類別
+    """
+
+    __slots__ = ("_extra",)
+    FIELDS = ()
+    INTERNED = frozenset()
+    LISTS = frozenset()
+    CHILDREN = {}
+    NESTED = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        obj = cls.__new__(cls)
+        for field in cls.FIELDS:
+            value = data.get(field, _MISSING)
+            if value is not _MISSING:
+                if field in cls.CHILDREN and isinstance(value, list):
+                    value = tuple(cls.CHILDREN[field].from_dict(item) for item in value)
+                elif field in cls.NESTED and isinstance(value, dict):
+                    value = cls.NESTED[field].from_dict(value)
+                elif field in cls.LISTS and isinstance(value, list):
+                    value = tuple(_intern(item) for item in value)
+                elif field in cls.INTERNED:
+                    value = _intern(value)
+            setattr(obj, field, value)
+        extra = {k: v for k, v in data.items() if k not in cls.FIELDS}
+        obj._extra = extra or None
+        return obj
+
+    def to_dict(self):
+        """還原成與原始資料相等的 dict（供 JSON 序列化）"""
+        result = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is _MISSING:
+                continue
+            if field in self.CHILDREN and isinstance(value, tuple):
+                value = [item.to_dict() for item in value]
+            elif field in self.NESTED and isinstance(value, _Compact):
+                value = value.to_dict()
+            elif field in self.LISTS and isinstance(value, tuple):
+                value = list(value)
+            result[field] = value
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def get(self, field, default=None):
+        """dict 風格的欄位讀取（不還原巢狀結構）"""
+        value = getattr(self, field, _MISSING) if field in self.FIELDS else _MISSING
+        if value is _MISSING:
+            return (self._extra or {}).get(field, default)
+        return value
+
+
+class CompactNode(_Compact):
+    __slots__ = ("name", "type", "desc")
+    FIELDS = __slots__
+    INTERNED = frozenset({"type"})
+
+
+class CompactStep(_Compact):
+    __slots__ = ("step", "title", "desc", "duration")
+    FIELDS = __slots__
+    INTERNED = frozenset({"title", "duration"})
+
+
+class CompactWorkflow(_Compact):
+    __slots__ = ("name", "description", "nodes")
+    FIELDS = __slots__
+    CHILDREN = {"nodes": CompactNode}
+
+
+class CompactSolution(_Compact):
+    """n8n_solutions.json 中的一筆方案"""
+
+    __slots__ = ("id", "name", "keywords", "pain_points", "workflow",
+                 "difficulty", "difficulty_reasons", "steps")
+    FIELDS = __slots__
+    INTERNED = frozenset({"id"})
+    LISTS = frozenset({"keywords", "pain_points", "difficulty_reasons"})
+    CHILDREN = {"steps": CompactStep}
+    NESTED = {"workflow": CompactWorkflow}
+
+
+class CompactTemplate(_Compact):
+    """enrich_workflow 產生的社群模板增強結果"""
+
+    __slots__ = ("id", "name", "description", "url", "nodes", "node_count",
+                 "difficulty", "difficulty_display", "difficulty_reasons",
+                 "steps", "categories")
+    FIELDS = __slots__
+    INTERNED = frozenset({"difficulty_display"})
+    LISTS = frozenset({"difficulty_reasons", "categories"})
+    CHILDREN = {"nodes": CompactNode, "steps": CompactStep}
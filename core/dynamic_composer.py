@@ -7,8 +7,14 @@ dynamic_composer.py — 動態 n8n 工作流組合引擎
   3. 客製化實施步驟
 
 無需外部 API，純 Python 邏輯。
+
+節點模板在 import 時預編譯為查表結構，組合結果依
+(trigger, sources, actions, outputs) 簽章快取，相同簽章不重複組裝。
 """
 
+from functools import lru_cache
+from string import Formatter
+
 
 # ══════════════════════════════════════════════════════════
 #  n8n 節點元件庫（可組合的零件）
@@ -255,6 +261,86 @@ LOG_NODE = {
     "desc_tpl": "記錄每次{action}的執行結果，方便後續追蹤與優化",
 }
 
+# 進階 AI 能力（提高困難度）
+ADVANCED_ACTIONS = frozenset(["影像辨識", "預測分析", "風險評估", "推薦引擎", "排程優化"])
+
+# ── 成本模型（新台幣；core.estimator 的向量化估算共用同一組參數）──
+BASE_PRICE = 30000      # 基礎設置費
+NODE_PRICE = 6000       # 每個節點
+LOWER_RATIO = 0.9
+UPPER_RATIO = 1.2
+ROUND_UNIT = 10000      # 取整到萬
+
+
+# ══════════════════════════════════════════════════════════
+#  模板預編譯（import 時執行一次）
+# ══════════════════════════════════════════════════════════
+
+# 需要條件分流的動作 / 需要較長開發時間的動作
+DECISION_ACTIONS = frozenset(["分類判斷", "風險評估", "異常偵測", "預測分析"])
+HEAVY_ACTIONS = frozenset(["預測分析", "影像辨識", "風險評估"])
+
+# 組合結果快取大小（依工作流簽章）
+COMPOSE_CACHE_SIZE = 1024
+
+_FORMATTER = Formatter()
+
+
+def _compile_tpl(tpl):
+    """將 desc_tpl 預先拆解為 ((literal, field), ...) 片段，避免每次呼叫 str.format"""
+    return tuple(
+        (literal, field or None)
+        for literal, field, _spec, _conv in _FORMATTER.parse(tpl)
+    )
+
+
+def _render(parts, values):
+    """以預先拆解的片段組合描述文字"""
+    return "".join(
+        literal + values[field] if field else literal
+        for literal, field in parts
+    )
+
+
+# 觸發器：key → (name, type, desc)
+_TRIGGERS = {
+    "realtime": ("Webhook 觸發", TRIGGER_NODES["Webhook 觸發"]["type"],
+                 "接收即時事件通知，立即啟動處理流程"),
+    "reply": ("Webhook 觸發", TRIGGER_NODES["Webhook 觸發"]["type"],
+              "收到客戶請求時即時啟動工作流"),
+    "schedule": ("排程觸發", TRIGGER_NODES["排程觸發"]["type"],
+                 "每日定時自動執行工作流"),
+}
+
+# 資料源：key → (name, type, parts, default_data_desc)
+_SOURCES = {
+    key: (tpl["name"], tpl["type"], _compile_tpl(tpl["desc_tpl"]), tpl["default_data_desc"])
+    for key, tpl in DATA_SOURCE_NODES.items()
+}
+
+# 處理：key → (name, type, parts)
+_PROCESSES = {
+    key: (tpl["name"], tpl["type"], _compile_tpl(tpl["desc_tpl"]))
+    for key, tpl in PROCESS_NODES.items()
+}
+
+# 輸出：key → (name, type, parts, recipient)
+_OUTPUTS = {
+    key: (tpl["name"], tpl["type"], _compile_tpl(tpl["desc_tpl"]),
+          tpl.get("default_recipient", "負責人"))
+    for key, tpl in OUTPUT_NODES.items()
+}
+
+_DECISION = (DECISION_NODE["name"], DECISION_NODE["type"], _compile_tpl(DECISION_NODE["desc_tpl"]))
+_LOG = (LOG_NODE["name"], LOG_NODE["type"], _compile_tpl(LOG_NODE["desc_tpl"]))
+
+# 產生主題名詞時過濾的通用詞
+TARGET_STOP_WORDS = frozenset([
+    "我們", "公司", "系統", "問題", "希望", "可以", "因為", "目前", "常常",
+    "太多", "太高", "太低", "很多", "一直", "經常", "需要", "想要", "如何",
+    "怎麼", "不知道", "沒有", "無法", "進行",
+])
+
 
 # ══════════════════════════════════════════════════════════
 #  動態組合邏輯
@@ -274,87 +360,87 @@ def compose_workflow(analysis, industry="", pain_text=""):
     -------
     dict with: name, description, nodes
     """
-    keywords = analysis.get("keywords", [])
     sources = analysis.get("data_sources", [])
     actions = analysis.get("actions", [])
     outputs = analysis.get("outputs", [])
     focus = analysis.get("industry_focus", "")
 
     # ── 決定主題名詞（注入到模板裡）──
-    target = _extract_target(keywords, pain_text, focus)
+    target = _extract_target(analysis.get("keywords", []), pain_text, focus)
+
+    signature = (
+        _select_trigger_key(analysis),
+        tuple(sources[:2]),
+        tuple(actions),
+        tuple(outputs[:2]),
+    )
+    wf_name, wf_desc, nodes = _compose_signature(signature, target, industry)
+
+    return {
+        "name": wf_name,
+        "description": wf_desc,
+        "nodes": [{"name": n, "type": t, "desc": d} for n, t, d in nodes],
+    }
 
-    nodes = []
+
+@lru_cache(maxsize=COMPOSE_CACHE_SIZE)
+def _compose_signature(signature, target, industry):
+    """
+    依工作流簽章組裝節點序列（結果快取）。
+
+    Returns
+    -------
+    tuple: (name, description, ((node_name, node_type, node_desc), ...))
+    """
+    trigger_key, sources, actions, outputs = signature
+    values = {
+        "target": target,
+        "content": target + "分析結果",
+        "trigger_condition": f"{target}出現異常",
+        "action": target + "處理",
+        "doc_type": target + "報告",
+    }
 
     # 1. 觸發器
-    trigger = _select_trigger(analysis)
-    nodes.append(trigger)
+    nodes = [_TRIGGERS[trigger_key]]
 
     # 2. 資料源節點（最多 2 個）
-    for src in sources[:2]:
-        node_tpl = DATA_SOURCE_NODES.get(src)
-        if node_tpl:
-            desc = node_tpl["desc_tpl"].format(
-                data_desc=_contextualize(node_tpl["default_data_desc"], target, focus)
-            )
-            nodes.append({
-                "name": node_tpl["name"],
-                "type": node_tpl["type"],
-                "desc": desc,
-            })
+    for src in sources:
+        compiled = _SOURCES.get(src)
+        if compiled:
+            name, node_type, parts, default_desc = compiled
+            data_desc = _contextualize(default_desc, target, "")
+            nodes.append((name, node_type, _render(parts, {"data_desc": data_desc})))
 
     # 3. 處理節點（最多 2 個）
     for act in actions[:2]:
-        proc_tpl = PROCESS_NODES.get(act)
-        if proc_tpl:
-            nodes.append({
-                "name": proc_tpl["name"],
-                "type": proc_tpl["type"],
-                "desc": proc_tpl["desc_tpl"].format(target=target),
-            })
+        compiled = _PROCESSES.get(act)
+        if compiled:
+            name, node_type, parts = compiled
+            nodes.append((name, node_type, _render(parts, values)))
 
     # 4. 條件分流（如果有分類/判斷/風險類動作）
-    needs_decision = any(a in actions for a in ["分類判斷", "風險評估", "異常偵測", "預測分析"])
-    if needs_decision:
+    if not DECISION_ACTIONS.isdisjoint(actions):
+        name, node_type, parts = _DECISION
         criteria = _build_criteria(actions, target)
-        nodes.append({
-            "name": DECISION_NODE["name"],
-            "type": DECISION_NODE["type"],
-            "desc": DECISION_NODE["desc_tpl"].format(criteria=criteria),
-        })
+        nodes.append((name, node_type, _render(parts, {"criteria": criteria})))
 
     # 5. 輸出節點（最多 2 個）
-    for out in outputs[:2]:
-        out_tpl = OUTPUT_NODES.get(out)
-        if out_tpl:
-            desc = out_tpl["desc_tpl"].format(
-                content=target + "分析結果",
-                recipient=out_tpl.get("default_recipient", "負責人"),
-                trigger_condition=f"{target}出現異常",
-                action=target + "處理",
-                doc_type=target + "報告",
-            )
-            nodes.append({
-                "name": out_tpl["name"],
-                "type": out_tpl["type"],
-                "desc": desc,
-            })
+    for out in outputs:
+        compiled = _OUTPUTS.get(out)
+        if compiled:
+            name, node_type, parts, recipient = compiled
+            nodes.append((name, node_type, _render(parts, dict(values, recipient=recipient))))
 
     # 6. 日誌節點
-    nodes.append({
-        "name": LOG_NODE["name"],
-        "type": LOG_NODE["type"],
-        "desc": LOG_NODE["desc_tpl"].format(action=target + "分析"),
-    })
+    name, node_type, parts = _LOG
+    nodes.append((name, node_type, _render(parts, {"action": target + "分析"})))
 
     # ── 工作流名稱 & 描述 ──
     wf_name = _generate_wf_name(target, actions, industry)
-    wf_desc = _generate_wf_desc(target, actions, outputs, industry, pain_text)
+    wf_desc = _generate_wf_desc(target, actions, outputs, industry, "")
 
-    return {
-        "name": wf_name,
-        "description": wf_desc,
-        "nodes": nodes,
-    }
+    return wf_name, wf_desc, tuple(nodes)
 
 
 def compose_difficulty(analysis, node_count):
@@ -380,8 +466,7 @@ def compose_difficulty(analysis, node_count):
         reasons.append(f"資料來源為 {sources[0]}，串接難度適中")
 
     # 處理複雜度
-    complex_actions = {"影像辨識", "預測分析", "風險評估", "推薦引擎", "排程優化"}
-    hard_actions = [a for a in actions if a in complex_actions]
+    hard_actions = [a for a in actions if a in ADVANCED_ACTIONS]
     if hard_actions:
         score += 1
         reasons.append(f"涉及進階 AI 能力（{'、'.join(hard_actions)}），需要調校模型參數與 Prompt")
@@ -433,112 +518,104 @@ def compose_steps(analysis, workflow_nodes, difficulty):
     -------
     list[dict]: each with step, title, desc, duration
     """
-    keywords = analysis.get("keywords", [])
-    sources = analysis.get("data_sources", [])
+    target = _extract_target(analysis.get("keywords", []), "", analysis.get("industry_focus", ""))
     actions = analysis.get("actions", [])
-    target = _extract_target(keywords, "", analysis.get("industry_focus", ""))
-
+    signature = (
+        tuple(analysis.get("data_sources", [])[:2]),
+        tuple(actions[:2]),
+        not HEAVY_ACTIONS.isdisjoint(actions),
+        not DECISION_ACTIONS.isdisjoint(actions),
+        tuple(analysis.get("outputs", [])[:2]),
+    )
+    return [
+        {"step": num, "title": title, "desc": desc, "duration": duration}
+        for num, title, desc, duration in _compose_steps_signature(signature, target)
+    ]
+
+
+@lru_cache(maxsize=COMPOSE_CACHE_SIZE)
+def _compose_steps_signature(signature, target):
+    """依步驟簽章產出 ((step, title, desc, duration), ...)（結果快取）"""
+    sources, actions, heavy, needs_decision, outputs = signature
     steps = []
-    step_num = 1
 
     # Step 1: 需求確認
-    steps.append({
-        "step": step_num,
-        "title": "需求確認與資料盤點",
-        "desc": f"盤點「{target}」相關數據的來源與格式，確認可用的 {'、'.join(sources[:2]) if sources else '資料接口'}，並定義預期的自動化目標。",
-        "duration": "1 週",
-    })
-    step_num += 1
+    steps.append((
+        "需求確認與資料盤點",
+        f"盤點「{target}」相關數據的來源與格式，確認可用的 {'、'.join(sources) if sources else '資料接口'}，並定義預期的自動化目標。",
+        "1 週",
+    ))
 
     # Step 2: 資料源串接
     if sources:
-        src_text = '、'.join(sources[:2])
-        steps.append({
-            "step": step_num,
-            "title": f"串接資料來源（{src_text}）",
-            "desc": f"在 n8n 中設定 {src_text} 的連線，測試資料讀取是否正確，確認欄位對應。",
-            "duration": "1~2 週",
-        })
-        step_num += 1
+        src_text = '、'.join(sources)
+        steps.append((
+            f"串接資料來源（{src_text}）",
+            f"在 n8n 中設定 {src_text} 的連線，測試資料讀取是否正確，確認欄位對應。",
+            "1~2 週",
+        ))
 
     # Step 3: 核心處理邏輯
     if actions:
-        act_text = '、'.join(actions[:2])
-        steps.append({
-            "step": step_num,
-            "title": f"建構核心邏輯（{act_text}）",
-            "desc": f"在 n8n 中建立「{target}」的{act_text}處理節點，撰寫必要的 Prompt 或計算邏輯，並以小量測試資料驗證。",
-            "duration": "2~3 週" if any(a in actions for a in ["預測分析", "影像辨識", "風險評估"]) else "1~2 週",
-        })
-        step_num += 1
+        act_text = '、'.join(actions)
+        steps.append((
+            f"建構核心邏輯（{act_text}）",
+            f"在 n8n 中建立「{target}」的{act_text}處理節點，撰寫必要的 Prompt 或計算邏輯，並以小量測試資料驗證。",
+            "2~3 週" if heavy else "1~2 週",
+        ))
 
     # Step 4: 條件與分流
-    needs_decision = any(a in actions for a in ["分類判斷", "風險評估", "異常偵測", "預測分析"])
     if needs_decision:
-        steps.append({
-            "step": step_num,
-            "title": "設定條件分流與閾值",
-            "desc": f"設定 IF/Switch 節點的判斷閾值（例如：風險高/中/低），確保「{target}」分流邏輯準確。",
-            "duration": "1 週",
-        })
-        step_num += 1
+        steps.append((
+            "設定條件分流與閾值",
+            f"設定 IF/Switch 節點的判斷閾值（例如：風險高/中/低），確保「{target}」分流邏輯準確。",
+            "1 週",
+        ))
 
     # Step 5: 輸出通道
-    outputs = analysis.get("outputs", [])
     if outputs:
-        out_text = '、'.join(outputs[:2])
-        steps.append({
-            "step": step_num,
-            "title": f"設定輸出通道（{out_text}）",
-            "desc": f"設定{out_text}節點，確保「{target}」處理結果能正確送達通知對象。",
-            "duration": "1 週",
-        })
-        step_num += 1
+        out_text = '、'.join(outputs)
+        steps.append((
+            f"設定輸出通道（{out_text}）",
+            f"設定{out_text}節點，確保「{target}」處理結果能正確送達通知對象。",
+            "1 週",
+        ))
 
     # Step 6: 測試
-    steps.append({
-        "step": step_num,
-        "title": "端到端測試與微調",
-        "desc": f"用真實資料執行完整工作流，驗證從資料匯入到結果輸出的全流程，微調{target}相關參數。",
-        "duration": "1~2 週",
-    })
-    step_num += 1
+    steps.append((
+        "端到端測試與微調",
+        f"用真實資料執行完整工作流，驗證從資料匯入到結果輸出的全流程，微調{target}相關參數。",
+        "1~2 週",
+    ))
 
     # Step 7: 上線
-    steps.append({
-        "step": step_num,
-        "title": "正式上線與監控",
-        "desc": f"啟用排程或觸發條件，監控前 1~2 週的執行紀錄，處理邊界情況或例外。",
-        "duration": "持續維護",
-    })
+    steps.append((
+        "正式上線與監控",
+        "啟用排程或觸發條件，監控前 1~2 週的執行紀錄，處理邊界情況或例外。",
+        "持續維護",
+    ))
 
-    return steps
+    return tuple((num, *step) for num, step in enumerate(steps, 1))
 
 
 def compose_cost(node_count, difficulty_score):
     """
-    估算導入成本（新台幣）。
-    
+    估算導入成本（新台幣），回傳顯示用字串。
+
+    單份估算以純 Python 計算；多份路徑圖請用 core.estimator.batch_cost。
+
     邏輯：
     - 基礎設置費：30,000
-    - 節點費：每個節點 5,000 ~ 8,000
+    - 節點費：每個節點 6,000
     - 困難度加乘：1.0 ~ 2.0
     """
-    base_price = 30000
-    node_price = 6000
-    
-    # 困難度係數
-    multiplier = 1.0 + (difficulty_score - 1) * 0.25  # 1->1.0, 3->1.5, 5->2.0
-    
-    raw_estimate = (base_price + (node_count * node_price)) * multiplier
-    
-    # 取整數 (萬)
-    lower = int(raw_estimate * 0.9 / 10000) * 10000
-    upper = int(raw_estimate * 1.2 / 10000) * 10000
-    
-    # 格式化
-    return f"{lower//10000}萬 ~ {upper//10000}萬 TWD"
+    # 困難度係數：1->1.0, 3->1.5, 5->2.0
+    multiplier = 1.0 + (difficulty_score - 1) * 0.25
+    raw_estimate = (BASE_PRICE + (node_count * NODE_PRICE)) * multiplier
 
+    lower = int(raw_estimate * LOWER_RATIO / ROUND_UNIT) * ROUND_UNIT
+    upper = int(raw_estimate * UPPER_RATIO / ROUND_UNIT) * ROUND_UNIT
+    return f"{lower // 10000}萬 ~ {upper // 10000}萬 TWD"
 
 
 # ══════════════════════════════════════════════════════════
@@ -552,41 +629,20 @@ def _extract_target(keywords, pain_text, focus):
         return focus
 
     # 過濾掉太通用的詞
-    stop = {"我們", "公司", "系統", "問題", "希望", "可以", "因為", "目前", "常常",
-            "太多", "太高", "太低", "很多", "一直", "經常", "需要", "想要", "如何",
-            "怎麼", "不知道", "沒有", "無法", "進行"}
-    filtered = [kw for kw in keywords if kw not in stop and len(kw) >= 2]
-
-    return filtered[0] if filtered else "業務數據"
-
-
-def _select_trigger(analysis):
-    """根據分析結果選擇觸發器"""
-    complexity = analysis.get("complexity", [])
-    outputs = analysis.get("outputs", [])
-
-    if "即時處理" in complexity:
-        tpl = TRIGGER_NODES["Webhook 觸發"]
-        return {
-            "name": "Webhook 觸發",
-            "type": tpl["type"],
-            "desc": "接收即時事件通知，立即啟動處理流程",
-        }
-
-    if "自動回覆" in outputs:
-        tpl = TRIGGER_NODES["Webhook 觸發"]
-        return {
-            "name": "Webhook 觸發",
-            "type": tpl["type"],
-            "desc": "收到客戶請求時即時啟動工作流",
-        }
-
+    for kw in keywords:
+        if len(kw) >= 2 and kw not in TARGET_STOP_WORDS:
+            return kw
+    return "業務數據"
+
+
+def _select_trigger_key(analysis):
+    """根據分析結果選擇觸發器（回傳 _TRIGGERS 的 key）"""
+    if "即時處理" in analysis.get("complexity", []):
+        return "realtime"
+    if "自動回覆" in analysis.get("outputs", []):
+        return "reply"
     # 預設排程
-    return {
-        "name": "排程觸發",
-        "type": "Schedule Trigger",
-        "desc": "每日定時自動執行工作流",
-    }
+    return "schedule"
 
 
 def _contextualize(default_desc, target, focus):
@@ -0,0 +1,347 @@
+"""
+enrichment_store.py — 社群模板增強結果的持久化儲存
+
+enrich_workflow 的結果（困難度、步驟、翻譯）對同一版本的模板是固定的。
+此模組以 SQLite 依模板 id 儲存完整的增強結果與模板版本（updatedAt）：
+  1. 命中時直接回傳本地結果（O(1) 讀取，不呼叫上游）
+  2. 結果超過 REVALIDATE_SECONDS 時，由背景執行緒向上游確認版本，
+     只有版本變更才重新計算
+  3. ENRICH_VERSION 變更時（增強邏輯改版），舊結果視為未命中
+
+社群搜尋結果（查詢字串 → 候選清單）也存在同一個 SQLite，供 prefetch 預熱、
+各 pre-fork worker 共用；超過 SEARCH_TTL 的結果視為過期。
+
+SQLite 之前另有一層記憶體 LRU，以 compact.CompactTemplate 保存最近使用的
+結果，命中時不需查詢 SQLite 或解析 JSON。SQLite 未命中時再查
+catalog_artifact 中的唯讀模板鏡像（多個程序共用同一份 mmap）。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from core.compact import CompactTemplate
+from core.feature_index import node_types_from_detail
+from core.n8n_community import enrich_workflow, get_workflow_detail
+from core.paths import CACHE_DIR
+from core.upstream import PRIORITY_BACKGROUND, priority
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, "enrichment.sqlite3")
+
+# 增強邏輯版本；修改 enrich_workflow 的輸出格式時遞增
+ENRICH_VERSION = 1
+# 超過此秒數的結果在命中時會排入背景確認
+REVALIDATE_SECONDS = 6 * 3600
+# 記憶體中保留的增強結果筆數（0 = 停用記憶體層）
+MEMORY_CACHE_SIZE = 20000
+# 搜尋結果的有效秒數
+SEARCH_TTL = 6 * 3600
+
+
+def template_version(detail):
+    """
+    取得模板版本標記：優先使用 updatedAt，否則以內容雜湊代替。
+    """
+    for key in ("updatedAt", "updated_at", "version"):
+        if detail.get(key):
+            return str(detail[key])
+    digest = hashlib.sha1(json.dumps(
+        [detail.get("name"), detail.get("description"), detail.get("workflow")],
+        sort_keys=True, ensure_ascii=False,
+    ).encode("utf-8")).hexdigest()
+    return f"sha1:{digest}"
+
+
+class EnrichmentStore:
+    """
+    模板增強結果的儲存與背景更新。
+
+    Parameters
+    ----------
+    path : str — SQLite 檔案路徑（":memory:" 可用於測試）
+    fetch_detail : callable(wf_id) -> dict or None — 取得上游模板詳情
+    revalidate_seconds : float
+    memory_size : int — 記憶體 LRU 的筆數上限
+    mirror : Mapping, optional — 唯讀模板鏡像（id → [enrich_version,
+             template_version, checked_at, payload, node_types]）
+    """
+
+    def __init__(self, path=DEFAULT_PATH, fetch_detail=get_workflow_detail,
+                 revalidate_seconds=REVALIDATE_SECONDS, memory_size=MEMORY_CACHE_SIZE,
+                 mirror=None):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS enriched ("
+            " id TEXT PRIMARY KEY,"
+            " enrich_version INTEGER NOT NULL,"
+            " template_version TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " checked_at REAL NOT NULL,"
+            " node_types TEXT NOT NULL DEFAULT '[]')"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS searches ("
+            " query TEXT NOT NULL,"
+            " rows INTEGER NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " PRIMARY KEY (query, rows))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(enriched)")}
+        if "node_types" not in columns:
+            self._conn.execute("ALTER TABLE enriched ADD COLUMN node_types TEXT NOT NULL DEFAULT '[]'")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self._fetch_detail = fetch_detail
+        self.revalidate_seconds = revalidate_seconds
+        self.memory_size = memory_size
+        # id → [CompactTemplate, template_version, checked_at]
+        self._memory = OrderedDict()
+        self.mirror = mirror
+
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._worker = None
+
+    # ── 讀寫 ──
+
+    def get(self, wf_id):
+        """
+        讀取已儲存的結果。
+
+        Returns
+        -------
+        tuple: (payload: dict, template_version: str, checked_at: float) or None
+        """
+        key = str(wf_id)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._conn.execute(
+                    "SELECT payload, template_version, checked_at FROM enriched"
+                    " WHERE id = ? AND enrich_version = ?",
+                    (key, ENRICH_VERSION),
+                ).fetchone()
+                if row:
+                    entry = [CompactTemplate.from_dict(json.loads(row[0])), row[1], row[2]]
+                else:
+                    entry = self._from_mirror(key)
+                    if entry is None:
+                        return None
+                self._remember(key, entry)
+        template, version, checked_at = entry
+        return template.to_dict(), version, checked_at
+
+    def _from_mirror(self, key):
+        """由唯讀鏡像讀取（增強邏輯版本不符時視為未命中）"""
+        if self.mirror is None:
+            return None
+        record = self.mirror.get(key)
+        if not record or record[0] != ENRICH_VERSION:
+            return None
+        _, version, checked_at, payload, _ = record
+        return [CompactTemplate.from_dict(payload), version, checked_at]
+
+    def _remember(self, key, entry):
+        """放入記憶體 LRU（呼叫端需持有 self._lock）"""
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def put(self, wf_id, version, payload, node_types=()):
+        """儲存增強結果（node_types 供 feature_index 重建使用）"""
+        key = str(wf_id)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO enriched"
+                " (id, enrich_version, template_version, payload, checked_at, node_types)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, ENRICH_VERSION, version,
+                 json.dumps(payload, ensure_ascii=False), now,
+                 json.dumps(list(node_types))),
+            )
+            self._conn.commit()
+            self._remember(key, [CompactTemplate.from_dict(payload), version, now])
+
+    def get_search(self, query, rows):
+        """
+        讀取已儲存的搜尋結果。
+
+        Returns
+        -------
+        tuple: (workflows: list[dict], fetched_at: float) or None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, fetched_at FROM searches WHERE query = ? AND rows = ?",
+                (query, rows),
+            ).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put_search(self, query, rows, workflows):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO searches (query, rows, payload, fetched_at)"
+                " VALUES (?, ?, ?, ?)",
+                (query, rows, json.dumps(workflows, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def iter_rows(self):
+        """
+        逐筆產出完整紀錄（含鏡像中 SQLite 沒有的模板），供 catalog_artifact 建立模板鏡像。
+
+        Yields
+        ------
+        tuple: (id, enrich_version, template_version, checked_at, payload, node_types)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, enrich_version, template_version, checked_at, payload, node_types"
+                " FROM enriched"
+            ).fetchall()
+        for wf_id, enrich_version, version, checked_at, payload, node_types in rows:
+            yield wf_id, enrich_version, version, checked_at, json.loads(payload), json.loads(node_types)
+        if self.mirror is not None:
+            local = {row[0] for row in rows}
+            for wf_id in self.mirror:
+                if wf_id not in local:
+                    yield (wf_id, *self.mirror[wf_id])
+
+    def iter_node_types(self):
+        """逐筆產出 (id, node_types)，供建立特徵索引（含鏡像中 SQLite 沒有的模板）"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, node_types FROM enriched").fetchall()
+        for wf_id, node_types in rows:
+            yield wf_id, json.loads(node_types)
+        if self.mirror is not None:
+            local = {wf_id for wf_id, _ in rows}
+            for wf_id in self.mirror:
+                if wf_id not in local:
+                    yield wf_id, self.mirror[wf_id][4]
+
+    def touch(self, wf_id):
+        """標記結果已確認為最新"""
+        key = str(wf_id)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE enriched SET checked_at = ? WHERE id = ?",
+                (now, key),
+            )
+            self._conn.commit()
+            entry = self._memory.get(key)
+            if entry is not None:
+                entry[2] = now
+
+    def enrich_and_store(self, detail, wf_id):
+        """對上游詳情執行 enrich_workflow 並儲存"""
+        enriched = enrich_workflow(detail, wf_id=wf_id)
+        if enriched:
+            self.put(wf_id, template_version(detail), enriched, node_types_from_detail(detail))
+        return enriched
+
+    # ── 主要入口 ──
+
+    def get_enriched(self, wf_id):
+        """
+        取得模板的增強結果。命中時直接回傳（必要時排入背景確認），
+        未命中時同步向上游取得並儲存。
+
+        Returns
+        -------
+        dict or None
+        """
+        cached = self.get(wf_id)
+        if cached:
+            payload, _, checked_at = cached
+            if time.time() - checked_at > self.revalidate_seconds:
+                self.schedule_revalidate(wf_id)
+            return payload
+
+        detail = self._fetch_detail(wf_id)
+        if not detail:
+            return None
+        return self.enrich_and_store(detail, wf_id)
+
+    # ── 背景確認 ──
+
+    def schedule_revalidate(self, wf_id):
+        """排入背景確認（同一 id 不重複排入）"""
+        key = str(wf_id)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._worker_loop, name="enrichment-revalidate", daemon=True,
+                )
+                self._worker.start()
+        self._queue.put(wf_id)
+
+    def revalidate(self, wf_id):
+        """向上游確認版本；版本相同只更新確認時間，不同則重新計算"""
+        detail = self._fetch_detail(wf_id)
+        if not detail:
+            return
+        cached = self.get(wf_id)
+        if cached and cached[1] == template_version(detail):
+            self.touch(wf_id)
+        else:
+            self.enrich_and_store(detail, wf_id)
+
+    def _worker_loop(self):
+        while True:
+            wf_id = self._queue.get()
+            try:
+                # 背景確認只使用上游的剩餘額度
+                with priority(PRIORITY_BACKGROUND):
+                    self.revalidate(wf_id)
+            except Exception as e:
+                log.warning("Revalidate error for %s: %r", wf_id, e)
+            finally:
+                with self._lock:
+                    self._pending.discard(str(wf_id))
+                self._queue.task_done()
+
+    def wait_idle(self):
+        """等待背景確認完成（測試與關閉時使用）"""
+        self._queue.join()
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_store():
+    """取得程序共用的預設 store"""
+    global _default_store
+    if _default_store is None:
+        with _default_lock:
+            if _default_store is None:
+                from core.catalog_artifact import TEMPLATES_TABLE, get_catalog
+                catalog = get_catalog()
+                mirror = None
+                if catalog is not None and catalog.has_table(TEMPLATES_TABLE):
+                    mirror = catalog.table(TEMPLATES_TABLE)
+                _default_store = EnrichmentStore(mirror=mirror)
+    return _default_store
@@ -0,0 +1,198 @@
+"""
+estimator.py — 向量化的成本、困難度與工期估算
+
+dynamic_composer 的 compose_difficulty / compose_cost 一次只估算一份路徑圖；
+此模組以 NumPy 陣列一次估算多個痛點（投資組合層級規劃），
+回傳數值型的上下限陣列與總計，字串格式化只留在呈現層。
+
+成本參數與進階 AI 動作定義在 dynamic_composer（單份估算不需載入 NumPy），
+此模組直接沿用，兩邊的金額與分數一致。
+"""
+
+import numpy as np
+
+from core.dynamic_composer import (
+    ADVANCED_ACTIONS, BASE_PRICE, LOWER_RATIO, NODE_PRICE, ROUND_UNIT, UPPER_RATIO,
+)
+
+# ── 困難度模型 ──
+MAX_DIFFICULTY = 5
+LONG_WORKFLOW_NODES = 7
+
+# 每個因素 +1 困難度；欄位順序即 factors 矩陣的欄位順序
+COMPLEXITY_FACTORS = ("即時處理", "大量資料", "多系統整合", "合規/安全", "跨部門協作", "機器學習")
+
+# ── 工期模型（週），與 compose_steps 的步驟對應 ──
+# (stage, 最短週數, 最長週數)；stage_flags 矩陣的欄位順序與此相同
+STAGES = (
+    ("requirements", 1, 1),   # 需求確認與資料盤點（必有）
+    ("sources", 1, 2),        # 串接資料來源
+    ("logic", 1, 2),          # 建構核心邏輯
+    ("logic_heavy", 2, 3),    # 建構核心邏輯（預測 / 影像 / 風險）
+    ("decision", 1, 1),       # 設定條件分流
+    ("outputs", 1, 1),        # 設定輸出通道
+    ("testing", 1, 2),        # 端到端測試（必有）
+)
+_STAGE_LOWER = np.array([s[1] for s in STAGES], dtype=np.int64)
+_STAGE_UPPER = np.array([s[2] for s in STAGES], dtype=np.int64)
+
+# 與 dynamic_composer.compose_steps 相同的判斷條件
+_HEAVY_LOGIC_ACTIONS = frozenset(["預測分析", "影像辨識", "風險評估"])
+_DECISION_ACTIONS = frozenset(["分類判斷", "風險評估", "異常偵測", "預測分析"])
+
+
+# ══════════════════════════════════════════════════════════
+#  向量化估算
+# ══════════════════════════════════════════════════════════
+
+def batch_difficulty(node_counts, source_counts, advanced_flags, factors):
+    """
+    向量化計算困難度分數（與 compose_difficulty 的分數一致）。
+
+    Parameters
+    ----------
+    node_counts : array-like[int]       — 每份工作流的節點數
+    source_counts : array-like[int]     — 偵測到的資料來源數
+    advanced_flags : array-like[bool]   — 是否包含進階 AI 動作
+    factors : array-like[bool] (n, len(COMPLEXITY_FACTORS))
+
+    Returns
+    -------
+    np.ndarray[int64] — 1~5
+    """
+    node_counts = np.asarray(node_counts, dtype=np.int64)
+    source_counts = np.asarray(source_counts, dtype=np.int64)
+    factors = np.asarray(factors, dtype=bool).reshape(len(node_counts), len(COMPLEXITY_FACTORS))
+
+    score = (
+        1
+        + (source_counts >= 2)
+        + np.asarray(advanced_flags, dtype=bool)
+        + factors.sum(axis=1)
+        + (node_counts >= LONG_WORKFLOW_NODES)
+    )
+    return np.minimum(score, MAX_DIFFICULTY).astype(np.int64)
+
+
+def batch_cost(node_counts, difficulty_scores):
+    """
+    向量化估算導入成本（與 compose_cost 的金額一致）。
+
+    Returns
+    -------
+    tuple: (lower, upper) — np.ndarray[int64]，單位為新台幣
+    """
+    node_counts = np.asarray(node_counts, dtype=np.float64)
+    difficulty_scores = np.asarray(difficulty_scores, dtype=np.float64)
+
+    # 困難度係數：1->1.0, 3->1.5, 5->2.0
+    multiplier = 1.0 + (difficulty_scores - 1) * 0.25
+    raw_estimate = (BASE_PRICE + (node_counts * NODE_PRICE)) * multiplier
+
+    lower = np.floor(raw_estimate * LOWER_RATIO / ROUND_UNIT).astype(np.int64) * ROUND_UNIT
+    upper = np.floor(raw_estimate * UPPER_RATIO / ROUND_UNIT).astype(np.int64) * ROUND_UNIT
+    return lower, upper
+
+
+def batch_duration(stage_flags):
+    """
+    向量化估算導入工期（週）。
+
+    Parameters
+    ----------
+    stage_flags : array-like[bool] (n, len(STAGES))
+
+    Returns
+    -------
+    tuple: (lower, upper) — np.ndarray[int64]，單位為週
+    """
+    stage_flags = np.asarray(stage_flags, dtype=np.int64).reshape(-1, len(STAGES))
+    return stage_flags @ _STAGE_LOWER, stage_flags @ _STAGE_UPPER
+
+
+def estimate_portfolio(node_counts, difficulty_scores, stage_flags):
+    """
+    一次估算多份路徑圖的成本與工期。
+
+    Returns
+    -------
+    dict with: cost_lower, cost_upper, weeks_lower, weeks_upper (np.ndarray),
+               totals (dict of int)
+    """
+    cost_lower, cost_upper = batch_cost(node_counts, difficulty_scores)
+    weeks_lower, weeks_upper = batch_duration(stage_flags)
+    return {
+        "cost_lower": cost_lower,
+        "cost_upper": cost_upper,
+        "weeks_lower": weeks_lower,
+        "weeks_upper": weeks_upper,
+        "totals": {
+            "count": int(len(cost_lower)),
+            "cost_lower": int(cost_lower.sum()),
+            "cost_upper": int(cost_upper.sum()),
+            "weeks_lower": int(weeks_lower.sum()),
+            "weeks_upper": int(weeks_upper.sum()),
+            # 若各專案可平行推動，整體工期取決於最長者
+            "parallel_weeks_upper": int(weeks_upper.max()) if len(weeks_upper) else 0,
+        },
+    }
+
+
+def features_from_analyses(analyses, node_counts):
+    """
+    將多份 analyze_pain_point() 結果轉成估算所需的陣列。
+
+    Returns
+    -------
+    dict with: node_counts, source_counts, advanced_flags, factors, stage_flags, difficulty
+    """
+    n = len(analyses)
+    source_counts = np.zeros(n, dtype=np.int64)
+    advanced_flags = np.zeros(n, dtype=bool)
+    factors = np.zeros((n, len(COMPLEXITY_FACTORS)), dtype=bool)
+    stage_flags = np.zeros((n, len(STAGES)), dtype=bool)
+    stage_flags[:, 0] = True    # requirements
+    stage_flags[:, -1] = True   # testing
+
+    for i, analysis in enumerate(analyses):
+        sources = analysis.get("data_sources", [])
+        actions = analysis.get("actions", [])
+        complexity = analysis.get("complexity", [])
+
+        source_counts[i] = len(sources)
+        advanced_flags[i] = not ADVANCED_ACTIONS.isdisjoint(actions)
+        factors[i] = [f in complexity for f in COMPLEXITY_FACTORS]
+
+        heavy = not _HEAVY_LOGIC_ACTIONS.isdisjoint(actions)
+        stage_flags[i, 1] = bool(sources)
+        stage_flags[i, 2] = bool(actions) and not heavy
+        stage_flags[i, 3] = bool(actions) and heavy
+        stage_flags[i, 4] = not _DECISION_ACTIONS.isdisjoint(actions)
+        stage_flags[i, 5] = bool(analysis.get("outputs"))
+
+    node_counts = np.asarray(node_counts, dtype=np.int64)
+    return {
+        "node_counts": node_counts,
+        "source_counts": source_counts,
+        "advanced_flags": advanced_flags,
+        "factors": factors,
+        "stage_flags": stage_flags,
+        "difficulty": batch_difficulty(node_counts, source_counts, advanced_flags, factors),
+    }
+
+
+# ══════════════════════════════════════════════════════════
+#  呈現層
+# ══════════════════════════════════════════════════════════
+
+def format_cost(lower, upper):
+    """格式化成本區間，如「7萬 ~ 10萬 TWD」"""
+    return f"{int(lower) // 10000}萬 ~ {int(upper) // 10000}萬 TWD"
+
+
+def format_weeks(lower, upper):
+    """格式化工期區間，如「6~10 週」"""
+    lower, upper = int(lower), int(upper)
+    if lower == upper:
+        return f"{lower} 週"
+    return f"{lower}~{upper} 週"
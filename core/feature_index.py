@@ -0,0 +1,303 @@
+"""
+feature_index.py — 社群模板的節點類型特徵索引
+
+將每個模板的節點類型歸納為節點家族（AI、HTTP、資料庫、決策…），
+以整數 bitset 表示：
+  1. 每個模板一個家族 bitset + 節點總數 + 各家族節點數
+  2. 每個家族一個「模板位置」bitmap，查詢以 bitmap AND 完成
+  3. 依 pain_analyzer 偵測到的結構（資料源 / 動作 / 輸出）計算重疊分數，
+     讓 search_and_enrich 在抓取詳情前先排序候選
+
+例：「使用 Postgres 且包含 AI 節點、少於 10 個節點」的模板：
+    index.query(all_of=["postgres", "ai"], max_nodes=9)
+"""
+
+import threading
+from functools import lru_cache
+
+# ══════════════════════════════════════════════════════════
+#  節點家族定義
+# ══════════════════════════════════════════════════════════
+
+# 家族 → 節點 type 最後一段（小寫）包含的片段
+NODE_FAMILIES = {
+    "ai": ["openai", "langchain", "anthropic", "gemini", "mistral", "ollama", "huggingface", "agent"],
+    "http": ["httprequest", "graphql"],
+    "webhook": ["webhook", "respondtowebhook"],
+    "schedule": ["scheduletrigger", "cron", "interval"],
+    "decision": ["if", "switch", "filter", "compareddatasets"],
+    "code": ["code", "function", "functionitem"],
+    "postgres": ["postgres"],
+    "mysql": ["mysql"],
+    "mongodb": ["mongodb"],
+    "spreadsheet": ["googlesheets", "spreadsheetfile", "microsoftexcel", "airtable"],
+    "email": ["gmail", "emailsend", "emailreadimap", "microsoftoutlook", "sendgrid", "mailchimp"],
+    "chat": ["slack", "telegram", "discord", "line", "microsoftteams", "whatsapp"],
+    "crm": ["hubspot", "salesforce", "pipedrive", "zohocrm"],
+    "form": ["formtrigger", "typeform", "googleforms", "jotform"],
+    "files": ["readbinaryfile", "googledrive", "awss3", "s3", "dropbox", "ftp"],
+    "ecommerce": ["shopify", "woocommerce", "stripe"],
+}
+# 需要精確比對（避免 "if" 命中 "notifier" 之類的子字串）的家族
+_EXACT_FAMILIES = {"decision", "code"}
+
+FAMILY_NAMES = tuple(NODE_FAMILIES)
+FAMILY_BIT = {name: 1 << i for i, name in enumerate(FAMILY_NAMES)}
+# 資料庫家族的聯集
+DATABASE_MASK = FAMILY_BIT["postgres"] | FAMILY_BIT["mysql"] | FAMILY_BIT["mongodb"]
+
+# pain_analyzer 偵測結果 → 期望的節點家族
+ANALYSIS_FAMILIES = {
+    # 資料來源
+    "CRM": ["crm"],
+    "ERP": ["http"],
+    "資料庫": ["postgres", "mysql", "mongodb"],
+    "Excel/CSV": ["spreadsheet"],
+    "API 介接": ["http"],
+    "Email": ["email"],
+    "網站/爬蟲": ["http"],
+    "社群媒體": ["http"],
+    "IoT/感測器": ["webhook"],
+    "表單系統": ["form"],
+    "檔案系統": ["files"],
+    "POS/收銀": ["ecommerce"],
+    # 動作
+    "預測分析": ["ai"],
+    "分類判斷": ["ai", "decision"],
+    "文字分析": ["ai"],
+    "影像辨識": ["ai"],
+    "推薦引擎": ["ai"],
+    "風險評估": ["ai", "decision"],
+    "異常偵測": ["decision"],
+    "統計彙總": ["code"],
+    "資料比對": ["code"],
+    # 輸出
+    "Email 通知": ["email"],
+    "LINE 通知": ["chat"],
+    "Slack 通知": ["chat"],
+    "即時警報": ["chat", "email"],
+    "自動報表": ["spreadsheet"],
+    "Google Sheets": ["spreadsheet"],
+    "資料儲存": ["postgres", "mysql", "mongodb"],
+    "自動回覆": ["webhook"],
+}
+
+
+@lru_cache(maxsize=2048)
+def classify_node_type(node_type):
+    """將單一節點 type 轉為家族 bitset（結果依 type 快取）"""
+    last = (node_type or "").rsplit(".", 1)[-1].lower()
+    mask = 0
+    for family, fragments in NODE_FAMILIES.items():
+        if family in _EXACT_FAMILIES:
+            hit = last in fragments
+        else:
+            hit = any(f in last for f in fragments)
+        if hit:
+            mask |= FAMILY_BIT[family]
+    return mask
+
+
+def families_to_mask(families):
+    """家族名稱列表 → bitset"""
+    mask = 0
+    for name in families:
+        mask |= FAMILY_BIT[name]
+    return mask
+
+
+def mask_to_families(mask):
+    """bitset → 家族名稱列表"""
+    return [name for name in FAMILY_NAMES if mask & FAMILY_BIT[name]]
+
+
+def families_for_analysis(analysis):
+    """依 analyze_pain_point() 的結果推導期望的家族 bitset"""
+    if not analysis:
+        return 0
+    mask = 0
+    for key in ("data_sources", "actions", "outputs"):
+        for item in analysis.get(key, []):
+            mask |= families_to_mask(ANALYSIS_FAMILIES.get(item, []))
+    return mask
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+def node_types_from_search(wf):
+    """search API 結果中的節點列表（type 放在 name 欄位）"""
+    return [n.get("name") or n.get("type") or "" for n in wf.get("nodes") or []]
+
+
+def node_types_from_detail(detail):
+    """工作流詳情中的節點 type 列表（排除 sticky note / noOp）"""
+    types = []
+    for n in (detail or {}).get("workflow", {}).get("nodes", []):
+        node_type = n.get("type", "")
+        if "stickyNote" in node_type or "noOp" in node_type:
+            continue
+        types.append(node_type)
+    return types
+
+
+# ══════════════════════════════════════════════════════════
+#  索引
+# ══════════════════════════════════════════════════════════
+
+class FeatureIndex:
+    """
+    模板特徵索引。
+
+    每個模板占一個位置（position）；家族 posting 為 Python int bitmap，
+    第 position 個 bit 表示該模板包含此家族的節點。
+    節點總數未知（只來自 search 結果）時記為 -1，數量條件不會排除它。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._positions = {}          # wf_id → position
+        self.ids = []
+        self.masks = []
+        self.node_counts = []
+        self.family_counts = []       # 每個模板 {family: count}
+        self._postings = [0] * len(FAMILY_NAMES)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, wf_id):
+        return str(wf_id) in self._positions
+
+    def add(self, wf_id, node_types, node_count=None):
+        """
+        新增或更新模板。
+
+        Parameters
+        ----------
+        node_types : list[str] — 節點 type（可重複，用於計算各家族數量）
+        node_count : int, optional — 預設為 len(node_types)；-1 表示未知
+            （來自 search 結果）。已有詳情建立的項目時，未知節點數的更新會被略過。
+        """
+        counts = {}
+        mask = 0
+        for node_type in node_types:
+            node_mask = classify_node_type(node_type)
+            mask |= node_mask
+            for name in mask_to_families(node_mask):
+                counts[name] = counts.get(name, 0) + 1
+        if node_count is None:
+            node_count = len(node_types)
+
+        key = str(wf_id)
+        with self._lock:
+            pos = self._positions.get(key)
+            if pos is None:
+                pos = len(self.ids)
+                self._positions[key] = pos
+                self.ids.append(key)
+                self.masks.append(0)
+                self.node_counts.append(-1)
+                self.family_counts.append({})
+            elif node_count < 0 and self.node_counts[pos] >= 0:
+                return      # search 結果的節點較不完整，不覆蓋詳情建立的 mask 與家族數量
+            # 清除舊 bit，設定新 bit
+            bit = 1 << pos
+            old_mask = self.masks[pos]
+            for i, name in enumerate(FAMILY_NAMES):
+                family_bit = FAMILY_BIT[name]
+                if old_mask & family_bit and not mask & family_bit:
+                    self._postings[i] &= ~bit
+                elif mask & family_bit:
+                    self._postings[i] |= bit
+            self.masks[pos] = mask
+            self.node_counts[pos] = node_count
+            self.family_counts[pos] = counts
+
+    def mask_of(self, wf_id):
+        """模板的家族 bitset（未索引時為 0）"""
+        pos = self._positions.get(str(wf_id))
+        return self.masks[pos] if pos is not None else 0
+
+    def features(self, wf_id):
+        """
+        Returns
+        -------
+        dict with: families, node_count, family_counts — 或 None
+        """
+        pos = self._positions.get(str(wf_id))
+        if pos is None:
+            return None
+        return {
+            "families": mask_to_families(self.masks[pos]),
+            "node_count": self.node_counts[pos],
+            "family_counts": dict(self.family_counts[pos]),
+        }
+
+    def overlap(self, wf_id, wanted_mask):
+        """模板與期望家族的重疊數"""
+        return popcount(self.mask_of(wf_id) & wanted_mask)
+
+    def query(self, all_of=(), any_of=(), none_of=(), min_nodes=None, max_nodes=None):
+        """
+        以 bitmap 交集查詢模板。
+
+        Parameters
+        ----------
+        all_of : 必須全部包含的家族
+        any_of : 至少包含其一的家族
+        none_of : 不可包含的家族
+        min_nodes / max_nodes : 節點總數範圍（含端點）
+
+        Returns
+        -------
+        list[str] — 模板 id
+        """
+        with self._lock:
+            universe = (1 << len(self.ids)) - 1
+            hits = universe
+            for name in all_of:
+                hits &= self._postings[FAMILY_NAMES.index(name)]
+            if any_of:
+                union = 0
+                for name in any_of:
+                    union |= self._postings[FAMILY_NAMES.index(name)]
+                hits &= union
+            for name in none_of:
+                hits &= ~self._postings[FAMILY_NAMES.index(name)]
+
+            results = []
+            while hits:
+                low = hits & -hits
+                pos = low.bit_length() - 1
+                hits ^= low
+                count = self.node_counts[pos]
+                if count >= 0:
+                    if min_nodes is not None and count < min_nodes:
+                        continue
+                    if max_nodes is not None and count > max_nodes:
+                        continue
+                results.append(self.ids[pos])
+            return results
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_index():
+    """
+    取得程序共用的索引；第一次使用時以 enrichment_store 中
+    已儲存模板的節點類型建立。
+    """
+    global _default_index
+    if _default_index is None:
+        with _default_lock:
+            if _default_index is None:
+                from core.enrichment_store import get_store
+                index = FeatureIndex()
+                for wf_id, node_types in get_store().iter_node_types():
+                    index.add(wf_id, node_types)
+                _default_index = index
+    return _default_index
@@ -3,16 +3,30 @@ industry_adapter.py — 產業適配器
 
 根據用戶輸入的產業名稱，從 industry_mapping.json 動態解析
 對應的部門、AI 維度與維度權重，供 matcher 加權使用。
+
+已建立 catalog_artifact 時，產業資料由 mmap 檔案逐筆解碼，
+不必每次呼叫都重新解析整份 JSON。
 """
 
 import json
 import os
 
+from core.catalog_artifact import get_catalog
+
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 
 
 def load_industry_mapping():
-    """載入產業對應表"""
+    """
+    載入產業對應表。
+
+    Returns
+    -------
+    Mapping — 產業名稱 → 產業資訊（catalog 可用時為 RecordMap）
+    """
+    catalog = get_catalog()
+    if catalog is not None:
+        return catalog.table("industry_mapping")
     with open(os.path.join(DATA_DIR, "industry_mapping.json"), "r", encoding="utf-8") as f:
         data = json.load(f)
     return data["industries"]
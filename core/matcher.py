@@ -1,17 +1,44 @@
 """
 matcher.py — TF-IDF 痛點匹配引擎
 
-使用 scikit-learn 的 TfidfVectorizer 將用戶描述的痛點
-與 n8n_solutions.json 中的解決方案進行向量化匹配。
+以 core.tfidf 的字元 n-gram TF-IDF（與 scikit-learn 的 char_wb 分數相同）
+將用戶描述的痛點與 n8n_solutions.json 中的解決方案進行向量化匹配。
+
+方案庫的向量化結果只在第一次查詢時建立並快取；產業情境文字
+也預先轉成加權後的情境向量，依 (產業, 部門) 快取，
+因此每次查詢只需向量化使用者輸入的痛點本身。
+
+索引中的方案以 compact.CompactSolution 保存，只有回傳的 Top-N
+才還原成 dict。已建立 catalog_artifact 時，方案、詞彙、idf 與矩陣
+直接由 mmap 檔案取得，不需解析 JSON 或重新計算。
 """
 
 import json
 import os
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+from functools import lru_cache
+
+from core.catalog_artifact import get_catalog
+from core.compact import CompactSolution
+from core.industry_adapter import get_industry_context_text
+from core.tfidf import CharTfidf, add_scaled
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 
+# 情境向量相對於痛點向量的權重（0 = 忽略產業情境）
+CONTEXT_WEIGHT = 0.5
+
+# TF-IDF 向量化參數（支援中英文混合）
+TFIDF_PARAMS = {
+    "analyzer": "char_wb",   # 字元級分詞，對中文友好
+    "ngram_range": (2, 4),   # 2~4 字元 n-gram
+    "max_features": 5000,
+    "sublinear_tf": True,
+}
+
+_index = None
+_index_lock = threading.Lock()
+
 
 def load_solutions():
     """載入 n8n 解決方案庫"""
@@ -37,41 +64,101 @@ def build_solution_corpus(solutions):
     return corpus
 
 
-def match_solutions(user_query, top_n=3):
+def fit_index(solutions):
+    """
+    以方案庫語料訓練向量化器。
+
+    Returns
+    -------
+    tuple: (CharTfidf, CsrMatrix)
+    """
+    vectorizer = CharTfidf(**TFIDF_PARAMS)
+    matrix = vectorizer.fit_transform(build_solution_corpus(solutions))
+    return vectorizer, matrix
+
+
+def _load_index_from_catalog():
+    """
+    由 catalog_artifact 取得索引；檔案不存在或參數不符時回傳 None。
+    """
+    catalog = get_catalog()
+    if catalog is None or catalog.tfidf_params() != json.loads(json.dumps(TFIDF_PARAMS)):
+        return None
+    vectorizer = CharTfidf.from_fitted(TFIDF_PARAMS, catalog.vocabulary(), catalog.idf())
+    solutions = catalog.table("n8n_solutions", decode=CompactSolution.from_dict)
+    return solutions, vectorizer, catalog.tfidf_matrix()
+
+
+def _get_index():
+    """
+    取得（必要時建立）方案庫索引。
+
+    Returns
+    -------
+    tuple: (solutions, vectorizer, solution_matrix)
+        solutions 的每一項都有 to_dict()（CompactSolution）
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = _load_index_from_catalog()
+                if index is None:
+                    solutions = load_solutions()
+                    vectorizer, matrix = fit_index(solutions)
+                    compact = tuple(CompactSolution.from_dict(sol) for sol in solutions)
+                    index = (compact, vectorizer, matrix)
+                _index = index
+    return _index
+
+
+@lru_cache(maxsize=256)
+def get_context_vector(industry_name, department_name=None):
+    """
+    取得產業（與部門）情境文字的 TF-IDF 向量，結果依 key 快取。
+
+    Returns
+    -------
+    dict {欄位: 權重} or None — 無情境文字時回傳 None（呼叫端不可修改）
+    """
+    text = get_industry_context_text(industry_name, department_name or None)
+    if not text:
+        return None
+    _, vectorizer, _ = _get_index()
+    return vectorizer.transform(text)
+
+
+def match_solutions(user_query, top_n=3, context=None, context_weight=CONTEXT_WEIGHT):
     """
     將用戶痛點描述與 n8n 解決方案庫進行 TF-IDF + cosine similarity 匹配。
 
     Parameters
     ----------
     user_query : str
-        用戶描述的業務痛點。
+        用戶描述的業務痛點（不需再附加產業情境文字）。
     top_n : int
         回傳的方案數量。
+    context : tuple, optional
+        情境 key，格式為 (產業, 部門)；部門可為 None。
+    context_weight : float
+        情境向量的加權係數。
 
     Returns
     -------
     list[dict]
         排序後的匹配結果，每項包含 solution 物件與 similarity 分數。
     """
-    solutions = load_solutions()
-    corpus = build_solution_corpus(solutions)
-
-    # 加入用戶查詢作為最後一項
-    corpus.append(user_query)
-
-    # TF-IDF 向量化（支援中英文混合）
-    vectorizer = TfidfVectorizer(
-        analyzer="char_wb",   # 字元級分詞，對中文友好
-        ngram_range=(2, 4),   # 2~4 字元 n-gram
-        max_features=5000,
-        sublinear_tf=True,
-    )
-    tfidf_matrix = vectorizer.fit_transform(corpus)
-
-    # 計算用戶查詢（最後一項）與所有方案的相似度
-    query_vector = tfidf_matrix[-1]
-    solution_vectors = tfidf_matrix[:-1]
-    similarities = cosine_similarity(query_vector, solution_vectors).flatten()
+    solutions, vectorizer, solution_vectors = _get_index()
+
+    # 只向量化用戶查詢本身；情境向量從快取取得
+    query_vector = vectorizer.transform(user_query)
+    if context and context_weight:
+        industry_name, department_name = context
+        context_vector = get_context_vector(industry_name, department_name or None)
+        if context_vector is not None:
+            query_vector = add_scaled(query_vector, context_vector, context_weight)
+
+    similarities = solution_vectors.cosine(query_vector)
 
     # 排序並取 Top-N
     ranked_indices = similarities.argsort()[::-1][:top_n]
@@ -80,7 +167,7 @@ def match_solutions(user_query, top_n=3):
     for idx in ranked_indices:
         if similarities[idx] > 0:
             results.append({
-                "solution": solutions[idx],
+                "solution": solutions[idx].to_dict(),
                 "similarity": round(float(similarities[idx]), 4),
             })
 
@@ -92,6 +179,6 @@ def load_tools():
     """向後兼容"""
     return load_solutions()
 
-def match_tools(user_query, dimension_weights=None, top_n=5):
+def match_tools(user_query, dimension_weights=None, top_n=5, context=None):
     """向後兼容"""
-    return match_solutions(user_query, top_n=top_n)
+    return match_solutions(user_query, top_n=top_n, context=context)
@@ -0,0 +1,462 @@
+"""
+n8n_async.py — asyncio 版 n8n 社群 API 用戶端
+
+與 n8n_community 的 search_workflows / get_workflow_detail / search_and_enrich
+語意相同，但以 asyncio 串流直接發出 HTTP 請求，不需要每個上游呼叫占用一條執行緒：
+  1. Semaphore 限制同時進行的上游請求數
+  2. asyncio.wait_for 控制單次請求逾時
+  3. 呼叫端斷線時可取消整個搜尋（run_sync 的 cancel_check）
+  4. 已儲存於 enrichment_store 的模板不再抓取詳情；搜尋結果在 SEARCH_TTL 內也直接使用
+  5. 實際連線交給 upstream 排程器（全域速率、優先順序、去重）
+  6. lazy 模式（search_candidates）只回傳重排序後的摘要，詳情由呼叫端按需取得
+
+同步呼叫端透過 run_sync() 或 n8n_community.search_and_enrich() 使用。
+"""
+
+import asyncio
+import json
+import logging
+import time
+import urllib.parse
+
+from core import n8n_community
+from core.enrichment_store import SEARCH_TTL, get_store
+from core.feature_index import (
+    families_for_analysis,
+    get_index,
+    node_types_from_detail,
+    node_types_from_search,
+)
+from core.n8n_community import SSL_CTX, TIMEOUT, translate_keywords, translate_to_zh
+from core.reranker import rerank, select_for_detail
+from core.search_planner import get_stats, plan_queries
+from core.request_log import upstream_call
+from core.upstream import get_scheduler
+
+log = logging.getLogger(__name__)
+
+# 同時進行的上游請求上限
+MAX_CONCURRENCY = 8
+# 每個查詢取回的候選數
+SEARCH_ROWS = 8
+# 達到此重排序分數的候選數量足夠時，停止等待其餘查詢
+EARLY_STOP_SCORE = 0.25
+# 提前停止模式下第一批發出的查詢數（依歷史有結果比例排序的前幾個）
+FIRST_WAVE = 2
+# 第一批查詢在此秒數內未全部完成時，不再等待而發出其餘查詢
+FIRST_WAVE_DEADLINE = 1.0
+# 最多跟隨幾次 HTTP 轉址
+MAX_REDIRECTS = 3
+# run_sync 檢查呼叫端是否斷線的間隔（秒）
+CANCEL_POLL_INTERVAL = 0.2
+
+USER_AGENT = "n8n-ai-consultant/1.0"
+
+
+class UpstreamError(Exception):
+    """上游回應非 2xx 狀態碼"""
+
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+        self.url = url
+
+
+# ══════════════════════════════════════════════════════════
+#  最小 HTTP/1.1 GET（asyncio streams）
+# ══════════════════════════════════════════════════════════
+
+async def _read_chunked(reader):
+    """讀取 Transfer-Encoding: chunked 的本文"""
+    body = bytearray()
+    while True:
+        size_line = await reader.readline()
+        size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+        if size == 0:
+            # 略過 trailer
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return bytes(body)
+        body += await reader.readexactly(size)
+        await reader.readline()
+
+
+async def _http_get(url):
+    """
+    發出單次 GET 請求。
+
+    Returns
+    -------
+    tuple: (status, headers: dict, body: bytes)
+    """
+    parts = urllib.parse.urlsplit(url)
+    is_https = parts.scheme == "https"
+    port = parts.port or (443 if is_https else 80)
+    host_header = parts.hostname if parts.port is None else f"{parts.hostname}:{parts.port}"
+    path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, port,
+        ssl=SSL_CTX if is_https else None,
+        server_hostname=parts.hostname if is_https else None,
+    )
+    try:
+        writer.write((
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host_header}\r\n"
+            f"User-Agent: {USER_AGENT}\r\n"
+            "Accept: application/json\r\n"
+            "Accept-Encoding: identity\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("ascii"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await _read_chunked(reader)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+        return status, headers, body
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, asyncio.CancelledError):
+            pass
+
+
+async def fetch_json(url):
+    """GET 並解析 JSON，跟隨轉址；非 2xx 時拋出 UpstreamError"""
+    for _ in range(MAX_REDIRECTS + 1):
+        status, headers, body = await _http_get(url)
+        if status in (301, 302, 303, 307, 308) and headers.get("location"):
+            url = urllib.parse.urljoin(url, headers["location"])
+            continue
+        if not 200 <= status < 300:
+            raise UpstreamError(status, url)
+        return json.loads(body.decode("utf-8"))
+    raise UpstreamError(status, url)
+
+
+# ══════════════════════════════════════════════════════════
+#  用戶端
+# ══════════════════════════════════════════════════════════
+
+class AsyncN8nClient:
+    """
+    n8n 社群 API 的 asyncio 用戶端。
+
+    一個 client 實例只應在單一 event loop 中使用
+    （Semaphore 會綁定到第一次使用它的 loop）。
+    """
+
+    def __init__(self, api_base=None, concurrency=MAX_CONCURRENCY, timeout=TIMEOUT, store=None,
+                 index=None, rerank_weights=None, stats=None, search_ttl=SEARCH_TTL):
+        self.api_base = api_base or n8n_community.API_BASE
+        self.timeout = timeout
+        # 搜尋結果快取的有效秒數（0 = 每次都向上游查詢，prefetch 以較短的值強制更新）
+        self.search_ttl = search_ttl
+        self.store = store or get_store()
+        self.index = index if index is not None else get_index()
+        self.rerank_weights = rerank_weights
+        self.stats = stats if stats is not None else get_stats()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _get_json(self, url):
+        # 實際連線由全域排程器送出（速率限制、優先順序、去重）；
+        # 逾時包含排隊時間
+        async with self._semaphore:
+            with upstream_call():
+                return await asyncio.wait_for(get_scheduler().fetch_async(url), self.timeout)
+
+    def _is_fresh(self, cached):
+        return bool(cached) and time.time() - cached[1] <= self.search_ttl
+
+    def _search_is_fresh(self, keywords_en, rows):
+        """搜尋結果是否在快取中且未過期（不需上游呼叫）"""
+        return self._is_fresh(self.store.get_search(keywords_en, rows))
+
+    async def search_workflows(self, keywords_en, rows=6):
+        """
+        搜尋 n8n 社群工作流。
+
+        Returns
+        -------
+        list[dict] — 每個含 id, name, totalViews, user
+        """
+        params = urllib.parse.urlencode({
+            "search": keywords_en,
+            "rows": rows,
+            "page": 1,
+        })
+        url = f"{self.api_base}/templates/search?{params}"
+        cached = self.store.get_search(keywords_en, rows)
+        if self._is_fresh(cached):
+            return cached[0]
+        try:
+            data = await self._get_json(url)
+            workflows = data.get("workflows", [])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Search error for %r: %r", keywords_en, e)
+            # 上游失敗時使用過期的快取結果
+            return cached[0] if cached else []
+        self.store.put_search(keywords_en, rows, workflows)
+        return workflows
+
+    async def get_workflow_detail(self, workflow_id):
+        """
+        取得單一工作流的完整詳情。
+
+        Returns
+        -------
+        dict or None
+        """
+        url = f"{self.api_base}/workflows/{workflow_id}"
+        try:
+            raw = await self._get_json(url)
+            return raw.get("data", {}).get("attributes", {})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning("Detail error for %s: %r", workflow_id, e)
+            return None
+
+    async def search_and_enrich(self, zh_keywords, industry="", max_results=5, analysis=None,
+                                early_stop=True):
+        """
+        搜尋 → 去重 → 重排序 → 取詳情 → 評估困難度。
+
+        候選查詢由 search_planner 一次產生，先發出有結果比例最高的幾個，
+        不足時才發出其餘查詢；結果陸續回來時去重，高分候選足夠時取消其餘查詢
+        （early_stop=False 時同時發出並等待所有查詢，例如預熱時讓每個查詢都進入快取）。候選在抓詳情前由 reranker 依
+        lexical / structure / views 打分；提供 analysis（analyze_pain_point
+        的結果）時才計入結構訊號。
+
+        Returns
+        -------
+        list[dict] — 每個已包含 nodes, difficulty, steps 等完整資訊
+        """
+        ranked = await self._collect_candidates(zh_keywords, industry, analysis,
+                                                stop_at=max_results if early_stop else None)
+        selected = select_for_detail(ranked, max_results)
+        candidates = [wf for _, wf, _ in selected]
+        scores = {wf["id"]: score for score, wf, _ in selected}
+        return await self._enrich_candidates(candidates, scores)
+
+    async def _collect_candidates(self, zh_keywords, industry, analysis, stop_at=None):
+        """
+        發出候選查詢、去重並重排序。
+
+        stop_at 為 None 時同時發出並等待所有查詢（lazy 模式的完整候選清單）。
+        否則先發出前 FIRST_WAVE 個查詢（及搜尋結果已在快取中的查詢），
+        只有在它們全部完成仍不足 stop_at 個
+        高分候選、或超過 FIRST_WAVE_DEADLINE 秒時才發出其餘查詢；
+        高分候選達 stop_at 個時取消尚未完成的查詢。
+
+        Returns
+        -------
+        list[tuple]: rerank 的 (score, workflow, parts)，依分數排序
+        """
+        en_query = translate_keywords(zh_keywords, industry)
+        wanted_mask = families_for_analysis(analysis)
+        plans = plan_queries(zh_keywords, industry, self.stats)
+
+        seen_ids = set()
+        all_raw = []
+
+        async def _run(form, query):
+            return form, await self.search_workflows(query, rows=SEARCH_ROWS)
+
+        tasks = []
+        pending = set()
+        waiting = list(plans)
+
+        def _issue(batch):
+            for plan in batch:
+                task = asyncio.ensure_future(_run(*plan))
+                tasks.append(task)
+                pending.add(task)
+                waiting.remove(plan)
+
+        loop = asyncio.get_running_loop()
+        if stop_at is None:
+            _issue(list(waiting))
+        else:
+            # 快取中的查詢不需上游呼叫，與第一批一起取得
+            _issue([plan for i, plan in enumerate(plans)
+                    if i < FIRST_WAVE or self._search_is_fresh(plan[1], SEARCH_ROWS)])
+        deadline = loop.time() + FIRST_WAVE_DEADLINE
+        try:
+            while pending or waiting:
+                if not pending:
+                    # 第一批全部完成仍不足
+                    _issue(list(waiting))
+                timeout = max(deadline - loop.time(), 0) if waiting else None
+                done, pending = await asyncio.wait(pending, timeout=timeout,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 第一批太慢
+                    _issue(list(waiting))
+                    continue
+                # 同時完成的查詢（例如快取命中）全部納入，依查詢計畫的順序處理
+                for task in sorted(done, key=tasks.index):
+                    form, found = task.result()
+                    new_count = 0
+                    for wf in found:
+                        wf_id = wf.get("id")
+                        if wf_id and wf_id not in seen_ids:
+                            seen_ids.add(wf_id)
+                            all_raw.append(wf)
+                            new_count += 1
+                    if self.stats is not None:
+                        self.stats.record(form, len(found), new_count)
+
+                # 高分候選足夠時提前停止
+                if stop_at is not None and len(all_raw) >= stop_at:
+                    ranked = rerank(all_raw, en_query, wanted_mask, self.index, self.rerank_weights)
+                    strong = sum(1 for score, _, _ in ranked if score >= EARLY_STOP_SCORE)
+                    if strong >= stop_at:
+                        break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # 以 search 結果中的節點類型更新特徵索引（不需抓詳情）
+        for wf in all_raw:
+            node_types = node_types_from_search(wf)
+            if node_types:
+                self.index.add(wf["id"], node_types, node_count=-1)
+
+        # 在抓詳情前以 lexical + structure + views 重排序
+        return rerank(all_raw, en_query, wanted_mask, self.index, self.rerank_weights)
+
+    async def search_candidates(self, zh_keywords, industry="", analysis=None):
+        """
+        lazy 模式：執行所有候選查詢並重排序，但不抓詳情。
+        已儲存增強結果的模板會帶上困難度與中文描述（不需上游呼叫）。
+
+        Returns
+        -------
+        list[dict] — 依 relevance 排序的摘要：id, name, url, views, creator,
+                     relevance, node_count, enriched（True 時另有 description / difficulty）
+        """
+        ranked = await self._collect_candidates(zh_keywords, industry, analysis)
+        return [self._summarize(wf, score) for score, wf, _ in ranked]
+
+    def _summarize(self, wf, score):
+        summary = {
+            "id": wf["id"],
+            "name": translate_to_zh(wf.get("name", "")),
+            "url": f"https://n8n.io/workflows/{wf['id']}",
+            "views": wf.get("totalViews", 0),
+            "creator": wf.get("user", {}).get("username", ""),
+            "relevance": round(score, 4),
+            "node_count": len(wf.get("nodes") or []),
+            "enriched": False,
+        }
+        cached = self.store.get(wf["id"])
+        if cached:
+            payload = cached[0]
+            for key in ("name", "description", "node_count", "difficulty", "difficulty_display"):
+                if key in payload:
+                    summary[key] = payload[key]
+            summary["enriched"] = True
+        return summary
+
+    async def _enrich_candidates(self, candidates, scores):
+        """取得候選的增強結果（優先使用已儲存者），附上 views / creator / relevance"""
+        # ── 已儲存的增強結果直接使用，其餘同時取得詳情 ──
+        enriched_by_id = {}
+        missing = []
+        for wf in candidates:
+            cached = self.store.get(wf["id"])
+            if cached:
+                payload, _, checked_at = cached
+                if time.time() - checked_at > self.store.revalidate_seconds:
+                    self.store.schedule_revalidate(wf["id"])
+                enriched_by_id[wf["id"]] = payload
+            else:
+                missing.append(wf)
+
+        details = await asyncio.gather(
+            *(self.get_workflow_detail(wf["id"]) for wf in missing)
+        )
+        for wf, detail in zip(missing, details):
+            if detail:
+                enriched_by_id[wf["id"]] = self.store.enrich_and_store(detail, wf["id"])
+                self.index.add(wf["id"], node_types_from_detail(detail))
+
+        results = []
+        for wf in candidates:
+            enriched = enriched_by_id.get(wf["id"])
+            if enriched:
+                enriched["views"] = wf.get("totalViews", 0)
+                enriched["creator"] = wf.get("user", {}).get("username", "")
+                enriched["relevance"] = round(scores[wf["id"]], 4)
+                results.append(enriched)
+        return results
+
+    async def search_and_enrich_many(self, requests):
+        """
+        在同一個 event loop 上同時處理多組搜尋。
+
+        Parameters
+        ----------
+        requests : iterable of (zh_keywords, industry, max_results)
+
+        Returns
+        -------
+        list[list[dict]] — 順序與 requests 相同
+        """
+        return await asyncio.gather(
+            *(self.search_and_enrich(kw, ind, n) for kw, ind, n in requests)
+        )
+
+
+# ══════════════════════════════════════════════════════════
+#  同步包裝
+# ══════════════════════════════════════════════════════════
+
+def run_sync(coro_factory, cancel_check=None, poll_interval=CANCEL_POLL_INTERVAL):
+    """
+    在新的 event loop 中執行 coroutine，供同步呼叫端使用。
+
+    Parameters
+    ----------
+    coro_factory : callable(AsyncN8nClient) -> coroutine
+    cancel_check : callable() -> bool, optional
+        回傳 True 時取消執行（例如 HTTP 用戶端已斷線）。
+
+    Returns
+    -------
+    coroutine 的結果；被取消時拋出 asyncio.CancelledError
+    """
+    async def _runner():
+        client = AsyncN8nClient()
+        task = asyncio.ensure_future(coro_factory(client))
+        if cancel_check is None:
+            return await task
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if cancel_check():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                raise asyncio.CancelledError("client disconnected")
+
+    return asyncio.run(_runner())
@@ -9,11 +9,17 @@ n8n_community.py — n8n 社群工作流搜尋與分析
 """
 
 import json
+import logging
+import os
 import re
 import ssl
-import urllib.request
+from functools import lru_cache
 import urllib.parse
-import urllib.error
+
+from core.request_log import upstream_call
+from core.upstream import get_scheduler
+
+log = logging.getLogger(__name__)
 
 # SSL context — macOS Python 常見需要
 try:
@@ -440,16 +446,21 @@ NODE_NAME_ZH = {
 }
 
 
+# 翻譯規則在 import 時預先排序並編譯（先替換長片語，避免子字串被先替換）
+_TRANSLATION_RULES = [
+    (re.compile(re.escape(en), re.IGNORECASE), zh)
+    for en, zh in sorted(EN_TO_ZH.items(), key=lambda x: len(x[0]), reverse=True)
+]
+
+
+@lru_cache(maxsize=4096)
 def translate_to_zh(text):
     """將英文文字翻譯成繁體中文（簡易字典翻譯）"""
     if not text:
         return text
     result = text
-    # 按長度排序（先替換長片語，避免子字串被先替換）
-    sorted_dict = sorted(EN_TO_ZH.items(), key=lambda x: len(x[0]), reverse=True)
-    for en, zh in sorted_dict:
+    for pattern, zh in _TRANSLATION_RULES:
         # 用 case-insensitive 替換
-        pattern = re.compile(re.escape(en), re.IGNORECASE)
         result = pattern.sub(zh, result)
     return result
 
@@ -504,8 +515,9 @@ def translate_keywords(zh_keywords, industry=""):
 #  n8n API 呼叫
 # ══════════════════════════════════════════════════════════
 
-API_BASE = "https://api.n8n.io/api"
-TIMEOUT = 8  # 秒
+# 可用環境變數 N8N_API_BASE 指向本地替身（例如 tools/n8n_stub.py）
+API_BASE = os.environ.get("N8N_API_BASE", "https://api.n8n.io/api")
+TIMEOUT = 8  # 秒（含在 upstream 排程器排隊的時間）
 
 
 def search_workflows(keywords_en, rows=6):
@@ -524,15 +536,11 @@ def search_workflows(keywords_en, rows=6):
     url = f"{API_BASE}/templates/search?{params}"
 
     try:
-        req = urllib.request.Request(url, headers={
-            "User-Agent": "n8n-ai-consultant/1.0",
-            "Accept": "application/json",
-        })
-        with urllib.request.urlopen(req, timeout=TIMEOUT, context=SSL_CTX) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-            return data.get("workflows", [])
+        with upstream_call():
+            data = get_scheduler().fetch(url, timeout=TIMEOUT)
+        return data.get("workflows", [])
     except Exception as e:
-        print(f"[n8n_community] Search error: {e}")
+        log.warning("Search error for %r: %r", keywords_en, e)
         return []
 
 
@@ -547,16 +555,11 @@ def get_workflow_detail(workflow_id):
     url = f"{API_BASE}/workflows/{workflow_id}"
 
     try:
-        req = urllib.request.Request(url, headers={
-            "User-Agent": "n8n-ai-consultant/1.0",
-            "Accept": "application/json",
-        })
-        with urllib.request.urlopen(req, timeout=TIMEOUT, context=SSL_CTX) as resp:
-            raw = json.loads(resp.read().decode("utf-8"))
-            attrs = raw.get("data", {}).get("attributes", {})
-            return attrs
+        with upstream_call():
+            raw = get_scheduler().fetch(url, timeout=TIMEOUT)
+        return raw.get("data", {}).get("attributes", {})
     except Exception as e:
-        print(f"[n8n_community] Detail error for {workflow_id}: {e}")
+        log.warning("Detail error for %s: %r", workflow_id, e)
         return None
 
 
@@ -564,10 +567,100 @@ def get_workflow_detail(workflow_id):
 #  工作流分析（困難度 + 步驟）
 # ══════════════════════════════════════════════════════════
 
+# 顯示用的節點數、描述長度與步驟數上限
+DISPLAY_NODES = 12
+DESC_DISPLAY_CHARS = 200
+MAX_STEPS = 7
+# 清理描述時一次掃描的原始字元數（不足時倍增）
+DESC_SCAN_CHARS = 2000
+# "How it works" 段落最多掃描的字元數
+STEPS_SCAN_CHARS = 4000
+
+_CAMEL_RE = re.compile(r'(?<=[a-z])(?=[A-Z])')
+_CREDENTIAL_RE = re.compile(r'credentials|api key|oauth', re.IGNORECASE)
+_HOW_HEADER_RE = re.compile(r'(?:How it works|What this workflow does)[:\s]*\n', re.IGNORECASE)
+_SECTION_END_RE = re.compile(r'\n\n|\n##')
+_STEP_ITEM_RE = re.compile(r'\d+\.\s*\*?\*?(.+?)(?:\n|$)')
+_STEP_MARKUP_RE = re.compile(r'\*\*|\*|`')
+_MD_HEADER_RE = re.compile(r'#+\s*')
+_MD_MARKUP_RE = re.compile(r'\*\*|\*|`|!\[.*?\]\(.*?\)|\[|\]|\(.*?\)')
+_MULTI_NEWLINE_RE = re.compile(r'\n{2,}')
+
+
+@lru_cache(maxsize=1024)
+def _classify_type(node_type):
+    """
+    依節點 type 一次算出所有分類旗標（結果依 type 快取）。
+
+    Returns
+    -------
+    tuple: (simplified_type, skip, is_ai, is_http, is_decision, is_db,
+            step_ai, step_api, step_db)
+    """
+    lower_type = node_type.lower()
+    simplified = _simplify_type(node_type)
+    simple_lower = simplified.lower()
+    return (
+        simplified,
+        # 跳過 sticky notes 和 noOp
+        "stickyNote" in node_type or "noOp" in node_type,
+        "openai" in lower_type or "langchain" in lower_type or "ai" in lower_type,
+        "httprequest" in lower_type.replace(" ", ""),
+        "if" in lower_type or "switch" in lower_type,
+        "postgres" in lower_type or "mysql" in lower_type or "mongo" in lower_type,
+        # 步驟產生依簡化後的 type 判斷
+        "openai" in simple_lower or "ai" in simple_lower,
+        "http" in simple_lower,
+        "postgres" in simple_lower or "mysql" in simple_lower,
+    )
+
+
+def _profile_nodes(raw_nodes):
+    """
+    單次走訪所有節點，計算節點數、各類型數量、步驟旗標，
+    並只為前 DISPLAY_NODES 個節點產生顯示用描述。
+
+    Returns
+    -------
+    dict with: node_count, ai, http, decision, db, step_ai, step_api, step_db, display
+    """
+    profile = {
+        "node_count": 0, "ai": 0, "http": 0, "decision": 0, "db": 0,
+        "step_ai": False, "step_api": False, "step_db": False,
+        "display": [],
+    }
+    display = profile["display"]
+    for n in raw_nodes:
+        node_type = n.get("type", "")
+        (simplified, skip, is_ai, is_http, is_decision, is_db,
+         step_ai, step_api, step_db) = _classify_type(node_type)
+        if skip:
+            continue
+        profile["node_count"] += 1
+        profile["ai"] += is_ai
+        profile["http"] += is_http
+        profile["decision"] += is_decision
+        profile["db"] += is_db
+        profile["step_ai"] = profile["step_ai"] or step_ai
+        profile["step_api"] = profile["step_api"] or step_api
+        profile["step_db"] = profile["step_db"] or step_db
+        if len(display) < DISPLAY_NODES:
+            node_name = n.get("name", "Unknown")
+            display.append({
+                "name": node_name,
+                "type": simplified,
+                "desc": _guess_node_desc(node_name, node_type, n.get("parameters", {})),
+            })
+    return profile
+
+
 def enrich_workflow(detail, wf_id=None):
     """
     從 n8n 工作流詳情中，提取節點、計算困難度、產出步驟。
 
+    節點只走訪一次，描述只處理實際顯示的長度，
+    因此成本不會隨模板節點數或描述長度明顯增加。
+
     Parameters
     ----------
     detail : dict — get_workflow_detail() 的回傳
@@ -582,41 +675,25 @@ def enrich_workflow(detail, wf_id=None):
         return None
 
     name = detail.get("name", "Untitled Workflow")
-    description = detail.get("description", "")
+    description = detail.get("description", "") or ""
     resolved_id = wf_id or detail.get("id") or ""
 
     # ── 解析節點 ──
     workflow_data = detail.get("workflow", {})
-    raw_nodes = workflow_data.get("nodes", [])
-
-    nodes = []
-    node_types = []
-    for n in raw_nodes:
-        node_type = n.get("type", "")
-        # 跳過 sticky notes 和 noOp
-        if "stickyNote" in node_type or "noOp" in node_type:
-            continue
-        node_name = n.get("name", "Unknown")
-        nodes.append({
-            "name": node_name,
-            "type": _simplify_type(node_type),
-            "desc": _guess_node_desc(node_name, node_type, n.get("parameters", {})),
-        })
-        node_types.append(node_type)
-
-    node_count = len(nodes)
+    profile = _profile_nodes(workflow_data.get("nodes", []))
+    node_count = profile["node_count"]
 
     # ── 計算困難度 ──
-    difficulty, reasons = _calculate_difficulty(nodes, node_types, node_count, description)
+    difficulty, reasons = _calculate_difficulty(profile, description)
 
     # ── 產出步驟 ──
-    steps = _extract_steps(description, nodes, name)
+    steps = _extract_steps(description, profile, name)
 
     # ── 翻譯為繁中 ──
     name_zh = translate_to_zh(name)
     desc_zh = translate_to_zh(_clean_description(description))
     nodes_zh = []
-    for n in nodes[:12]:
+    for n in profile["display"]:
         nodes_zh.append({
             "name": translate_node_name(n["name"]),
             "type": n["type"],
@@ -646,6 +723,7 @@ def enrich_workflow(detail, wf_id=None):
         "difficulty_display": "★" * difficulty + "☆" * (5 - difficulty),
         "difficulty_reasons": reasons,
         "steps": steps_zh,
+        "categories": categories,
     }
 
 
@@ -656,7 +734,7 @@ def _simplify_type(node_type):
     raw_name = parts[-1] if len(parts) > 1 else node_type
 
     # CamelCase → spaced
-    spaced = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', raw_name)
+    spaced = _CAMEL_RE.sub(' ', raw_name)
     return spaced.title() if spaced else node_type
 
 
@@ -692,10 +770,11 @@ def _guess_node_desc(name, node_type, params):
     return f"執行：{name}"
 
 
-def _calculate_difficulty(nodes, node_types, node_count, description):
-    """動態計算社群工作流的困難度"""
+def _calculate_difficulty(profile, description):
+    """動態計算社群工作流的困難度（profile 來自 _profile_nodes）"""
     score = 1
     reasons = []
+    node_count = profile["node_count"]
 
     # 節點數量
     if node_count >= 15:
@@ -708,34 +787,30 @@ def _calculate_difficulty(nodes, node_types, node_count, description):
         reasons.append(f"工作流僅 {node_count} 個節點，結構精簡")
 
     # AI 節點
-    ai_nodes = [t for t in node_types if "openai" in t.lower() or "langchain" in t.lower() or "ai" in t.lower()]
-    if ai_nodes:
+    if profile["ai"]:
         score += 1
-        reasons.append(f"包含 {len(ai_nodes)} 個 AI 節點，需要設定 AI 模型與 Prompt")
+        reasons.append(f"包含 {profile['ai']} 個 AI 節點，需要設定 AI 模型與 Prompt")
 
     # API 呼叫數
-    http_nodes = [t for t in node_types if "httprequest" in t.lower().replace(" ", "")]
-    if len(http_nodes) >= 3:
+    http_count = profile["http"]
+    if http_count >= 3:
         score += 1
-        reasons.append(f"需要串接 {len(http_nodes)} 個外部 API，整合複雜度較高")
-    elif len(http_nodes) >= 1:
-        reasons.append(f"需要串接 {len(http_nodes)} 個外部 API")
+        reasons.append(f"需要串接 {http_count} 個外部 API，整合複雜度較高")
+    elif http_count >= 1:
+        reasons.append(f"需要串接 {http_count} 個外部 API")
 
     # 條件分流
-    decision_nodes = [t for t in node_types if "if" in t.lower() or "switch" in t.lower()]
-    if len(decision_nodes) >= 2:
+    if profile["decision"] >= 2:
         score += 1
-        reasons.append(f"包含 {len(decision_nodes)} 個條件分流，邏輯分支多")
+        reasons.append(f"包含 {profile['decision']} 個條件分流，邏輯分支多")
 
     # 資料庫
-    db_nodes = [t for t in node_types if "postgres" in t.lower() or "mysql" in t.lower() or "mongo" in t.lower()]
-    if db_nodes:
+    if profile["db"]:
         score += 1
         reasons.append("需要設定資料庫連線，需有資料庫管理經驗")
 
     # 認證需求（從 description 判斷）
-    desc_lower = description.lower()
-    if "credentials" in desc_lower or "api key" in desc_lower or "oauth" in desc_lower:
+    if _CREDENTIAL_RE.search(description):
         reasons.append("需要設定外部服務的認證憑證（API Key / OAuth）")
 
     score = min(score, 5)
@@ -746,23 +821,24 @@ def _calculate_difficulty(nodes, node_types, node_count, description):
     return score, reasons
 
 
-def _extract_steps(description, nodes, name):
+def _extract_steps(description, profile, name):
     """從 description 中提取 How it works 步驟，或自動產生"""
     steps = []
 
-    # 嘗試從 description 的 "How it works" 段落提取
-    how_match = re.search(r'(?:How it works|What this workflow does)[:\s]*\n(.*?)(?:\n\n|\n##|\Z)',
-                          description, re.DOTALL | re.IGNORECASE)
-
-    if how_match:
-        raw = how_match.group(1)
+    # 嘗試從 description 的 "How it works" 段落提取（只掃描段落本身）
+    header = _HOW_HEADER_RE.search(description)
+    if header:
+        window = description[header.end():header.end() + STEPS_SCAN_CHARS]
+        section_end = _SECTION_END_RE.search(window)
+        raw = window[:section_end.start()] if section_end else window
         # 提取數字列表項
-        items = re.findall(r'\d+\.\s*\*?\*?(.+?)(?:\n|$)', raw)
-        for i, item in enumerate(items[:7], 1):
-            clean = re.sub(r'\*\*|\*|`', '', item).strip().rstrip(".")
+        for match in _STEP_ITEM_RE.finditer(raw):
+            if len(steps) >= MAX_STEPS:
+                break
+            clean = _STEP_MARKUP_RE.sub('', match.group(1)).strip().rstrip(".")
             if clean:
                 steps.append({
-                    "step": i,
+                    "step": len(steps) + 1,
                     "title": clean[:60],
                     "desc": clean,
                     "duration": "",
@@ -770,12 +846,12 @@ def _extract_steps(description, nodes, name):
 
     # 如果沒有提取到步驟，自動產生
     if len(steps) < 3:
-        steps = _generate_steps(nodes, name)
+        steps = _generate_steps(profile, name)
 
     return steps
 
 
-def _generate_steps(nodes, name):
+def _generate_steps(profile, name):
     """根據節點結構自動產生實施步驟"""
     steps = [
         {
@@ -795,11 +871,7 @@ def _generate_steps(nodes, name):
     step_num = 3
 
     # 根據節點類型加步驟
-    has_ai = any("openai" in n.get("type", "").lower() or "ai" in n.get("type", "").lower() for n in nodes)
-    has_api = any("http" in n.get("type", "").lower() for n in nodes)
-    has_db = any("postgres" in n.get("type", "").lower() or "mysql" in n.get("type", "").lower() for n in nodes)
-
-    if has_ai:
+    if profile["step_ai"]:
         steps.append({
             "step": step_num,
             "title": "調校 AI Prompt",
@@ -808,7 +880,7 @@ def _generate_steps(nodes, name):
         })
         step_num += 1
 
-    if has_api:
+    if profile["step_api"]:
         steps.append({
             "step": step_num,
             "title": "對接外部 API",
@@ -817,7 +889,7 @@ def _generate_steps(nodes, name):
         })
         step_num += 1
 
-    if has_db:
+    if profile["step_db"]:
         steps.append({
             "step": step_num,
             "title": "設定資料庫連線",
@@ -844,17 +916,54 @@ def _generate_steps(nodes, name):
     return steps
 
 
+def _extract_categories(detail):
+    """取出模板分類名稱（API 回傳 [{"id", "name"}, ...]）"""
+    names = []
+    for cat in detail.get("categories") or []:
+        name = cat.get("name") if isinstance(cat, dict) else cat
+        if name:
+            names.append(name)
+    return names
+
+
 def _clean_description(desc):
-    """清理 markdown 描述，取前 200 字"""
+    """
+    清理 markdown 描述，取前 200 字。
+
+    只處理足以產生 200 字的前段原文（在換行處截斷，避免切斷同一行的標記）；
+    不足時倍增掃描範圍。
+    """
     if not desc:
         return ""
-    # 移除 markdown 標記
-    clean = re.sub(r'#+\s*', '', desc)
-    clean = re.sub(r'\*\*|\*|`|!\[.*?\]\(.*?\)|\[|\]|\(.*?\)', '', clean)
-    clean = re.sub(r'\n{2,}', '\n', clean).strip()
-    # 取前 200 字
-    if len(clean) > 200:
-        clean = clean[:200].rsplit(" ", 1)[0] + "..."
+    limit = DESC_SCAN_CHARS
+    while len(desc) > limit:
+        cut = desc.rfind("\n", 0, limit)
+        if cut > 0:
+            # 標記都在同一行內，前段清理結果即為完整清理結果的前綴；
+            # 以截斷前的長度判斷是否已足夠顯示
+            clean = _strip_markdown(desc[:cut])
+            if len(clean) > DESC_DISPLAY_CHARS:
+                return _truncate_description(clean)
+        limit *= 2
+    return _clean_markdown(desc)
+
+
+def _clean_markdown(text):
+    """移除 markdown 標記並截斷至顯示長度"""
+    return _truncate_description(_strip_markdown(text))
+
+
+def _strip_markdown(text):
+    """移除 markdown 標記與多餘空行（不截斷）"""
+    clean = _MD_HEADER_RE.sub('', text)
+    clean = _MD_MARKUP_RE.sub('', clean)
+    return _MULTI_NEWLINE_RE.sub('\n', clean).strip()
+
+
+def _truncate_description(clean):
+    """取前 200 字，在空白處截斷"""
+    if len(clean) > DESC_DISPLAY_CHARS:
+        clean = clean[:DESC_DISPLAY_CHARS].rsplit(" ", 1)[0] + "..."
     return clean
 
 
@@ -865,66 +974,28 @@ def _clean_description(desc):
 #  主入口
 # ══════════════════════════════════════════════════════════
 
-def search_and_enrich(zh_keywords, industry="", max_results=5):
+def search_and_enrich(zh_keywords, industry="", max_results=5, cancel_check=None, analysis=None):
     """
     完整搜尋流程：多輪翻譯搜尋 → 合併去重 → 取詳情 → 評估困難度。
     確保至少返回 3 個結果（如果有的話）。
 
+    同步包裝：實際流程由 n8n_async.AsyncN8nClient 在 event loop 上執行，
+    詳情請求會同時發出。
+
+    Parameters
+    ----------
+    cancel_check : callable() -> bool, optional
+        回傳 True 時放棄搜尋並拋出 asyncio.CancelledError。
+    analysis : dict, optional
+        analyze_pain_point() 的結果，用於依節點結構排序候選。
+
     Returns
     -------
     list[dict] — 每個已包含 nodes, difficulty, steps 等完整資訊
     """
-    seen_ids = set()
-    all_raw = []
-
-    def _collect(query, label, rows=8):
-        """搜尋並收集結果，去重"""
-        results = search_workflows(query, rows=rows)
-        for wf in results:
-            wf_id = wf.get("id")
-            if wf_id and wf_id not in seen_ids:
-                seen_ids.add(wf_id)
-                all_raw.append(wf)
-
-    # ── 第1輪：完整翻譯搜尋 ──
-    en_query = translate_keywords(zh_keywords, industry)
-    _collect(en_query, "Search-1 full")
-
-    # ── 第2輪：產業 + 核心動作 ──
-    if len(all_raw) < max_results and len(zh_keywords) >= 2:
-        en_query2 = translate_keywords(zh_keywords[:2], industry)
-        _collect(en_query2, "Search-2 industry+action")
-
-    # ── 第3輪：只用產業 + automation ──
-    if len(all_raw) < 3 and industry:
-        industry_en = ZH_TO_EN.get(industry, industry)
-        _collect(f"{industry_en} workflow automation", "Search-3 industry+auto")
-
-    # ── 第4輪：更寬泛的搜尋 ──
-    if len(all_raw) < 3:
-        for kw in zh_keywords[:3]:
-            if kw in ZH_TO_EN:
-                _collect(ZH_TO_EN[kw], f"Search-4 fallback '{kw}'")
-            if len(all_raw) >= max_results:
-                break
-
-    # 按瀏覽數排序（優先推薦高品質模板）
-    all_raw.sort(key=lambda w: w.get("totalViews", 0), reverse=True)
-
-    results = []
-    for wf in all_raw[:max_results]:
-        wf_id = wf.get("id")
-        if not wf_id:
-            continue
-
-        detail = get_workflow_detail(wf_id)
-        if not detail:
-            continue
-
-        enriched = enrich_workflow(detail, wf_id=wf_id)
-        if enriched:
-            enriched["views"] = wf.get("totalViews", 0)
-            enriched["creator"] = wf.get("user", {}).get("username", "")
-            results.append(enriched)
+    from core.n8n_async import run_sync
 
-    return results
+    return run_sync(
+        lambda client: client.search_and_enrich(zh_keywords, industry, max_results, analysis),
+        cancel_check=cancel_check,
+    )
@@ -0,0 +1,398 @@
+"""
+n8n_export.py — 將動態組裝的工作流轉為可匯入 n8n 的 JSON
+
+dynamic_composer 產出的節點只有 {name, type, desc}，此模組將其轉為
+n8n 可直接匯入的工作流格式：
+  1. 節點 id / position / typeVersion / parameters
+  2. connections（含 IF 節點的 true / false 分支）
+  3. 串流寫出大量工作流（單一 JSON 檔或 tar 封存），不需全部載入記憶體
+"""
+
+import io
+import json
+import tarfile
+import time
+import uuid
+
+# 固定 namespace，讓相同工作流每次匯出都得到相同的節點 id
+_ID_NAMESPACE = uuid.UUID("7d3c1f0e-6a43-4c5e-9b6e-2f1a8d0c9e11")
+
+# 節點畫布座標
+X_START = 250
+X_STEP = 220
+Y_MAIN = 300
+
+
+# ══════════════════════════════════════════════════════════
+#  節點類型對應（composer type → n8n type + parameters）
+# ══════════════════════════════════════════════════════════
+
+def _schedule_trigger(node):
+    return "n8n-nodes-base.scheduleTrigger", 1.2, {
+        "rule": {"interval": [{"field": "days", "triggerAtHour": 9}]},
+    }
+
+
+def _webhook(node):
+    return "n8n-nodes-base.webhook", 2, {
+        "httpMethod": "POST",
+        "path": str(uuid.uuid5(_ID_NAMESPACE, node["name"] + node["desc"])),
+        "options": {},
+    }
+
+
+def _form_trigger(node):
+    return "n8n-nodes-base.formTrigger", 2.2, {
+        "formTitle": node["name"],
+        "formDescription": node["desc"],
+        "formFields": {"values": [{"fieldLabel": "內容", "requiredField": True}]},
+        "options": {},
+    }
+
+
+def _email_imap(node):
+    return "n8n-nodes-base.emailReadImap", 2, {
+        "mailbox": "INBOX",
+        "postProcessAction": "read",
+        "options": {},
+    }
+
+
+def _http_request(node):
+    if "LINE" in node["type"]:
+        return "n8n-nodes-base.httpRequest", 4.2, {
+            "method": "POST",
+            "url": "https://api.line.me/v2/bot/message/push",
+            "sendBody": True,
+            "specifyBody": "json",
+            "jsonBody": json.dumps({
+                "to": "={{ $json.lineUserId }}",
+                "messages": [{"type": "text", "text": node["desc"]}],
+            }, ensure_ascii=False),
+            "options": {},
+        }
+    return "n8n-nodes-base.httpRequest", 4.2, {
+        "method": "GET",
+        "url": "",
+        "options": {},
+    }
+
+
+def _database(node):
+    return "n8n-nodes-base.postgres", 2.5, {
+        "operation": "executeQuery",
+        "query": f"-- {node['desc']}\nSELECT 1;",
+        "options": {},
+    }
+
+
+def _google_sheets(node):
+    return "n8n-nodes-base.googleSheets", 4.5, {
+        "operation": "append",
+        "documentId": {"__rl": True, "mode": "list", "value": ""},
+        "sheetName": {"__rl": True, "mode": "list", "value": ""},
+        "columns": {"mappingMode": "autoMapInputData", "value": {}},
+        "options": {},
+    }
+
+
+def _spreadsheet_file(node):
+    return "n8n-nodes-base.spreadsheetFile", 2, {
+        "operation": "fromFile",
+        "options": {},
+    }
+
+
+def _read_binary(node):
+    return "n8n-nodes-base.readBinaryFile", 1, {
+        "filePath": "",
+    }
+
+
+def _openai(node):
+    return "n8n-nodes-base.openAi", 1.1, {
+        "resource": "chat",
+        "prompt": {"messages": [{"role": "user", "content": node["desc"]}]},
+        "options": {},
+    }
+
+
+def _code(node):
+    return "n8n-nodes-base.code", 2, {
+        "jsCode": f"// {node['name']}：{node['desc']}\nreturn $input.all();",
+    }
+
+
+def _if(node):
+    return "n8n-nodes-base.if", 2, {
+        "conditions": {
+            "options": {"caseSensitive": True, "leftValue": "", "typeValidation": "strict"},
+            "conditions": [{
+                "leftValue": "={{ $json.level }}",
+                "rightValue": "high",
+                "operator": {"type": "string", "operation": "equals"},
+            }],
+            "combinator": "and",
+        },
+        "options": {},
+    }
+
+
+def _send_email(node):
+    return "n8n-nodes-base.emailSend", 2.1, {
+        "subject": node["name"],
+        "emailFormat": "text",
+        "text": node["desc"],
+        "options": {},
+    }
+
+
+def _slack(node):
+    return "n8n-nodes-base.slack", 2.2, {
+        "select": "channel",
+        "channelId": {"__rl": True, "mode": "list", "value": ""},
+        "text": node["desc"],
+        "otherOptions": {},
+    }
+
+
+def _mqtt(node):
+    return "n8n-nodes-base.mqtt", 1, {
+        "topic": "",
+        "options": {},
+    }
+
+
+def _execute_workflow(node):
+    return "n8n-nodes-base.executeWorkflow", 1, {
+        "source": "database",
+        "workflowId": "",
+        "options": {},
+    }
+
+
+# composer type 中的單一選項（以 " / " 分隔）→ 產生器
+# 依序比對，第一個可用的選項生效
+TYPE_BUILDERS = {
+    "schedule trigger": _schedule_trigger,
+    "webhook": _webhook,
+    "n8n form trigger": _form_trigger,
+    "email trigger (imap)": _email_imap,
+    "email read (imap)": _email_imap,
+    "http request": _http_request,
+    "crm api": _http_request,
+    "erp api": _http_request,
+    "lms api": _http_request,
+    "social api": _http_request,
+    "fhir api": _http_request,
+    "postgres": _database,
+    "mysql": _database,
+    "database": _database,
+    "google sheets": _google_sheets,
+    "spreadsheet file": _spreadsheet_file,
+    "read binary file": _read_binary,
+    "openai": _openai,
+    "openai vision": _openai,
+    "code node": _code,
+    "if": _if,
+    "send email": _send_email,
+    "gmail": _send_email,
+    "slack": _slack,
+    "mqtt": _mqtt,
+    "execute workflow": _execute_workflow,
+}
+
+# 只能放在工作流第一個位置的觸發型節點
+TRIGGER_TYPES = frozenset([
+    "n8n-nodes-base.scheduleTrigger",
+    "n8n-nodes-base.webhook",
+    "n8n-nodes-base.formTrigger",
+    "n8n-nodes-base.emailReadImap",
+])
+
+
+def _resolve_node_type(node, is_first):
+    """依 composer 的 type 字串挑選 n8n 節點類型；找不到時以 Code 節點代替"""
+    type_str = node.get("type", "")
+    for option in type_str.split("/"):
+        key = option.strip().lower()
+        if key.startswith("http request"):
+            key = "http request"
+        builder = TYPE_BUILDERS.get(key)
+        if not builder:
+            continue
+        n8n_type, version, params = builder(node)
+        if (n8n_type in TRIGGER_TYPES) != is_first:
+            continue
+        return n8n_type, version, params
+    if is_first:
+        return _schedule_trigger(node)
+    return _code(node)
+
+
+# ══════════════════════════════════════════════════════════
+#  工作流轉換
+# ══════════════════════════════════════════════════════════
+
+def to_n8n_workflow(workflow):
+    """
+    將 compose_workflow() 的結果轉為 n8n 可匯入的工作流 JSON。
+
+    Parameters
+    ----------
+    workflow : dict — 含 name, description, nodes
+
+    Returns
+    -------
+    dict with: name, nodes, connections, settings, pinData, meta
+    """
+    wf_name = workflow.get("name", "n8n workflow")
+    source_nodes = workflow.get("nodes", [])
+
+    nodes = []
+    used_names = set()
+    for i, node in enumerate(source_nodes):
+        n8n_type, version, params = _resolve_node_type(node, is_first=(i == 0))
+        name = _unique_name(node.get("name", f"Node {i + 1}"), used_names)
+        nodes.append({
+            "id": str(uuid.uuid5(_ID_NAMESPACE, f"{wf_name}:{i}:{name}")),
+            "name": name,
+            "type": n8n_type,
+            "typeVersion": version,
+            "position": [X_START + i * X_STEP, Y_MAIN],
+            "parameters": params,
+            "notes": node.get("desc", ""),
+        })
+
+    connections = _build_connections(nodes)
+
+    # 描述以便利貼呈現在畫布上
+    if workflow.get("description"):
+        nodes.append({
+            "id": str(uuid.uuid5(_ID_NAMESPACE, f"{wf_name}:note")),
+            "name": "說明",
+            "type": "n8n-nodes-base.stickyNote",
+            "typeVersion": 1,
+            "position": [X_START, Y_MAIN - 220],
+            "parameters": {"content": f"## {wf_name}\n{workflow['description']}", "width": 480},
+        })
+
+    return {
+        "name": wf_name,
+        "nodes": nodes,
+        "connections": connections,
+        "settings": {"executionOrder": "v1"},
+        "pinData": {},
+        "active": False,
+        "meta": {"templateCredsSetupCompleted": False},
+        "tags": [],
+    }
+
+
+def _unique_name(name, used_names):
+    """n8n 以節點名稱建立連線，名稱必須唯一"""
+    candidate = name
+    suffix = 2
+    while candidate in used_names:
+        candidate = f"{name} {suffix}"
+        suffix += 1
+    used_names.add(candidate)
+    return candidate
+
+
+def _link(target_name):
+    return {"node": target_name, "type": "main", "index": 0}
+
+
+def _build_connections(nodes):
+    """
+    依序串接節點。IF 節點的 true 分支接續主流程，
+    false 分支直接接到最後的紀錄節點。
+    """
+    connections = {}
+    last_name = nodes[-1]["name"] if nodes else ""
+    for i, node in enumerate(nodes[:-1]):
+        next_name = nodes[i + 1]["name"]
+        if node["type"] == "n8n-nodes-base.if":
+            connections[node["name"]] = {"main": [[_link(next_name)], [_link(last_name)]]}
+        else:
+            connections[node["name"]] = {"main": [[_link(next_name)]]}
+    return connections
+
+
+# ══════════════════════════════════════════════════════════
+#  串流寫出
+# ══════════════════════════════════════════════════════════
+
+def write_json_array(workflows, fp):
+    """
+    將可迭代的 n8n 工作流逐筆寫成單一 JSON 陣列。
+    每次只序列化一筆，適合由 generator 提供的大量資料。
+
+    Returns
+    -------
+    int — 寫出的工作流數量
+    """
+    count = 0
+    fp.write("[\n")
+    for wf in workflows:
+        if count:
+            fp.write(",\n")
+        fp.write(json.dumps(wf, ensure_ascii=False, indent=2))
+        count += 1
+    fp.write("\n]\n")
+    return count
+
+
+def write_tar(named_workflows, fileobj, compress=False):
+    """
+    將 (檔名, 工作流) 逐筆寫入 tar 串流，每個工作流一個 JSON 檔。
+    使用 tarfile 串流模式，不需要可 seek 的輸出。
+
+    Returns
+    -------
+    int — 寫出的工作流數量
+    """
+    count = 0
+    mode = "w|gz" if compress else "w|"
+    with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+        for filename, wf in named_workflows:
+            payload = json.dumps(wf, ensure_ascii=False, indent=2).encode("utf-8")
+            info = tarfile.TarInfo(name=filename)
+            info.size = len(payload)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(payload))
+            count += 1
+    return count
+
+
+def export_workflows(workflows, path):
+    """
+    匯出大量 n8n 工作流：副檔名為 .tar / .tar.gz / .tgz 時寫成 tar 封存，
+    否則寫成單一 JSON 陣列檔。
+
+    Parameters
+    ----------
+    workflows : iterable of dict — compose_workflow() 的結果（可為 generator）
+    path : str
+
+    Returns
+    -------
+    int — 匯出的工作流數量
+    """
+    converted = (to_n8n_workflow(wf) for wf in workflows)
+    if path.endswith((".tar", ".tar.gz", ".tgz")):
+        named = (
+            (f"{i:05d}_{_safe_filename(wf['name'])}.json", wf)
+            for i, wf in enumerate(converted, 1)
+        )
+        with open(path, "wb") as f:
+            return write_tar(named, f, compress=not path.endswith(".tar"))
+    with open(path, "w", encoding="utf-8") as f:
+        return write_json_array(converted, f)
+
+
+def _safe_filename(name):
+    """移除檔名中不安全的字元"""
+    cleaned = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+    return cleaned[:60] or "workflow"
@@ -8,11 +8,18 @@ pain_analyzer.py — 痛點文字分析器
   4. complexity     — 複雜度訊號（跨部門、即時、大量…）
   5. keywords       — jieba 萃取的核心名詞/動詞
   6. industry_hints — 產業相關提示
+
+分析為單一流程：痛點文字只斷詞一次（結果依文字快取），關鍵字以同一串
+token 計算 TF-IDF；各字典的提示詞在 import 時編成「首字 → 提示詞」索引，
+一次掃描文字即可得出所有命中的提示詞，再由此判斷資料來源、動作、輸出、
+複雜度與產業焦點。
 """
 
+import heapq
+from functools import lru_cache
+
 import jieba
 import jieba.analyse
-import re
 
 # ── 關鍵字字典 ──
 
@@ -103,6 +110,75 @@ INDUSTRY_PATTERNS = {
 }
 
 
+# ── 關鍵字萃取 ──
+
+# extract_tags 取前幾個候選，再過濾停用詞後保留前幾個
+TOP_K = 20
+MAX_KEYWORDS = 10
+
+# 過濾通用停用詞
+STOP_WORDS = frozenset({
+    "系統", "管理", "進行", "分析", "需求", "資料", "數據",
+    "流程", "作業", "改善", "優化", "提升", "問題", "公司", "部門",
+    "協助", "導入", "操作", "人員", "時間", "處理", "工作", "方式",
+    "效率", "應用", "工具", "服務", "內容", "計畫", "項目", "目標", "能力",
+    "可以", "能夠", "需要", "想要", "使用", "透過", "對於", "關於"
+})
+
+# ── 偵測不足時的推斷 ──
+
+INDUSTRY_DEFAULT_SOURCES = {
+    "製造": ("ERP", "資料庫"),
+    "零售": ("POS/收銀", "CRM"),
+    "金融": ("資料庫", "API 介接"),
+    "醫療": ("EHR/病歷", "資料庫"),
+    "餐飲": ("POS/收銀", "表單系統"),
+    "電商": ("API 介接", "資料庫"),
+    "物流": ("API 介接", "資料庫"),
+    "教育": ("LMS/教學", "表單系統"),
+}
+
+ACTION_HINTS = {
+    "預測分析": ["流失", "預測", "趨勢", "需求", "銷量"],
+    "異常偵測": ["異常", "不良", "瑕疵", "故障", "偏差", "波動"],
+    "分類判斷": ["分類", "判斷", "辨識", "篩選"],
+    "統計彙總": ["統計", "報表", "彙總", "分析"],
+}
+
+INDUSTRY_ADVICE = {
+    ("製造", "品質"): "。💡 建議導入自動化履歷追蹤，結合即時監控儀表板管理品質指標",
+    ("製造", "產能"): "。💡 建議導入排程優化模組，搭配每日產能自動報表",
+    ("製造", "供應鏈"): "。💡 建議整合 ERP 庫存預警與供應商交期管理，降低缺料風險",
+    ("製造", "設備"): "。💡 建議建立設備維護履歷系統，自動觸發保養提醒",
+    ("零售", "客戶"): "。💡 建議建立 RFM 客戶分群模型，搭配再行銷自動化提升回購率",
+    ("零售", "庫存"): "。💡 建議導入需求預測模型，搭配自動補貨觸發機制",
+    ("零售", "銷售"): "。💡 建議建立銷售漏斗分析看板，結合促銷效果追蹤",
+    ("金融", "風控"): "。💡 建議導入即時交易監控與異常評分機制，搭配人工覆審流程",
+    ("金融", "客戶"): "。💡 建議建立 eKYC 自動化驗證流程，提升開戶效率",
+    ("金融", "合規"): "。💡 建議導入自動合規報告生成與 AML 交易篩選",
+    ("醫療", "看診"): "。💡 建議導入智慧問診輔助系統，結合病歷自動摘要",
+    ("醫療", "排班"): "。💡 建議導入 AI 排班最佳化，考量人力需求與法規限制",
+    ("餐飲", "訂單"): "。💡 建議導入智慧出餐排序系統，結合外送平台 API 整合",
+    ("餐飲", "食材"): "。💡 建議導入食材用量預測，搭配供應商自動下單",
+}
+
+
+def _index_by_first_char(*tables):
+    """提示詞字典 → {首字: (提示詞, ...)}"""
+    index = {}
+    for table in tables:
+        for hints in table.values():
+            for hint in hints:
+                if hint and hint not in index.setdefault(hint[0], ()):
+                    index[hint[0]] += (hint,)
+    return index
+
+
+_HINTS_BY_FIRST_CHAR = _index_by_first_char(
+    DATA_SOURCE_MAP, ACTION_MAP, OUTPUT_MAP, COMPLEXITY_MAP, *INDUSTRY_PATTERNS.values(),
+)
+_ACTION_HINTS_BY_FIRST_CHAR = _index_by_first_char(ACTION_HINTS)
+
 def analyze_pain_point(pain_text, industry="", department=""):
     """
     分析使用者痛點文字，回傳結構化分析結果。
@@ -120,27 +196,21 @@ def analyze_pain_point(pain_text, industry="", department=""):
     """
     text = f"{pain_text} {industry} {department}".lower()
 
-    # ── 1. jieba 關鍵字萃取 ──
-    tags = jieba.analyse.extract_tags(pain_text, topK=20, withWeight=False)
+    # ── 1. jieba 關鍵字萃取（斷詞一次，TF-IDF 取前 TOP_K 個）──
+    tags = _tfidf_keywords(_tokenize(pain_text), TOP_K)
 
     # 過濾通用停用詞
-    STOP_WORDS = {
-        "系統", "管理", "進行", "分析", "需求", "資料", "數據",
-        "流程", "作業", "改善", "優化", "提升", "問題", "公司", "部門",
-        "協助", "導入", "操作", "人員", "時間", "處理", "工作", "方式",
-        "效率", "應用", "工具", "服務", "內容", "計畫", "項目", "目標", "能力",
-        "可以", "能夠", "需要", "想要", "使用", "透過", "對於", "關於"
-    }
-    keywords = [w for w in tags if w not in STOP_WORDS and len(w) > 1][:10]
+    keywords = [w for w in tags if w not in STOP_WORDS and len(w) > 1][:MAX_KEYWORDS]
 
-    # ── 2. 多維度偵測 ──
-    data_sources = _detect(text, DATA_SOURCE_MAP)
-    actions = _detect(text, ACTION_MAP)
-    outputs = _detect(text, OUTPUT_MAP)
-    complexity = _detect(text, COMPLEXITY_MAP)
+    # ── 2. 多維度偵測（一次掃描取得所有命中的提示詞）──
+    found = _scan_hints(text)
+    data_sources = _detect(found, DATA_SOURCE_MAP)
+    actions = _detect(found, ACTION_MAP)
+    outputs = _detect(found, OUTPUT_MAP)
+    complexity = _detect(found, COMPLEXITY_MAP)
 
     # ── 3. 產業焦點偵測 ──
-    industry_focus = _detect_industry_focus(text, industry)
+    industry_focus = _detect_industry_focus(found, industry)
 
     # ── 4. 智慧補全（如果偵測不足）──
     if not data_sources:
@@ -166,25 +236,52 @@ def analyze_pain_point(pain_text, industry="", department=""):
     }
 
 
-def _detect(text, category_map):
-    """比對關鍵字字典，回傳符合的類別列表"""
-    found = []
-    for category, keywords in category_map.items():
-        for kw in keywords:
-            if kw in text:
-                if category not in found:
-                    found.append(category)
-                break
-    return found
+@lru_cache(maxsize=1024)
+def _tokenize(pain_text):
+    """jieba 斷詞（與 extract_tags 相同的切法），結果依文字快取"""
+    return tuple(jieba.lcut(pain_text))
 
 
-def _detect_industry_focus(text, industry):
+def _tfidf_keywords(tokens, top_k):
+    """
+    與 jieba.analyse.extract_tags(topK=top_k) 相同的 TF-IDF 排序，
+    但使用已斷好的 token，並以 heap 只取前 top_k 個。
+    """
+    extractor = jieba.analyse.default_tfidf
+    stop_words = extractor.stop_words
+    freq = {}
+    for w in tokens:
+        if len(w.strip()) < 2 or w.lower() in stop_words:
+            continue
+        freq[w] = freq.get(w, 0.0) + 1.0
+    if not freq:
+        return []
+    idf_freq = extractor.idf_freq
+    median_idf = extractor.median_idf
+    total = sum(freq.values())
+    for w in freq:
+        freq[w] *= idf_freq.get(w, median_idf) / total
+    return heapq.nlargest(top_k, freq, key=freq.__getitem__)
+
+
+def _scan_hints(text):
+    """回傳 text 中出現的所有提示詞（只檢查首字有出現在 text 中的提示詞）"""
+    return {hint for ch in set(text) for hint in _HINTS_BY_FIRST_CHAR.get(ch, ()) if hint in text}
+
+
+def _detect(found, category_map):
+    """比對關鍵字字典，回傳符合的類別列表（依字典順序）"""
+    return [category for category, keywords in category_map.items()
+            if any(kw in found for kw in keywords)]
+
+
+def _detect_industry_focus(found, industry):
     """偵測產業特定焦點"""
     patterns = INDUSTRY_PATTERNS.get(industry, {})
     best_focus = ""
     best_count = 0
     for focus, keywords in patterns.items():
-        count = sum(1 for kw in keywords if kw in text)
+        count = sum(1 for kw in keywords if kw in found)
         if count > best_count:
             best_count = count
             best_focus = focus
@@ -193,37 +290,19 @@ def _detect_industry_focus(text, industry):
 
 def _infer_data_sources(keywords, industry):
     """根據關鍵字和產業推斷資料來源"""
-    sources = []
-    industry_defaults = {
-        "製造": ["ERP", "資料庫"],
-        "零售": ["POS/收銀", "CRM"],
-        "金融": ["資料庫", "API 介接"],
-        "醫療": ["EHR/病歷", "資料庫"],
-        "餐飲": ["POS/收銀", "表單系統"],
-        "電商": ["API 介接", "資料庫"],
-        "物流": ["API 介接", "資料庫"],
-        "教育": ["LMS/教學", "表單系統"],
-    }
-    sources = industry_defaults.get(industry, ["Excel/CSV", "資料庫"])
-    return sources
+    return list(INDUSTRY_DEFAULT_SOURCES.get(industry, ("Excel/CSV", "資料庫")))
 
 
 def _infer_actions(keywords):
     """根據關鍵字推斷需要的動作"""
-    action_hints = {
-        "預測分析": ["流失", "預測", "趨勢", "需求", "銷量"],
-        "異常偵測": ["異常", "不良", "瑕疵", "故障", "偏差", "波動"],
-        "分類判斷": ["分類", "判斷", "辨識", "篩選"],
-        "統計彙總": ["統計", "報表", "彙總", "分析"],
-    }
-    found = []
-    for action, hints in action_hints.items():
-        for h in hints:
-            if any(h in kw for kw in keywords):
-                if action not in found:
-                    found.append(action)
-                break
-    return found or ["統計彙總"]
+    # 以不會出現在提示詞中的字元連接，一次掃描所有關鍵字
+    found = _scan_keyword_hints("\x00".join(keywords))
+    return [action for action, hints in ACTION_HINTS.items()
+            if any(h in found for h in hints)] or ["統計彙總"]
+
+
+def _scan_keyword_hints(joined):
+    return {h for ch in set(joined) for h in _ACTION_HINTS_BY_FIRST_CHAR.get(ch, ()) if h in joined}
 
 
 def _build_summary(keywords, sources, actions, outputs, complexity, industry, focus):
@@ -266,25 +345,9 @@ def _build_summary(keywords, sources, actions, outputs, complexity, industry, fo
             parts.append(f"。注意複雜度因素：{'、'.join(complexity)}")
 
     # 產業專屬建議
-    industry_advice = {
-        ("製造", "品質"): "。💡 建議導入自動化履歷追蹤，結合即時監控儀表板管理品質指標",
-        ("製造", "產能"): "。💡 建議導入排程優化模組，搭配每日產能自動報表",
-        ("製造", "供應鏈"): "。💡 建議整合 ERP 庫存預警與供應商交期管理，降低缺料風險",
-        ("製造", "設備"): "。💡 建議建立設備維護履歷系統，自動觸發保養提醒",
-        ("零售", "客戶"): "。💡 建議建立 RFM 客戶分群模型，搭配再行銷自動化提升回購率",
-        ("零售", "庫存"): "。💡 建議導入需求預測模型，搭配自動補貨觸發機制",
-        ("零售", "銷售"): "。💡 建議建立銷售漏斗分析看板，結合促銷效果追蹤",
-        ("金融", "風控"): "。💡 建議導入即時交易監控與異常評分機制，搭配人工覆審流程",
-        ("金融", "客戶"): "。💡 建議建立 eKYC 自動化驗證流程，提升開戶效率",
-        ("金融", "合規"): "。💡 建議導入自動合規報告生成與 AML 交易篩選",
-        ("醫療", "看診"): "。💡 建議導入智慧問診輔助系統，結合病歷自動摘要",
-        ("醫療", "排班"): "。💡 建議導入 AI 排班最佳化，考量人力需求與法規限制",
-        ("餐飲", "訂單"): "。💡 建議導入智慧出餐排序系統，結合外送平台 API 整合",
-        ("餐飲", "食材"): "。💡 建議導入食材用量預測，搭配供應商自動下單",
-    }
     advice_key = (industry, focus)
-    if advice_key in industry_advice:
-        parts.append(industry_advice[advice_key])
+    if advice_key in INDUSTRY_ADVICE:
+        parts.append(INDUSTRY_ADVICE[advice_key])
 
     return "".join(parts) + "。"
 
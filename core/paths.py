@@ -0,0 +1,11 @@
+"""
+paths.py — 專案目錄位置
+
+不依賴其他模組，CLI 啟動路徑（catalog_artifact.default_path 等）只需此檔即可
+取得快取目錄，不會連帶載入 enrichment_store 的 sqlite3 / asyncio 相依。
+"""
+
+import os
+
+ROOT_DIR = os.path.dirname(os.path.dirname(__file__))
+CACHE_DIR = os.environ.get("N8N_CONSULTANT_CACHE_DIR", os.path.join(ROOT_DIR, ".cache"))
@@ -0,0 +1,211 @@
+"""
+prefetch.py — 熱門情境的社群模板預熱
+
+第一個詢問常見產業（製造、零售、金融…）的使用者總要付出完整的上游延遲。
+此模組在背景對 industry_mapping 中每個產業、每個部門的 typical_pain_points
+執行與 /api/analyze 相同的社群搜尋（同樣的痛點分析關鍵字），
+把搜尋結果與模板增強結果寫入 enrichment_store：
+  1. 上游呼叫以 PRIORITY_BACKGROUND 送出，只使用排程器的剩餘額度；
+     排程器預估的背景排隊時間過長時暫停，等互動請求消化後再繼續
+  2. 啟動後延遲 START_DELAY 秒開始，之後每 PREFETCH_INTERVAL 秒重跑一次
+  3. 多個程序（pre-fork worker）以檔案鎖協調，同一時間只有一個程序預熱；
+     上次完成時間記錄在 CACHE_DIR/prefetch.json，worker 汰換後不會重複預熱
+
+  python -m core.prefetch     # 立即預熱一次（例如由 cron 執行）
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from core.industry_adapter import load_industry_mapping
+from core.n8n_async import AsyncN8nClient
+from core.pain_analyzer import analyze_pain_point
+from core.paths import CACHE_DIR
+from core.upstream import PRIORITY_BACKGROUND, get_scheduler, priority
+
+try:
+    import fcntl
+except ImportError:   # Windows：不做跨程序協調
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# 預熱週期（秒）
+PREFETCH_INTERVAL = 6 * 3600
+# 啟動後開始預熱前的等待（秒），避免與暖機、第一批請求搶資源
+START_DELAY = 30.0
+# 檢查是否輪到本程序預熱的間隔（秒）
+POLL_INTERVAL = 60.0
+# 背景呼叫預估排隊超過此秒數時暫停預熱
+MAX_BACKGROUND_WAIT = 2.0
+# 每個情境取回的社群模板數（與 analysis_pool.COMMUNITY_RESULTS 相同）
+COMMUNITY_RESULTS = 5
+
+STATE_PATH = os.path.join(CACHE_DIR, "prefetch.json")
+LOCK_PATH = os.path.join(CACHE_DIR, "prefetch.lock")
+
+
+def scenarios(mapping=None):
+    """
+    產生預熱情境（同一產業的相同痛點只產生一次）。
+
+    Returns
+    -------
+    list[tuple]: (industry, department, pain_point)
+    """
+    mapping = load_industry_mapping() if mapping is None else mapping
+    seen = set()
+    result = []
+    for industry, info in mapping.items():
+        for department, dept in info.get("departments", {}).items():
+            for pain in dept.get("typical_pain_points", []):
+                if (industry, pain) not in seen:
+                    seen.add((industry, pain))
+                    result.append((industry, department, pain))
+    return result
+
+
+class Prefetcher:
+    """
+    Parameters
+    ----------
+    client_factory : callable() -> AsyncN8nClient
+    interval : float — 預熱週期
+    scheduler : upstream.UpstreamScheduler, optional — 用於判斷背景額度
+    state_path, lock_path : str
+    """
+
+    def __init__(self, client_factory=None, interval=PREFETCH_INTERVAL, scheduler=None,
+                 state_path=STATE_PATH, lock_path=LOCK_PATH):
+        # 搜尋快取超過半個週期就向上游更新，讓預熱結果在下一輪之前都保持新鮮
+        self.client_factory = client_factory or (lambda: AsyncN8nClient(search_ttl=interval / 2))
+        self.interval = interval
+        self.scheduler = scheduler
+        self.state_path = state_path
+        self.lock_path = lock_path
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ── 單次預熱 ──
+
+    def _wait_for_spare_budget(self):
+        """背景排隊過長時等待；被要求停止時回傳 False"""
+        scheduler = self.scheduler or get_scheduler()
+        while scheduler.estimated_wait(PRIORITY_BACKGROUND) > MAX_BACKGROUND_WAIT:
+            if self._stop.wait(1.0):
+                return False
+        return not self._stop.is_set()
+
+    def run_once(self, items=None):
+        """
+        依序預熱所有情境。
+
+        Returns
+        -------
+        dict: scenarios, warmed, failed, elapsed
+        """
+        items = scenarios() if items is None else items
+        start = time.monotonic()
+        warmed = failed = 0
+        for industry, department, pain in items:
+            if not self._wait_for_spare_budget():
+                break
+            analysis = analyze_pain_point(pain, industry, department)
+            # 每個情境各自一個 event loop；client 的 Semaphore 綁定 loop，每次重建
+            client = self.client_factory()
+            try:
+                with priority(PRIORITY_BACKGROUND):
+                    # 不提前停止：每個候選查詢都寫入搜尋快取
+                    asyncio.run(client.search_and_enrich(
+                        analysis.get("keywords", []), industry, COMMUNITY_RESULTS, analysis,
+                        early_stop=False,
+                    ))
+                warmed += 1
+            except Exception as e:
+                failed += 1
+                log.warning("Prefetch %s/%s failed: %r", industry, pain, e)
+        return {"scenarios": len(items), "warmed": warmed, "failed": failed,
+                "elapsed": round(time.monotonic() - start, 1)}
+
+    # ── 跨程序協調 ──
+
+    def last_run(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f).get("last_run", 0.0)
+        except (OSError, ValueError):
+            return 0.0
+
+    def _record_run(self, summary):
+        tmp = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"last_run": time.time(), **summary}, f)
+        os.replace(tmp, self.state_path)
+
+    def run_if_due(self):
+        """
+        輪到時預熱一次：取得檔案鎖且距上次完成超過 interval 才執行。
+
+        Returns
+        -------
+        dict or None — 有執行時回傳 run_once 的摘要
+        """
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None      # 其他程序正在預熱
+            if time.time() - self.last_run() < self.interval:
+                return None
+            summary = self.run_once()
+            if not self._stop.is_set():
+                self._record_run(summary)
+            return summary
+
+    # ── 背景執行緒 ──
+
+    def start(self, delay=START_DELAY):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(delay,), name="prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, delay):
+        if self._stop.wait(delay):
+            return
+        while not self._stop.is_set():
+            try:
+                summary = self.run_if_due()
+                if summary:
+                    log.info("Warmed %d/%d scenarios in %ss", summary["warmed"],
+                             summary["scenarios"], summary["elapsed"], extra={"prefetch": summary})
+            except Exception:
+                log.exception("Prefetch error")
+            self._stop.wait(POLL_INTERVAL)
+
+
+_default_prefetcher = None
+
+
+def start_background(delay=START_DELAY):
+    """啟動程序共用的背景預熱（pre-fork 時在每個 worker 呼叫；檔案鎖確保只有一個在跑）"""
+    global _default_prefetcher
+    if _default_prefetcher is None:
+        _default_prefetcher = Prefetcher()
+    _default_prefetcher.start(delay)
+    return _default_prefetcher
+
+
+if __name__ == "__main__":
+    result = Prefetcher(interval=0).run_if_due()
+    print(json.dumps(result or {"skipped": "another process is prefetching"}, ensure_ascii=False))
@@ -0,0 +1,260 @@
+"""
+prefork.py — 預先 fork 的多程序 HTTP 伺服器
+
+GIL 使 jieba 斷詞、TF-IDF 匹配與翻譯 regex 等 CPU 工作無法以執行緒擴展。
+此模組讓主程序先建立監聽 socket 並暖機（載入模型、建立索引），
+再 fork 出 N 個 worker：
+  1. worker 以 copy-on-write 共用主程序已載入的記憶體（fork 前 gc.freeze）
+  2. 所有 worker 在同一個監聽 socket 上 accept
+  3. worker 處理 max_requests 個請求後自行結束，由主程序補上（避免記憶體累積）
+  4. worker 定期經由 pipe 回報心跳；超過 health_timeout 未回報的 worker
+     視為卡住，由主程序強制結束並重新 fork
+  5. SIGTERM / SIGINT 時通知 worker 完成目前請求後結束；SIGHUP 逐一汰換 worker
+
+只支援有 os.fork 的平台（Linux / macOS）。
+"""
+
+import gc
+import logging
+import os
+import random
+import select
+import signal
+import sys
+import time
+
+log = logging.getLogger(__name__)
+
+# worker 處理多少請求後汰換（0 = 不汰換）
+MAX_REQUESTS = 1000
+# 汰換門檻的隨機增量（相對 max_requests 的比例），避免所有 worker 同時汰換
+MAX_REQUESTS_JITTER = 0.1
+# worker 等待連線的輪詢間隔（秒）；每次輪詢都會送出心跳
+POLL_INTERVAL = 1.0
+# 超過此秒數沒有心跳的 worker 會被強制結束
+HEALTH_TIMEOUT = 120.0
+# worker 異常結束後重新 fork 前的等待（秒），避免快速循環崩潰
+RESPAWN_DELAY = 1.0
+
+
+def supports_prefork():
+    return hasattr(os, "fork")
+
+
+def _exit_code(status):
+    """waitpid 狀態轉為結束碼；被訊號終止時為 -訊號編號（同 os.waitstatus_to_exitcode，但支援 3.8）"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    if os.WIFEXITED(status):
+        return os.WEXITSTATUS(status)
+    return status
+
+
+class _Worker:
+    __slots__ = ("pid", "heartbeat_fd", "last_seen", "retiring", "draining")
+
+    def __init__(self, pid, heartbeat_fd):
+        self.pid = pid
+        self.heartbeat_fd = heartbeat_fd
+        self.last_seen = time.monotonic()
+        self.retiring = False     # 等待汰換（SIGHUP）
+        self.draining = False     # 已通知結束，正在完成目前請求
+
+
+class PreforkServer:
+    """
+    Parameters
+    ----------
+    server : socketserver.BaseServer — 已 bind / listen 的伺服器（如 HTTPServer）
+    workers : int — worker 數量
+    warm_up : callable, optional — fork 前在主程序執行的暖機函數
+    post_fork : callable, optional — 每個 worker fork 後、開始 accept 前執行
+    max_requests : int — 每個 worker 的請求上限（0 = 不汰換）
+    health_timeout : float
+    """
+
+    def __init__(self, server, workers, warm_up=None, max_requests=MAX_REQUESTS,
+                 health_timeout=HEALTH_TIMEOUT, post_fork=None):
+        if not supports_prefork():
+            raise RuntimeError("pre-fork mode requires os.fork")
+        self.server = server
+        self.worker_count = max(1, workers)
+        self.warm_up = warm_up
+        self.post_fork = post_fork
+        self.max_requests = max_requests
+        self.health_timeout = health_timeout
+        self.workers = {}        # pid → _Worker
+        self._stopping = False
+        self._recycle_all = False
+
+    # ── 主程序 ──
+
+    def serve_forever(self):
+        if self.warm_up:
+            self.warm_up()
+        # 暖機產生的物件移出 GC 追蹤，避免 worker 的 GC 觸碰頁面而破壞 copy-on-write
+        gc.collect()
+        gc.freeze()
+
+        previous = {
+            sig: signal.signal(sig, self._on_stop) for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        previous[signal.SIGHUP] = signal.signal(signal.SIGHUP, self._on_recycle)
+        try:
+            for _ in range(self.worker_count):
+                self._spawn()
+            while not self._stopping:
+                self._supervise()
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            self._shutdown_workers()
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_recycle(self, signum, frame):
+        self._recycle_all = True
+
+    def _spawn(self):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for worker in self.workers.values():
+                os.close(worker.heartbeat_fd)
+            code = 1
+            try:
+                self._worker_main(write_fd)
+                code = 0
+            except BaseException:
+                log.exception("Worker %d crashed", os.getpid())
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        os.close(write_fd)
+        os.set_blocking(read_fd, False)
+        self.workers[pid] = _Worker(pid, read_fd)
+        return pid
+
+    def _supervise(self):
+        """讀取心跳、回收結束的 worker、處理卡住與汰換"""
+        fds = {w.heartbeat_fd: w for w in self.workers.values()}
+        try:
+            readable, _, _ = select.select(list(fds), [], [], POLL_INTERVAL)
+        except InterruptedError:
+            readable = []
+        now = time.monotonic()
+        for fd in readable:
+            try:
+                if os.read(fd, 4096):
+                    fds[fd].last_seen = now
+            except BlockingIOError:
+                pass
+
+        # 回收已結束的 worker 並補上
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.heartbeat_fd)
+            if not self._stopping:
+                code = _exit_code(status)
+                if code != 0:
+                    log.error("Worker %d exited abnormally (%s); respawning", pid, code)
+                    time.sleep(RESPAWN_DELAY)
+                self._spawn()
+
+        # 健康檢查：心跳逾時的 worker 強制結束（下一輪會被回收並補上）
+        for worker in list(self.workers.values()):
+            if now - worker.last_seen > self.health_timeout:
+                log.error("Worker %d unresponsive; killing", worker.pid)
+                self._signal(worker.pid, signal.SIGKILL)
+                worker.last_seen = now
+
+        # SIGHUP：一次汰換一個 worker，其餘持續服務
+        if self._recycle_all:
+            self._recycle_all = False
+            for worker in self.workers.values():
+                worker.retiring = True
+        draining = any(w.draining for w in self.workers.values())
+        retiring = [w for w in self.workers.values() if w.retiring]
+        if retiring and not draining and len(self.workers) >= self.worker_count:
+            worker = retiring[0]
+            worker.retiring = False
+            worker.draining = True
+            self._signal(worker.pid, signal.SIGTERM)
+
+    def _shutdown_workers(self, timeout=10.0):
+        for pid in list(self.workers):
+            self._signal(pid, signal.SIGTERM)
+        deadline = time.monotonic() + timeout
+        while self.workers and time.monotonic() < deadline:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.05)
+                continue
+            worker = self.workers.pop(pid, None)
+            if worker:
+                os.close(worker.heartbeat_fd)
+        for pid, worker in list(self.workers.items()):
+            self._signal(pid, signal.SIGKILL)
+            os.close(worker.heartbeat_fd)
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self.workers.clear()
+        self.server.server_close()
+
+    @staticmethod
+    def _signal(pid, sig):
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    # ── worker ──
+
+    def _worker_main(self, heartbeat_fd):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        os.set_blocking(heartbeat_fd, False)
+        if self.post_fork:
+            self.post_fork()
+
+        # 非阻塞 accept：多個 worker 同時被喚醒時，沒搶到連線的不會卡在 accept
+        self.server.socket.setblocking(False)
+        self.server.timeout = POLL_INTERVAL
+
+        handled = [0]
+        finish_request = self.server.finish_request
+
+        def counting_finish_request(request, client_address):
+            handled[0] += 1
+            finish_request(request, client_address)
+
+        self.server.finish_request = counting_finish_request
+
+        limit = self.max_requests
+        if limit:
+            limit += random.randint(0, int(limit * MAX_REQUESTS_JITTER))
+        while not stopping and (not limit or handled[0] < limit):
+            try:
+                os.write(heartbeat_fd, b".")
+            except (BlockingIOError, BrokenPipeError):
+                pass
+            self.server.handle_request()
+        os.close(heartbeat_fd)
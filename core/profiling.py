@@ -0,0 +1,402 @@
+"""
+profiling.py — 線上請求剖析與全伺服器取樣
+
+某個痛點莫名變慢時，不必離線重現：
+  1. 單一請求剖析：/api/analyze?profile=sample（或 X-Profile: sample 標頭）
+     以取樣剖析器執行該請求；profile=cprofile 改用 cProfile。
+     剖析的請求在本程序中執行本地引擎（不交給子程序池），
+     處理請求的執行緒與執行本地引擎的執行緒都會被剖析
+  2. 全伺服器取樣：背景執行緒以低頻率取樣所有執行緒，
+     每個週期把 collapsed stacks 寫到 PROFILE_DIR 後重新計數；
+     server-* 檔案與單一請求的檔案各自只保留最新幾個（涵蓋所有 worker，
+     已汰換 worker 留下的檔案也會被清除）
+  3. 輸出：collapsed stacks（"a;b;c 次數"，可直接給 flamegraph.pl / speedscope）
+     或 cProfile 的 .prof；摘要依模組歸屬到各階段
+     （pain_analyzer / matcher / dynamic_composer / n8n_community），
+     階段時間包含其下的呼叫（巢狀時重疊）
+
+取樣以 sys._current_frames() 取得堆疊，是牆鐘時間：等待 I/O 的執行緒也會被計入。
+"""
+
+import cProfile
+import contextvars
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from core.paths import CACHE_DIR
+
+log = logging.getLogger(__name__)
+
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+# 單一請求剖析的取樣間隔（秒）
+SAMPLE_INTERVAL = 0.005
+# 全伺服器取樣的間隔（秒）與保留的檔案數（所有 worker 合計）
+SERVER_SAMPLE_INTERVAL = 0.02
+MAX_SERVER_FILES = 48
+# 保留的單一請求剖析檔數
+MAX_REQUEST_FILES = 100
+SERVER_PREFIX = "server-"
+# 回應中附上的堆疊 / 函式數
+TOP_N = 20
+# 堆疊深度上限
+MAX_DEPTH = 128
+
+MODES = ("sample", "cprofile")
+
+# 模組 → 階段
+STAGE_MODULES = {
+    "core.pain_analyzer": "pain_analyzer",
+    "core.matcher": "matcher",
+    "core.dynamic_composer": "dynamic_composer",
+    "core.n8n_community": "n8n_community",
+    "core.n8n_async": "n8n_community",
+}
+_STAGE_FILES = {
+    os.path.join("core", module.split(".", 1)[1] + ".py"): stage
+    for module, stage in STAGE_MODULES.items()
+}
+
+_current = contextvars.ContextVar("profile_session", default=None)
+
+
+def _frame_stack(frame):
+    """由根到葉的 "module:function" 清單"""
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    names.reverse()
+    return tuple(names)
+
+
+def stages_of(stack):
+    """堆疊中出現的階段（依呼叫順序，不重複）"""
+    stages = []
+    for name in stack:
+        stage = STAGE_MODULES.get(name.split(":", 1)[0])
+        if stage and stage not in stages:
+            stages.append(stage)
+    return stages
+
+
+class SamplingProfiler:
+    """
+    以固定間隔取樣執行緒堆疊。
+
+    Parameters
+    ----------
+    interval : float — 取樣間隔（秒）
+    all_threads : bool — True 時取樣所有執行緒；否則只取樣 track() 登記的執行緒
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, all_threads=False):
+        self.interval = interval
+        self.all_threads = all_threads
+        self.stacks = Counter()
+        self.ticks = 0
+        self.elapsed = 0.0
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+
+    def start(self):
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextmanager
+    def track(self):
+        """取樣目前執行緒（區塊結束後停止）"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads.add(ident)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._threads.discard(ident)
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, frame in frames.items():
+                    if ident == me or not (self.all_threads or ident in self._threads):
+                        continue
+                    self.stacks[_frame_stack(frame)] += 1
+                self.ticks += 1
+                self.elapsed = time.perf_counter() - self._started
+
+    def reset(self):
+        """清除計數（全伺服器取樣每個週期呼叫）；回傳清除前的 (stacks, elapsed)"""
+        with self._lock:
+            stacks, elapsed = self.stacks, self.elapsed
+            self.stacks = Counter()
+            self.ticks = 0
+            self.elapsed = 0.0
+            self._started = time.perf_counter()
+        return stacks, elapsed
+
+    def collapsed(self, stacks=None):
+        """collapsed stacks 文字（每行 "frame;frame;frame 次數"）"""
+        stacks = self.stacks if stacks is None else stacks
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in stacks.most_common())
+
+    def stage_ms(self):
+        """各階段的包含時間（毫秒）：含該階段模組的樣本數 × 每個取樣週期的實際秒數"""
+        with self._lock:
+            per_tick = self.elapsed / self.ticks if self.ticks else self.interval
+            totals = Counter()
+            for stack, count in self.stacks.items():
+                for stage in stages_of(stack):
+                    totals[stage] += count
+        return {stage: round(count * per_tick * 1000, 1) for stage, count in totals.most_common()}
+
+
+class CProfileSession:
+    """每個被追蹤的執行緒各自一個 cProfile.Profile，結束後合併"""
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def stats(self):
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def stage_ms(self):
+        """
+        各階段的包含時間（毫秒）：該階段模組中被模組外呼叫的函式的累計時間。
+        """
+        stats = self.stats()
+        if stats is None:
+            return {}
+
+        def stage_of(func):
+            filename = func[0]
+            for suffix, stage in _STAGE_FILES.items():
+                if filename.endswith(suffix):
+                    return stage
+            return None
+
+        totals = Counter()
+        for func, (_, _, _, _, callers) in stats.stats.items():
+            stage = stage_of(func)
+            if stage is None:
+                continue
+            for caller, caller_stats in callers.items():
+                if stage_of(caller) != stage:
+                    totals[stage] += caller_stats[3]
+        return {stage: round(seconds * 1000, 1) for stage, seconds in totals.most_common()}
+
+    def top(self, n=TOP_N):
+        """累計時間最多的函式"""
+        stats = self.stats()
+        if stats is None:
+            return []
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:n]
+        return [
+            {"function": f"{os.path.basename(filename)}:{lineno}({name})",
+             "calls": nc, "self_ms": round(tt * 1000, 2), "cumulative_ms": round(ct * 1000, 2)}
+            for (filename, lineno, name), (_, nc, tt, ct, _) in rows
+        ]
+
+
+class RequestProfile:
+    """
+    單一請求的剖析。
+
+    Attributes
+    ----------
+    mode : str — "sample" / "cprofile"
+    """
+
+    def __init__(self, mode, interval=SAMPLE_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"unknown profile mode: {mode!r}")
+        self.mode = mode
+        self.session = SamplingProfiler(interval) if mode == "sample" else CProfileSession()
+        self.duration = 0.0
+
+    def wrap(self, fn):
+        """回傳在被剖析執行緒中執行 fn 的函式（給 run_in_executor 使用）"""
+        def _run(*args, **kwargs):
+            with self.session.track():
+                return fn(*args, **kwargs)
+        return _run
+
+    def save(self, name, out_dir=PROFILE_DIR, max_files=MAX_REQUEST_FILES):
+        """寫出 .folded（sample）或 .prof（cprofile），只保留最新 max_files 個；回傳路徑"""
+        os.makedirs(out_dir, exist_ok=True)
+        if self.mode == "sample":
+            path = os.path.join(out_dir, f"{name}.folded")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.session.collapsed())
+        else:
+            path = os.path.join(out_dir, f"{name}.prof")
+            stats = self.session.stats()
+            if stats is not None:
+                stats.dump_stats(path)
+        _prune_profiles(out_dir, max_files, server=False)
+        return path
+
+    def report(self, top_n=TOP_N):
+        """回應中附上的摘要"""
+        report = {
+            "mode": self.mode,
+            "duration_ms": round(self.duration * 1000, 1),
+            "stages": self.session.stage_ms(),
+        }
+        if self.mode == "sample":
+            report["samples"] = sum(self.session.stacks.values())
+            report["top_stacks"] = [
+                {"stack": ";".join(stack), "samples": count}
+                for stack, count in self.session.stacks.most_common(top_n)
+            ]
+        else:
+            report["top_functions"] = self.session.top(top_n)
+        return report
+
+
+def requested_mode(query, headers):
+    """
+    由查詢字串（profile=sample|cprofile|1）或 X-Profile 標頭取得剖析模式。
+
+    Returns
+    -------
+    str or None
+    """
+    value = (query.get("profile", [""])[0] or headers.get("X-Profile") or "").strip().lower()
+    if not value or value in ("0", "false", "off"):
+        return None
+    return "sample" if value in ("1", "true", "on") else value
+
+
+@contextmanager
+def profile_request(mode, interval=SAMPLE_INTERVAL):
+    """
+    剖析此區塊（目前執行緒）；區塊內可用 current() 取得 RequestProfile
+    以剖析其他執行緒。
+    """
+    profile = RequestProfile(mode, interval)
+    token = _current.set(profile)
+    if mode == "sample":
+        profile.session.start()
+    start = time.perf_counter()
+    try:
+        with profile.session.track():
+            yield profile
+    finally:
+        profile.duration = time.perf_counter() - start
+        if mode == "sample":
+            profile.session.stop()
+        _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def _prune_profiles(out_dir, keep, server):
+    """
+    依修改時間只保留最新 keep 個剖析檔（server=True 為 server-* 檔案，否則為單一請求的檔案）。
+    多個 worker 可能同時清除，已被刪除的檔案直接略過。
+    """
+    entries = []
+    for name in os.listdir(out_dir):
+        if name.startswith(SERVER_PREFIX) != server or not name.endswith((".folded", ".prof")):
+            continue
+        try:
+            entries.append((os.stat(os.path.join(out_dir, name)).st_mtime_ns, name))
+        except OSError:
+            pass
+    entries.sort()
+    for _, name in entries[:max(len(entries) - keep, 0)]:
+        try:
+            os.remove(os.path.join(out_dir, name))
+        except OSError:
+            pass
+
+
+class ServerSampler:
+    """
+    全伺服器的週期取樣：每 period 秒把所有執行緒的 collapsed stacks
+    寫到 out_dir/server-<pid>-<時間>.folded。所有程序的 server-* 檔案合計只保留
+    最新 max_files 個，pre-fork 汰換的 worker 留下的檔案也會被清除。
+    """
+
+    def __init__(self, period, interval=SERVER_SAMPLE_INTERVAL, out_dir=PROFILE_DIR,
+                 max_files=MAX_SERVER_FILES):
+        self.period = period
+        self.out_dir = out_dir
+        self.max_files = max_files
+        self.profiler = SamplingProfiler(interval, all_threads=True)
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.profiler.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="server-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self.profiler.stop()
+
+    def flush(self):
+        """寫出目前週期的取樣並重新計數；沒有樣本時回傳 None"""
+        stacks, _ = self.profiler.reset()
+        if not stacks:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._seq += 1
+        name = f"{SERVER_PREFIX}{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S')}-{self._seq:06d}.folded"
+        path = os.path.join(self.out_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.profiler.collapsed(stacks))
+        _prune_profiles(self.out_dir, self.max_files, server=True)
+        return path
+
+    def _loop(self):
+        while not self._stop.wait(self.period):
+            try:
+                self.flush()
+            except OSError as e:
+                log.warning("Server profile write error: %r", e)
@@ -0,0 +1,328 @@
+"""
+rate_limit.py — 分析 API 的限流與用戶端間的公平排隊
+
+一個用戶端送出含 200 個痛點的 /api/analyze 就能佔滿伺服器，並觸發上百次
+上游呼叫。此模組提供：
+  1. 每個 IP 兩個 token bucket：請求數與痛點單位數（一個痛點 = 一單位）
+  2. 上游背壓：upstream 排程器預估的排隊時間超過 MAX_UPSTREAM_WAIT 時，
+     新的分析請求在入口即被拒絕（上游呼叫的全域速率由排程器控制）
+  3. 公平排隊：同時執行的分析請求數有上限，等待中的請求依
+     start-time fair queuing（以痛點數加權）排序，重度用戶端只會
+     延後自己的請求，不會拖慢其他用戶端
+  4. 超過限制時拋出 RateLimited，由 web_server 轉為 429 + Retry-After
+
+pre-fork 模式下每個 worker 各自計數；web_server 依 worker 數平分速率。
+"""
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from core.request_log import stage
+
+# 每個 IP 的請求數：每分鐘補充量與瞬間上限
+REQUESTS_PER_MINUTE = 60
+REQUEST_BURST = 20
+# 每個 IP 的痛點單位數
+UNITS_PER_MINUTE = 60
+UNIT_BURST = 20
+# upstream 排程器預估排隊秒數超過此值時拒絕新的分析請求
+MAX_UPSTREAM_WAIT = 10.0
+# 同時執行的分析請求數
+MAX_ACTIVE = os.cpu_count() or 1
+# 每個 IP 最多排隊的請求數
+MAX_QUEUED_PER_CLIENT = 4
+# 排隊等待的秒數上限
+QUEUE_TIMEOUT = 15.0
+# 保留 bucket 的 IP 數上限（超過時淘汰最久未使用者）
+MAX_CLIENTS = 10000
+
+
+class RateLimited(Exception):
+    """
+    超過限制。
+
+    Attributes
+    ----------
+    scope : str — "requests" / "pain_points" / "upstream" / "queue"
+    retry_after : float — 建議的重試等待秒數
+    """
+
+    MESSAGES = {
+        "requests": "請求過於頻繁，請稍後再試",
+        "pain_points": "分析的痛點數過多，請稍後再試",
+        "upstream": "社群搜尋額度暫時用盡，請稍後再試",
+        "queue": "伺服器忙碌中，請稍後再試",
+    }
+
+    def __init__(self, scope, retry_after):
+        super().__init__(f"rate limited ({scope}), retry after {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        return str(max(1, math.ceil(self.retry_after)))
+
+    def to_dict(self):
+        return {
+            "error": self.MESSAGES.get(self.scope, "請求過於頻繁"),
+            "code": "rate_limited",
+            "scope": self.scope,
+            "retry_after": round(self.retry_after, 1),
+        }
+
+
+class TokenBucket:
+    """
+    Parameters
+    ----------
+    rate : float — 每秒補充的 token 數
+    capacity : float — token 上限（瞬間可用量）
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_lock")
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, amount, now):
+        """取得 amount 個 token 需要等待的秒數（0 = 現在即可）"""
+        with self._lock:
+            self._refill(now)
+            if self.tokens >= amount:
+                return 0.0
+            if self.rate <= 0:
+                return math.inf
+            return (amount - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        """立即取得 amount 個 token；不足時不扣除並回傳 False"""
+        with self._lock:
+            self._refill(now)
+            if self.tokens < amount:
+                return False
+            self.tokens -= amount
+            return True
+
+    def available(self, now):
+        with self._lock:
+            self._refill(now)
+            return self.tokens
+
+
+class FairQueue:
+    """
+    限制同時執行數的公平排隊（start-time fair queuing）。
+
+    每個請求的開始標籤為 max(虛擬時間, 該用戶端上一個請求的結束標籤)，
+    結束標籤為開始標籤 + cost；有空位時放行開始標籤最小者。送出大量
+    工作的用戶端標籤快速增加，其他用戶端的請求因此排在它前面。
+    """
+
+    def __init__(self, max_active=MAX_ACTIVE, max_queued_per_client=MAX_QUEUED_PER_CLIENT,
+                 timeout=QUEUE_TIMEOUT):
+        self.max_active = max(1, max_active)
+        self.max_queued_per_client = max_queued_per_client
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._heap = []              # (start tag, seq, waiter)
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._finish = {}            # client → 最後一個請求的結束標籤
+        self._queued = {}            # client → 排隊中的請求數
+
+    @contextmanager
+    def slot(self, client, cost=1):
+        """取得執行空位；排隊過多或逾時時拋出 RateLimited(scope="queue")"""
+        with stage("queue"):
+            self._acquire(client, cost)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _acquire(self, client, cost):
+        with self._cond:
+            start = max(self._virtual_time, self._finish.get(client, 0.0))
+            if self._active < self.max_active and not self._heap:
+                self._active += 1
+                self._virtual_time = start
+                self._finish[client] = start + cost
+                return
+            if self._queued.get(client, 0) >= self.max_queued_per_client:
+                raise RateLimited("queue", self.timeout)
+
+            waiter = {"granted": False}
+            heapq.heappush(self._heap, (start, next(self._seq), waiter))
+            previous = self._finish.get(client)
+            self._finish[client] = start + cost
+            self._queued[client] = self._queued.get(client, 0) + 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while not waiter["granted"]:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._heap = [e for e in self._heap if e[2] is not waiter]
+                        heapq.heapify(self._heap)
+                        self._rollback_finish(client, cost, previous, start + cost)
+                        raise RateLimited("queue", self.timeout)
+                    self._cond.wait(remaining)
+            finally:
+                self._queued[client] -= 1
+                if not self._queued[client]:
+                    del self._queued[client]
+
+    def _rollback_finish(self, client, cost, previous, finish):
+        """逾時未執行的請求不計入用戶端的結束標籤"""
+        if self._finish.get(client) == finish:
+            # 之後沒有同一用戶端的請求排入：還原為排入前的標籤
+            if previous is None:
+                del self._finish[client]
+            else:
+                self._finish[client] = previous
+        elif client in self._finish:
+            self._finish[client] -= cost
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            while self._heap and self._active < self.max_active:
+                start, _, waiter = heapq.heappop(self._heap)
+                self._active += 1
+                self._virtual_time = max(self._virtual_time, start)
+                waiter["granted"] = True
+            if not self._heap:
+                # 沒有人排隊時，標籤落後虛擬時間的用戶端不需保留
+                self._finish = {c: f for c, f in self._finish.items() if f > self._virtual_time}
+            self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {"active": self._active, "queued": len(self._heap)}
+
+
+class RateLimiter:
+    """
+    Parameters
+    ----------
+    requests_per_minute, request_burst : 每個 IP 的請求 bucket
+    units_per_minute, unit_burst : 每個 IP 的痛點單位 bucket
+    max_upstream_wait : float — 上游排隊秒數上限
+    queue : FairQueue, optional
+    scheduler : upstream.UpstreamScheduler, optional — 預設為程序共用的排程器
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, request_burst=REQUEST_BURST,
+                 units_per_minute=UNITS_PER_MINUTE, unit_burst=UNIT_BURST,
+                 max_upstream_wait=MAX_UPSTREAM_WAIT, queue=None, scheduler=None,
+                 clock=time.monotonic):
+        self.request_rate = requests_per_minute / 60.0
+        self.request_burst = request_burst
+        self.unit_rate = units_per_minute / 60.0
+        self.unit_burst = unit_burst
+        self.max_upstream_wait = max_upstream_wait
+        self.queue = queue or FairQueue()
+        self._scheduler = scheduler
+        self.clock = clock
+        self._lock = threading.Lock()
+        # ip → (request bucket, unit bucket)
+        self._clients = OrderedDict()
+
+    def _buckets(self, client):
+        with self._lock:
+            buckets = self._clients.get(client)
+            if buckets is None:
+                buckets = (TokenBucket(self.request_rate, self.request_burst, self.clock),
+                           TokenBucket(self.unit_rate, self.unit_burst, self.clock))
+                self._clients[client] = buckets
+                while len(self._clients) > MAX_CLIENTS:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client)
+            return buckets
+
+    def admit(self, client, units=0, upstream=False):
+        """
+        入口檢查：扣除一個請求 token 與 units 個痛點 token（任一不足時都不扣除）。
+
+        Parameters
+        ----------
+        units : int — 痛點數（0 = 非分析請求）
+        upstream : bool — 是否需要上游呼叫（上游排隊過長時拒絕）
+
+        Raises
+        ------
+        RateLimited
+        """
+        requests, unit_bucket = self._buckets(client)
+        now = self.clock()
+        wait = requests.wait_time(1, now)
+        if wait:
+            raise RateLimited("requests", wait)
+        if units:
+            wait = unit_bucket.wait_time(units, now)
+            if wait:
+                raise RateLimited("pain_points", wait)
+        if upstream:
+            wait = self.upstream_wait()
+            if wait > self.max_upstream_wait:
+                raise RateLimited("upstream", wait - self.max_upstream_wait)
+        # 兩個 bucket 都足夠才扣除；併發下若已被同一 IP 的其他請求取走則拒絕
+        if not requests.take(1, now):
+            raise RateLimited("requests", requests.wait_time(1, now))
+        if units and not unit_bucket.take(units, now):
+            raise RateLimited("pain_points", unit_bucket.wait_time(units, now))
+
+    def upstream_wait(self):
+        """分析請求的上游呼叫預估要排隊的秒數"""
+        from core.upstream import PRIORITY_SEARCH, get_scheduler
+        scheduler = self._scheduler or get_scheduler()
+        return scheduler.estimated_wait(PRIORITY_SEARCH)
+
+
+_default_limiter = None
+_default_lock = threading.Lock()
+
+
+def get_limiter():
+    """取得程序共用的限流器（未設定時為 None，不限流）"""
+    return _default_limiter
+
+
+def configure(workers=1, enabled=True, **overrides):
+    """
+    建立程序共用的限流器。pre-fork 時各 worker 的速率依 workers 平分。
+
+    Returns
+    -------
+    RateLimiter or None
+    """
+    global _default_limiter
+    with _default_lock:
+        if not enabled:
+            _default_limiter = None
+            return None
+        workers = max(1, workers)
+        options = {
+            "requests_per_minute": REQUESTS_PER_MINUTE / workers,
+            "units_per_minute": UNITS_PER_MINUTE / workers,
+        }
+        options.update(overrides)
+        _default_limiter = RateLimiter(**options)
+        return _default_limiter
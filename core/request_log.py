@@ -0,0 +1,294 @@
+"""
+request_log.py — 結構化請求日誌（JSON lines、非同步寫出、取樣）
+
+原本 web_server 的存取日誌與各模組的錯誤訊息都直接 print 到 stdout，
+在處理請求的執行緒中同步寫出，且無法分析。此模組：
+  1. configure() 在 root logger 掛上 QueueHandler：記錄只放進佇列，
+     由背景 QueueListener 執行緒格式化為 JSON 寫出；佇列已滿時丟棄
+     （計入 dropped），不阻塞請求
+  2. 每個請求一個 RequestLog（以 contextvar 傳遞，包含在 asyncio task 中）：
+     request id、路由、痛點數、各階段耗時、上游呼叫的狀態碼
+  3. 請求結束時：失敗（狀態碼 >= 400）或慢（>= slow_ms）的請求一定寫出，
+     其餘依 sample_rate 取樣
+  4. 各模組以 logging.getLogger(__name__) 記錄錯誤，同樣經由佇列寫出；
+     在請求中記錄的訊息會帶上該請求的 request_id
+
+pre-fork 的 worker 不會繼承背景執行緒：QueueHandler 偵測到 pid 改變時
+自動重建佇列與 listener。
+"""
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# 成功且不慢的請求寫出的比例
+SAMPLE_RATE = float(os.environ.get("N8N_CONSULTANT_LOG_SAMPLE", "0.1"))
+# 超過此毫秒數的請求一定寫出
+SLOW_MS = float(os.environ.get("N8N_CONSULTANT_LOG_SLOW_MS", "2000"))
+# 佇列中等待寫出的記錄數上限
+MAX_QUEUE = 10000
+
+access_log = logging.getLogger("n8n_consultant.access")
+
+_current = contextvars.ContextVar("request_log", default=None)
+
+# LogRecord 的內建屬性；其餘屬性（logging 的 extra=）寫進 JSON
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+_plain = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """一筆記錄一行 JSON：ts, level, logger, msg 與 extra 欄位"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    放進有上限的佇列後立即返回；由 QueueListener 在背景寫到 target。
+
+    Parameters
+    ----------
+    target : logging.Handler — 實際寫出的 handler（在 listener 執行緒中呼叫）
+    maxsize : int
+    """
+
+    def __init__(self, target, maxsize=MAX_QUEUE):
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.listener = None
+        self._pid = None
+        super().__init__(None)
+        self._start()
+
+    def _start(self):
+        self.queue = queue.Queue(self.maxsize)
+        self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def prepare(self, record):
+        # 訊息與例外在呼叫端先轉為文字（args 可能之後被修改、traceback 不跨執行緒保留）；
+        # JSON 格式化留給 listener 執行緒
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        request = _current.get()
+        if request is not None and not hasattr(record, "request_id"):
+            record.request_id = request.request_id
+        if record.exc_info:
+            record.exc_text = _plain.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            # fork 後的子程序沒有 listener 執行緒
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """寫出佇列中剩餘的記錄並停止 listener"""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+
+
+class RequestLog:
+    """
+    單一請求的日誌欄位。階段耗時與上游呼叫可由多個 asyncio task 同時累加。
+
+    Attributes
+    ----------
+    request_id, method, route : str
+    fields : dict — 其他欄位（client, pain_points, …）
+    stages : dict — 階段 → 累計毫秒
+    upstream : dict — calls, ms, statuses {狀態碼或例外名稱: 次數}
+    """
+
+    def __init__(self, method, route, request_id=None, **fields):
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.method = method
+        self.route = route
+        self.fields = fields
+        self.stages = {}
+        self.upstream = {"calls": 0, "ms": 0.0, "statuses": {}}
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, ms):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def add_upstream(self, status, ms):
+        with self._lock:
+            self.upstream["calls"] += 1
+            self.upstream["ms"] += ms
+            key = str(status)
+            self.upstream["statuses"][key] = self.upstream["statuses"].get(key, 0) + 1
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self, status):
+        with self._lock:
+            return {
+                "request_id": self.request_id,
+                "method": self.method,
+                "route": self.route,
+                "status": status,
+                "duration_ms": round(self.elapsed_ms(), 1),
+                **self.fields,
+                "stages": {k: round(v, 1) for k, v in self.stages.items()},
+                "upstream": {**self.upstream, "ms": round(self.upstream["ms"], 1),
+                             "statuses": dict(self.upstream["statuses"])},
+            }
+
+
+_config = {"sample_rate": SAMPLE_RATE, "slow_ms": SLOW_MS}
+_handler = None
+_rng = random.Random()
+
+
+def configure(level=logging.INFO, sample_rate=SAMPLE_RATE, slow_ms=SLOW_MS, stream=None):
+    """
+    把 root logger 的輸出改為經由佇列寫出的 JSON lines。
+
+    Parameters
+    ----------
+    sample_rate : float — 成功請求的取樣比例（0 = 只寫出慢或失敗的請求）
+    slow_ms : float
+    stream : file-like, optional — 預設 stderr
+
+    Returns
+    -------
+    AsyncQueueHandler
+    """
+    global _handler
+    _config.update(sample_rate=sample_rate, slow_ms=slow_ms)
+    target = logging.StreamHandler(stream or sys.stderr)
+    target.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    if _handler is not None:
+        root.removeHandler(_handler)
+        _handler.stop()
+    _handler = AsyncQueueHandler(target)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    return _handler
+
+
+def shutdown():
+    if _handler is not None:
+        _handler.stop()
+
+
+atexit.register(shutdown)
+
+
+# ── 請求範圍 ──
+
+def begin(method, route, request_id=None, **fields):
+    """開始一個請求；回傳 (RequestLog, contextvar token)"""
+    request = RequestLog(method, route, request_id, **fields)
+    return request, _current.set(request)
+
+
+def current():
+    return _current.get()
+
+
+def annotate(**fields):
+    """在目前的請求加上欄位（沒有請求時忽略）"""
+    request = _current.get()
+    if request is not None:
+        request.fields.update(fields)
+
+
+def should_log(status, duration_ms):
+    if status >= 400 or duration_ms >= _config["slow_ms"]:
+        return True
+    return _rng.random() < _config["sample_rate"]
+
+
+def finish(request, token, status):
+    """
+    結束請求；依狀態碼、耗時與取樣決定是否寫出。
+
+    Returns
+    -------
+    bool — 是否寫出
+    """
+    _current.reset(token)
+    entry = request.to_dict(status)
+    if not should_log(status, entry["duration_ms"]):
+        return False
+    if status >= 500:
+        level = logging.ERROR
+    elif status >= 400 or entry["duration_ms"] >= _config["slow_ms"]:
+        level = logging.WARNING
+    else:
+        level = logging.INFO
+    access_log.log(level, "%s %s %s", request.method, request.route, status, extra=entry)
+    return True
+
+
+@contextmanager
+def stage(name):
+    """累計此區塊的耗時到目前請求的 stages[name]（沒有請求時不計時）"""
+    request = _current.get()
+    if request is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request.add_stage(name, (time.perf_counter() - start) * 1000)
+
+
+@contextmanager
+def upstream_call():
+    """記錄一次上游呼叫的狀態碼（例外時為其 status 屬性或例外名稱）與耗時"""
+    request = _current.get()
+    if request is None:
+        yield
+        return
+    start = time.perf_counter()
+    status = 200
+    try:
+        yield
+    except BaseException as e:
+        status = getattr(e, "status", None) or type(e).__name__
+        raise
+    finally:
+        request.add_upstream(status, (time.perf_counter() - start) * 1000)
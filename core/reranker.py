@@ -0,0 +1,127 @@
+"""
+reranker.py — 社群模板候選的混合重排序
+
+在抓取任何詳情之前，以三種便宜的訊號為 search 結果打分：
+  1. lexical   — 翻譯後的英文查詢與模板名稱 / 描述的 TF-IDF 相似度
+  2. structure — pain_analyzer 偵測到的結構與模板節點家族的重疊比例
+  3. views     — 瀏覽數（log 縮放）
+
+只對分數夠高的候選抓詳情，減少每個請求的上游呼叫。
+"""
+
+import math
+import re
+
+from core.feature_index import popcount
+
+# 各訊號權重（可由呼叫端覆寫）
+RERANK_WEIGHTS = {
+    "lexical": 0.5,
+    "structure": 0.3,
+    "views": 0.2,
+}
+# 分數低於此值的候選不抓詳情（除非結果數不足 MIN_RESULTS）
+MIN_SCORE = 0.15
+MIN_RESULTS = 3
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+# 不具辨識度的英文詞
+_STOP_WORDS = frozenset([
+    "a", "an", "and", "the", "to", "of", "in", "on", "for", "with", "from", "by",
+    "your", "you", "is", "are", "it", "this", "that", "n8n", "workflow", "workflows",
+    "automation", "automate", "automated", "using", "via", "into", "new",
+])
+
+
+def tokenize(text):
+    """英文小寫斷詞並移除停用詞"""
+    return [w for w in _WORD_RE.findall((text or "").lower()) if w not in _STOP_WORDS]
+
+
+def _candidate_text(wf):
+    return f"{wf.get('name', '')} {wf.get('description', '')}"
+
+
+def lexical_scores(query, candidates):
+    """
+    以候選集合本身計算 IDF，回傳查詢與每個候選的 cosine 相似度（0~1）。
+    """
+    docs = [tokenize(_candidate_text(wf)) for wf in candidates]
+    n_docs = len(docs)
+    df = {}
+    for tokens in docs:
+        for term in set(tokens):
+            df[term] = df.get(term, 0) + 1
+
+    def _idf(term):
+        # 平滑 IDF（與 scikit-learn smooth_idf 相同形式）
+        return math.log((1 + n_docs) / (1 + df.get(term, 0))) + 1
+
+    def _vector(tokens):
+        tf = {}
+        for term in tokens:
+            tf[term] = tf.get(term, 0) + 1
+        vec = {term: (1 + math.log(count)) * _idf(term) for term, count in tf.items()}
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        return {term: v / norm for term, v in vec.items()} if norm else {}
+
+    query_vec = _vector(tokenize(query))
+    scores = []
+    for tokens in docs:
+        doc_vec = _vector(tokens)
+        scores.append(sum(w * doc_vec.get(term, 0.0) for term, w in query_vec.items()))
+    return scores
+
+
+def rerank(candidates, query, wanted_mask=0, index=None, weights=None):
+    """
+    為候選打分並排序。
+
+    Parameters
+    ----------
+    candidates : list[dict] — search API 結果（id, name, description, totalViews）
+    query : str — 英文查詢字串
+    wanted_mask : int — families_for_analysis() 的結果
+    index : FeatureIndex, optional — 取得候選的節點家族
+    weights : dict, optional — 覆寫 RERANK_WEIGHTS
+
+    Returns
+    -------
+    list[tuple] — (score, wf, {"lexical", "structure", "views"})，依分數由高到低
+    """
+    if not candidates:
+        return []
+    weights = dict(RERANK_WEIGHTS, **(weights or {}))
+
+    lexical = lexical_scores(query, candidates)
+    wanted_total = popcount(wanted_mask)
+    max_log_views = max(math.log1p(max(wf.get("totalViews", 0) or 0, 0)) for wf in candidates) or 1.0
+
+    ranked = []
+    for wf, lex in zip(candidates, lexical):
+        structure = 0.0
+        if wanted_total and index is not None:
+            structure = index.overlap(wf.get("id"), wanted_mask) / wanted_total
+        views = math.log1p(max(wf.get("totalViews", 0) or 0, 0)) / max_log_views
+        parts = {"lexical": lex, "structure": structure, "views": views}
+        score = sum(weights[k] * parts[k] for k in parts)
+        ranked.append((score, wf, parts))
+
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return ranked
+
+
+def select_for_detail(ranked, max_results, min_score=MIN_SCORE, min_results=MIN_RESULTS):
+    """
+    挑選要抓詳情的候選：最多 max_results 個、分數需達 min_score，
+    但至少保留 min_results 個（若候選足夠）。
+
+    Returns
+    -------
+    list[tuple] — rerank() 的項目子集
+    """
+    selected = []
+    for item in ranked[:max_results]:
+        if item[0] >= min_score or len(selected) < min(min_results, max_results):
+            selected.append(item)
+    return selected
@@ -6,43 +6,69 @@ roadmap_generator.py — n8n 導入路徑圖產生器（動態版 + 社群整合
   2. 本地動態分析 — jieba + dynamic_composer 自訂組裝
 """
 
+import logging
+
 from core.pain_analyzer import analyze_pain_point
 from core.pain_analyzer import analyze_pain_point
 from core.dynamic_composer import compose_workflow, compose_difficulty, compose_steps, compose_cost
+from core.matcher import match_solutions
 from core.n8n_community import search_and_enrich
 
+log = logging.getLogger(__name__)
+
 
 def _stars(n):
     """將數字轉為星號"""
     return "★" * n + "☆" * (5 - n)
 
 
-def generate_roadmap(matched_solutions, industry_name, department_name=None, user_query=""):
+def build_local_stage(user_query, industry_name, department_name=None, matched_solutions=None):
     """
-    產生 n8n 導入路徑圖（雙引擎）。
+    本地引擎（CPU 密集）：痛點分析、TF-IDF 匹配、動態組裝、困難度與成本。
+    只使用可序列化的參數與回傳值，可交給 analysis_pool 的子程序執行。
+
+    Parameters
+    ----------
+    matched_solutions : list, optional — 已有匹配結果時不再重新匹配
 
     Returns
     -------
-    dict with: local_analysis + community_results
+    dict with: analysis, matched_solutions, workflow, difficulty,
+               difficulty_reasons, steps, cost_estimate
     """
-    # ── 1. 本地痛點分析 ──
     analysis = analyze_pain_point(user_query, industry_name, department_name or "")
+    if matched_solutions is None:
+        matched_solutions = match_solutions(
+            user_query, top_n=3, context=(industry_name, department_name or None),
+        )
 
-    # ── 2. 本地動態工作流 ──
     workflow = compose_workflow(analysis, industry_name, user_query)
     difficulty, difficulty_reasons = compose_difficulty(analysis, len(workflow["nodes"]))
     steps = compose_steps(analysis, workflow["nodes"], difficulty)
-    cost_estimate = compose_cost(len(workflow["nodes"]), difficulty)
+    return {
+        "analysis": analysis,
+        "matched_solutions": matched_solutions,
+        "workflow": workflow,
+        "difficulty": difficulty,
+        "difficulty_reasons": difficulty_reasons,
+        "steps": steps,
+        "cost_estimate": compose_cost(len(workflow["nodes"]), difficulty),
+    }
 
-    # ── 3. n8n 社群搜尋 ──
-    keywords = analysis.get("keywords", [])
-    community_results = []
-    try:
-        community_results = search_and_enrich(keywords, industry_name, max_results=5)
-    except Exception as e:
-        print(f"[roadmap] Community search failed: {e}")
 
-    # ── 4. 組裝結果 ──
+def assemble_roadmap(local, community_results, industry_name, department_name=None, user_query=""):
+    """
+    將本地引擎結果與社群搜尋結果組裝成路徑圖。
+
+    Returns
+    -------
+    dict with: local_analysis + community_results
+    """
+    analysis = local["analysis"]
+    workflow = local["workflow"]
+    difficulty = local["difficulty"]
+    matched_solutions = local["matched_solutions"]
+
     roadmap = {
         "industry": industry_name,
         "department": department_name or "全部門",
@@ -62,9 +88,9 @@ def generate_roadmap(matched_solutions, industry_name, department_name=None, use
             "workflow": workflow,
             "difficulty": difficulty,
             "difficulty_display": _stars(difficulty),
-            "difficulty_reasons": difficulty_reasons,
-            "steps": steps,
-            "estimated_cost": cost_estimate,
+            "difficulty_reasons": local["difficulty_reasons"],
+            "steps": local["steps"],
+            "estimated_cost": local["cost_estimate"],
             "match_score": matched_solutions[0]["similarity"] if matched_solutions else 0,
             "alternatives": [],
         },
@@ -84,3 +110,32 @@ def generate_roadmap(matched_solutions, industry_name, department_name=None, use
         })
 
     return roadmap
+
+
+def generate_roadmap(matched_solutions, industry_name, department_name=None, user_query="",
+                     cancel_check=None):
+    """
+    產生 n8n 導入路徑圖（雙引擎）。
+
+    cancel_check 會傳給社群搜尋，回傳 True 時中止（呼叫端已斷線）。
+    多個痛點需同時處理時請改用 analysis_pool.analyze_many。
+
+    Returns
+    -------
+    dict with: local_analysis + community_results
+    """
+    # ── 1~2. 本地痛點分析與動態工作流 ──
+    local = build_local_stage(user_query, industry_name, department_name, matched_solutions)
+    analysis = local["analysis"]
+
+    # ── 3. n8n 社群搜尋 ──
+    keywords = analysis.get("keywords", [])
+    community_results = []
+    try:
+        community_results = search_and_enrich(keywords, industry_name, max_results=5,
+                                              cancel_check=cancel_check, analysis=analysis)
+    except Exception as e:
+        log.warning("Community search failed: %r", e)
+
+    # ── 4. 組裝結果 ──
+    return assemble_roadmap(local, community_results, industry_name, department_name, user_query)
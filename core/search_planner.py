@@ -0,0 +1,170 @@
+"""
+search_planner.py — 社群搜尋的查詢規劃器
+
+取代固定的四輪依序搜尋：
+  1. 一次產生所有候選查詢（完整翻譯、前兩個關鍵字、產業 + automation、單一關鍵字）
+  2. 依歷史有結果比例排序；先發出前幾個，不足或逾時才發出其餘查詢
+     （n8n_async.FIRST_WAVE），結果陸續回來時依 id 去重
+  3. 高分候選足夠時提前停止，取消尚未完成的查詢
+  4. 依歷史統計學習哪些查詢形式容易有結果，跳過長期無結果的形式；
+     被跳過的形式每 EXPLORE_EVERY 次規劃仍發出一次，樣本超過 MAX_SAMPLES 時
+     計數減半，短暫的上游故障或冷快取不會讓某個形式永久停用
+"""
+
+import json
+import logging
+import os
+import threading
+
+from core.n8n_community import ZH_TO_EN, translate_keywords
+from core.paths import CACHE_DIR
+
+log = logging.getLogger(__name__)
+
+STATS_PATH = os.path.join(CACHE_DIR, "query_stats.json")
+
+# 至少累積幾次樣本才依歷史跳過查詢形式
+MIN_SAMPLES = 20
+# 有結果比例低於此值的形式會被跳過（"full" 永遠會發出）
+MIN_YIELD_RATE = 0.1
+# 被跳過的形式每幾次規劃仍發出一次（探索，讓統計有機會恢復）
+EXPLORE_EVERY = 10
+# 發出次數超過此值時所有計數減半（舊樣本逐漸淡出）
+MAX_SAMPLES = 200
+# 每累積幾次更新寫回磁碟
+SAVE_EVERY = 20
+
+# 查詢形式（依預設優先順序）
+FORM_FULL = "full"
+FORM_HEAD2 = "head2"
+FORM_INDUSTRY = "industry_auto"
+FORM_KEYWORD = "keyword"
+
+
+def plan_queries(zh_keywords, industry="", stats=None):
+    """
+    產生所有候選查詢。
+
+    Returns
+    -------
+    list[tuple] — (form, query)，依歷史有結果比例排序、已去重，
+                  並移除長期無結果的形式（探索輪除外）
+    """
+    plans = [(FORM_FULL, translate_keywords(zh_keywords, industry))]
+    if len(zh_keywords) >= 2:
+        plans.append((FORM_HEAD2, translate_keywords(zh_keywords[:2], industry)))
+    if industry:
+        plans.append((FORM_INDUSTRY, f"{ZH_TO_EN.get(industry, industry)} workflow automation"))
+    for kw in zh_keywords[:3]:
+        if kw in ZH_TO_EN:
+            plans.append((FORM_KEYWORD, ZH_TO_EN[kw]))
+
+    seen = set()
+    unique = []
+    for form, query in plans:
+        if query not in seen:
+            seen.add(query)
+            unique.append((form, query))
+
+    if stats is None:
+        return unique
+    kept = [(form, q) for form, q in unique if form == FORM_FULL or not stats.should_skip(form)]
+    # 穩定排序：有結果比例高的形式先取得上游名額
+    return sorted(kept, key=lambda p: -stats.yield_rate(p[0]))
+
+
+class QueryStats:
+    """
+    各查詢形式的歷史統計：發出次數、有結果次數、平均結果數。
+    跳過次數只保存在記憶體中，用來決定何時探索。
+    """
+
+    def __init__(self, path=STATS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._skipped = {}
+        self._dirty = 0
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._stats = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("Ignoring unreadable stats: %r", e)
+
+    def record(self, form, result_count, new_count):
+        """
+        記錄一次查詢結果。
+
+        有結果（result_count > 0）即計為 yielded：較晚完成的查詢即使結果都已被
+        其他查詢取得（new_count 為 0），也不因完成順序被判為無結果。
+        """
+        with self._lock:
+            entry = self._stats.setdefault(form, {"issued": 0, "yielded": 0, "results": 0, "new": 0})
+            if entry["issued"] >= MAX_SAMPLES:
+                for key in entry:
+                    entry[key] //= 2
+            entry["issued"] += 1
+            entry["yielded"] += 1 if result_count else 0
+            entry["results"] += result_count
+            entry["new"] += new_count
+            self._dirty += 1
+            should_save = self._dirty >= SAVE_EVERY
+        if should_save:
+            self.save()
+
+    def yield_rate(self, form):
+        """有結果的比例；沒有樣本時視為 1.0"""
+        entry = self._stats.get(form)
+        if not entry or not entry["issued"]:
+            return 1.0
+        return entry["yielded"] / entry["issued"]
+
+    def should_skip(self, form):
+        """
+        此次規劃是否跳過 form。長期無結果的形式每 EXPLORE_EVERY 次仍發出一次。
+        """
+        entry = self._stats.get(form)
+        if not entry or entry["issued"] < MIN_SAMPLES or self.yield_rate(form) >= MIN_YIELD_RATE:
+            return False
+        with self._lock:
+            skipped = self._skipped.get(form, 0) + 1
+            explore = skipped >= EXPLORE_EVERY
+            self._skipped[form] = 0 if explore else skipped
+        if explore:
+            log.debug("Exploring low-yield query form %s", form)
+        return not explore
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._stats))
+
+    def save(self):
+        """寫回磁碟（先寫暫存檔再取代，避免寫到一半）"""
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps(self._stats, ensure_ascii=False, indent=2)
+            self._dirty = 0
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log.warning("Save stats error: %r", e)
+
+
+_default_stats = None
+_default_lock = threading.Lock()
+
+
+def get_stats():
+    """取得程序共用的查詢統計"""
+    global _default_stats
+    if _default_stats is None:
+        with _default_lock:
+            if _default_stats is None:
+                _default_stats = QueryStats()
+    return _default_stats
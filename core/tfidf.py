@@ -0,0 +1,195 @@
+"""
+tfidf.py — 輕量的字元 n-gram TF-IDF 引擎
+
+方案庫只有十幾份文件，scikit-learn 卻佔了匹配引擎大部分的匯入時間與記憶體，
+而 matcher 只用到 TfidfVectorizer(analyzer="char_wb") 與 cosine_similarity。
+此模組以純 Python + numpy 重新實作這兩者，分數與 scikit-learn 相同：
+  1. 分詞：與 char_wb 相同 —— 轉小寫、每個詞前後補空白後切出 n-gram，
+     不跨越詞的邊界；比詞還長的 n-gram 只計一次
+  2. 詞彙：dict（n-gram → 欄位），依字串排序；超過 max_features 時
+     保留語料中出現次數最多的（與 scikit-learn 相同的 numpy argsort）
+  3. 權重：tf 為次數（sublinear_tf 時為 1 + ln 次數），
+     idf = ln((1 + n) / (1 + df)) + 1，每列以 L2 正規化
+  4. 文件矩陣以 CSR 陣列（data / indices / indptr）保存，可直接指向
+     catalog_artifact 的 mmap；查詢向量是 {欄位: 權重} 的 dict，
+     相似度只計算查詢出現的欄位
+"""
+
+import math
+import re
+from collections import Counter
+
+import numpy as np
+
+_WHITE_SPACES = re.compile(r"\s\s+")
+
+
+class CharTfidf:
+    """
+    字元 n-gram（詞邊界內）TF-IDF 向量化器。
+
+    Parameters
+    ----------
+    analyzer : str — 只支援 "char_wb"（與 TFIDF_PARAMS 相容）
+    ngram_range : tuple — (最小, 最大) n-gram 長度
+    max_features : int, optional — 詞彙數上限
+    sublinear_tf : bool — tf 取 1 + ln(次數)
+
+    Attributes
+    ----------
+    vocabulary_ : dict — n-gram → 欄位索引
+    idf_ : numpy.ndarray — 各欄位的 idf
+    """
+
+    def __init__(self, analyzer="char_wb", ngram_range=(2, 4), max_features=None, sublinear_tf=False):
+        if analyzer != "char_wb":
+            raise ValueError(f"unsupported analyzer: {analyzer!r}")
+        self.ngram_range = tuple(ngram_range)
+        self.max_features = max_features
+        self.sublinear_tf = sublinear_tf
+        self.vocabulary_ = None
+        self.idf_ = None
+
+    @classmethod
+    def from_fitted(cls, params, vocabulary, idf):
+        """由已計算的詞彙與 idf 建立（catalog_artifact 載入時使用）"""
+        vectorizer = cls(**params)
+        vectorizer.vocabulary_ = vocabulary
+        vectorizer.idf_ = idf
+        return vectorizer
+
+    def analyze(self, text):
+        """切出 n-gram 清單（與 scikit-learn 的 char_wb 相同）"""
+        min_n, max_n = self.ngram_range
+        ngrams = []
+        append = ngrams.append
+        for word in _WHITE_SPACES.sub(" ", text.lower()).split():
+            word = f" {word} "
+            length = len(word)
+            for n in range(min_n, max_n + 1):
+                if length <= n:
+                    # 比詞還長的 n-gram 只計一次
+                    append(word)
+                    break
+                for offset in range(length - n + 1):
+                    append(word[offset:offset + n])
+        return ngrams
+
+    def _tf(self, count):
+        return 1.0 + math.log(count) if self.sublinear_tf else float(count)
+
+    def fit_transform(self, corpus):
+        """
+        建立詞彙與 idf，回傳列正規化的文件矩陣。
+
+        Returns
+        -------
+        CsrMatrix — shape (文件數, 詞彙數)
+        """
+        counts = [Counter(self.analyze(doc)) for doc in corpus]
+        terms = sorted(set().union(*counts))
+        if self.max_features is not None and len(terms) > self.max_features:
+            totals = Counter()
+            for doc_counts in counts:
+                totals.update(doc_counts)
+            frequency = np.array([totals[term] for term in terms], dtype=np.int64)
+            keep = np.sort((-frequency).argsort()[:self.max_features])
+            terms = [terms[i] for i in keep]
+        self.vocabulary_ = {term: i for i, term in enumerate(terms)}
+
+        df = np.zeros(len(terms), dtype=np.float64)
+        for doc_counts in counts:
+            for term in doc_counts:
+                col = self.vocabulary_.get(term)
+                if col is not None:
+                    df[col] += 1
+        n_docs = len(corpus)
+        self.idf_ = np.log((1 + n_docs) / (1 + df)) + 1
+
+        data, indices, indptr = [], [], [0]
+        for doc_counts in counts:
+            row = self._weights(doc_counts)
+            for col in sorted(row):
+                indices.append(col)
+                data.append(row[col])
+            indptr.append(len(indices))
+        return CsrMatrix(np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32),
+                         np.array(indptr, dtype=np.int32), (n_docs, len(terms)))
+
+    def _weights(self, counts):
+        """n-gram 次數 → L2 正規化後的 {欄位: 權重}"""
+        row = {}
+        for term, count in counts.items():
+            col = self.vocabulary_.get(term)
+            if col is not None:
+                row[col] = self._tf(count) * float(self.idf_[col])
+        return normalize(row)
+
+    def transform(self, text):
+        """
+        單一文字的 TF-IDF 向量。
+
+        Returns
+        -------
+        dict — {欄位: 權重}，L2 正規化；沒有已知的 n-gram 時為空 dict
+        """
+        return self._weights(Counter(self.analyze(text)))
+
+
+def normalize(vector):
+    """L2 正規化 {欄位: 權重}（零向量原樣回傳）"""
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if not norm:
+        return vector
+    return {col: w / norm for col, w in vector.items()}
+
+
+def add_scaled(vector, other, scale):
+    """回傳 vector + other × scale（不修改輸入）"""
+    combined = dict(vector)
+    for col, w in other.items():
+        combined[col] = combined.get(col, 0.0) + w * scale
+    return combined
+
+
+class CsrMatrix:
+    """
+    列正規化的 CSR 文件矩陣；陣列可為唯讀的 mmap 視圖。
+
+    Attributes
+    ----------
+    data, indices, indptr : numpy.ndarray
+    shape : tuple — (文件數, 詞彙數)
+    """
+
+    def __init__(self, data, indices, indptr, shape):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = tuple(shape)
+        # 每個非零值所在的列（給 bincount 依列加總）
+        self._rows = np.repeat(np.arange(self.shape[0]), np.diff(indptr))
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def toarray(self):
+        dense = np.zeros(self.shape, dtype=np.float64)
+        dense[self._rows, self.indices] = self.data
+        return dense
+
+    def cosine(self, vector):
+        """
+        查詢向量與每一列的 cosine similarity（列已正規化，只需正規化查詢）。
+
+        Returns
+        -------
+        numpy.ndarray — shape (文件數,)
+        """
+        vector = normalize(vector)
+        if not vector:
+            return np.zeros(self.shape[0])
+        query = np.zeros(self.shape[1])
+        query[list(vector)] = list(vector.values())
+        return np.bincount(self._rows, weights=self.data * query[self.indices], minlength=self.shape[0])
@@ -0,0 +1,326 @@
+"""
+upstream.py — n8n API 上游呼叫的全域排程器
+
+所有對 api.n8n.io 的呼叫（n8n_async 的分析請求、n8n_community 的同步呼叫、
+enrichment_store 的背景確認）都交給程序內唯一的排程器：
+  1. 全域速率限制：token bucket 控制每秒送出的呼叫數，同時進行的呼叫數有上限
+  2. 優先順序：互動式詳情頁 > 分析請求的搜尋 > 背景確認 / 預熱；
+     空位永遠先給優先順序高的呼叫，背景工作只使用剩餘額度
+  3. 去重：相同 URL 已在排隊或進行中時，新的呼叫者共用同一次結果
+     （必要時提升排隊中呼叫的優先順序）；所有呼叫者都取消時才放棄該呼叫
+  4. 背壓：各優先順序的排隊數有上限，超過時 submit 拋出 UpstreamBusy；
+     estimated_wait() 供入口限流與背景工作判斷是否該退讓
+
+排程器在專屬執行緒的 event loop 中送出請求（n8n_async.fetch_json）。
+呼叫端的優先順序以 contextvar 傳遞：with priority(PRIORITY_BACKGROUND): ...
+pre-fork 模式下每個 worker 各有一個排程器，速率依 worker 數平分。
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+from core.rate_limit import TokenBucket
+
+# 優先順序（數字越小越優先）
+PRIORITY_INTERACTIVE = 0   # 使用者開啟的模板詳情
+PRIORITY_SEARCH = 1        # 分析請求的社群搜尋與詳情
+PRIORITY_BACKGROUND = 2    # 背景確認、快取預熱
+
+# 每秒送出的呼叫數與瞬間上限
+CALLS_PER_SECOND = 20.0
+CALL_BURST = 40
+# 同時進行的呼叫數上限
+MAX_IN_FLIGHT = 8
+# 各優先順序（含更高優先順序）排隊中的呼叫數上限
+MAX_QUEUED = {PRIORITY_INTERACTIVE: 50, PRIORITY_SEARCH: 200, PRIORITY_BACKGROUND: 100}
+# 單次呼叫的逾時（秒）
+CALL_TIMEOUT = 8
+
+_QUEUED, _RUNNING, _DONE = "queued", "running", "done"
+
+_priority = contextvars.ContextVar("upstream_priority", default=PRIORITY_SEARCH)
+
+
+@contextmanager
+def priority(level):
+    """在此區塊內（含其中建立的 asyncio task）發出的上游呼叫使用指定優先順序"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+class UpstreamBusy(Exception):
+    """排隊中的呼叫過多（背壓）；retry_after 為預估的等待秒數"""
+
+    def __init__(self, priority, retry_after):
+        super().__init__(f"upstream queue full (priority {priority}), retry after {retry_after:.1f}s")
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class _Call:
+    __slots__ = ("url", "priority", "waiters", "task", "state")
+
+    def __init__(self, url, priority):
+        self.url = url
+        self.priority = priority
+        self.waiters = set()
+        self.task = None
+        self.state = _QUEUED
+
+
+class UpstreamScheduler:
+    """
+    Parameters
+    ----------
+    rate : float — 每秒送出的呼叫數
+    burst : int — 瞬間可送出的呼叫數
+    max_in_flight : int — 同時進行的呼叫數
+    max_queued : dict — 優先順序 → 排隊上限
+    timeout : float — 單次呼叫逾時
+    fetch : async callable(url) -> dict, optional — 預設為 n8n_async.fetch_json
+    """
+
+    def __init__(self, rate=CALLS_PER_SECOND, burst=CALL_BURST, max_in_flight=MAX_IN_FLIGHT,
+                 max_queued=None, timeout=CALL_TIMEOUT, fetch=None):
+        self.bucket = TokenBucket(rate, burst)
+        self.rate = rate
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = {**MAX_QUEUED, **(max_queued or {})}
+        self.timeout = timeout
+        self._fetch = fetch
+        self._lock = threading.Lock()
+        self._calls = {}            # url → _Call（排隊中或進行中）
+        self._heap = []             # (priority, seq, _Call)；優先順序提升時會留下過期項目
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self.counters = {"submitted": 0, "deduped": 0, "sent": 0, "rejected": 0, "abandoned": 0}
+        self._loop = None
+        self._wakeup = None
+        self._thread = None
+        self._pid = None
+
+    # ── 呼叫端 ──
+
+    def submit(self, url, priority=None):
+        """
+        排入一次 GET 呼叫。
+
+        Returns
+        -------
+        concurrent.futures.Future — 結果為解析後的 JSON；取消此 Future 代表呼叫端不再需要結果
+
+        Raises
+        ------
+        UpstreamBusy — 此優先順序的排隊數已達上限
+        """
+        level = current_priority() if priority is None else priority
+        self._ensure_started()
+        waiter = Future()
+        with self._lock:
+            self.counters["submitted"] += 1
+            call = self._calls.get(url)
+            if call is None:
+                if self._queued_locked(level) >= self.max_queued.get(level, MAX_QUEUED[PRIORITY_BACKGROUND]):
+                    self.counters["rejected"] += 1
+                    raise UpstreamBusy(level, self._estimated_wait_locked(level))
+                call = _Call(url, level)
+                self._calls[url] = call
+                heapq.heappush(self._heap, (level, next(self._seq), call))
+            else:
+                self.counters["deduped"] += 1
+                if call.state == _QUEUED and level < call.priority:
+                    call.priority = level
+                    heapq.heappush(self._heap, (level, next(self._seq), call))
+            call.waiters.add(waiter)
+        waiter.add_done_callback(lambda f, call=call: f.cancelled() and self._abandon(call, f))
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return waiter
+
+    def fetch(self, url, priority=None, timeout=None):
+        """同步取得結果（逾時時取消並拋出 TimeoutError）"""
+        waiter = self.submit(url, priority)
+        try:
+            return waiter.result(timeout=self.timeout * 2 if timeout is None else timeout)
+        except FutureTimeout:         # 3.11 前不是內建 TimeoutError
+            waiter.cancel()
+            raise
+
+    async def fetch_async(self, url, priority=None):
+        """在任意 event loop 中等待結果；被取消時同時取消排程中的呼叫"""
+        return await asyncio.wrap_future(self.submit(url, priority))
+
+    # ── 背壓 ──
+
+    def _queued_locked(self, level):
+        return sum(1 for c in self._calls.values() if c.state == _QUEUED and c.priority <= level)
+
+    def _estimated_wait_locked(self, level):
+        return (self._queued_locked(level) + 1) / self.rate if self.rate > 0 else float("inf")
+
+    def estimated_wait(self, level=PRIORITY_SEARCH):
+        """此優先順序的新呼叫預估要排隊的秒數"""
+        with self._lock:
+            return self._estimated_wait_locked(level)
+
+    def snapshot(self):
+        with self._lock:
+            queued = {}
+            for c in self._calls.values():
+                if c.state == _QUEUED:
+                    queued[c.priority] = queued.get(c.priority, 0) + 1
+            return {"queued": queued, "in_flight": self._in_flight, **self.counters}
+
+    # ── 排程執行緒 ──
+
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            # fork 後的子程序沒有排程執行緒：重建狀態
+            self._calls.clear()
+            self._heap.clear()
+            self._in_flight = 0
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,),
+                                            name="upstream-scheduler", daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            ready.wait()
+
+    def _run_loop(self, ready):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        ready.set()
+        self._loop.run_until_complete(self._dispatch())
+
+    def _next_call(self):
+        """取得下一個可送出的呼叫（不移出佇列）；進行中的呼叫已滿時回傳 None"""
+        with self._lock:
+            while self._heap:
+                level, _, call = self._heap[0]
+                if call.state != _QUEUED or call.priority != level:
+                    heapq.heappop(self._heap)      # 已開始、已放棄或優先順序已提升
+                    continue
+                return call if self._in_flight < self.max_in_flight else None
+            return None
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            call = self._next_call()
+            if call is None:
+                await self._wakeup.wait()
+                continue
+            wait = self.bucket.wait_time(1, time.monotonic())
+            if wait:
+                # 等待 token 期間可能有更高優先順序的呼叫進來，醒來後重新挑選
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            with self._lock:
+                if call.state != _QUEUED or not self.bucket.take(1, time.monotonic()):
+                    continue
+                call.state = _RUNNING
+                self._in_flight += 1
+                self.counters["sent"] += 1
+                # 在鎖內建立 task：_abandon 看到 _RUNNING 時一定拿得到 task
+                call.task = self._loop.create_task(self._execute(call))
+
+    async def _execute(self, call):
+        result = error = None
+        try:
+            with self._lock:
+                abandoned = not call.waiters
+            if abandoned:
+                raise asyncio.CancelledError()     # 開始前所有呼叫端都已取消
+            fetch = self._fetch
+            if fetch is None:
+                from core.n8n_async import fetch_json as fetch
+            result = await asyncio.wait_for(fetch(call.url), self.timeout)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+        except Exception as e:
+            error = e
+        with self._lock:
+            self._in_flight -= 1
+            call.state = _DONE
+            if self._calls.get(call.url) is call:
+                del self._calls[call.url]
+            waiters = list(call.waiters)
+        for waiter in waiters:
+            if waiter.done():
+                continue
+            try:
+                if isinstance(error, asyncio.CancelledError):
+                    waiter.cancel()
+                elif error is not None:
+                    waiter.set_exception(error)
+                else:
+                    waiter.set_result(result)
+            except Exception:
+                pass      # 呼叫端同時取消
+        self._wakeup.set()
+
+    def _abandon(self, call, waiter):
+        """呼叫端取消；所有呼叫端都取消時放棄排隊中的呼叫或中止進行中的呼叫"""
+        with self._lock:
+            call.waiters.discard(waiter)
+            if call.waiters or call.state == _DONE:
+                return
+            self.counters["abandoned"] += 1
+            if self._calls.get(call.url) is call:
+                del self._calls[call.url]
+            if call.state == _QUEUED:
+                call.state = _DONE
+                return
+            task = call.task
+        if task is not None:
+            self._loop.call_soon_threadsafe(task.cancel)
+
+
+_default_scheduler = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler():
+    """取得程序共用的排程器"""
+    global _default_scheduler
+    if _default_scheduler is None:
+        with _default_lock:
+            if _default_scheduler is None:
+                _default_scheduler = UpstreamScheduler()
+    return _default_scheduler
+
+
+def configure(workers=1, **overrides):
+    """建立程序共用的排程器；pre-fork 時速率依 workers 平分"""
+    global _default_scheduler
+    workers = max(1, workers)
+    options = {
+        "rate": CALLS_PER_SECOND / workers,
+        "burst": max(1, CALL_BURST // workers),
+        "max_in_flight": max(1, MAX_IN_FLIGHT // workers),
+    }
+    options.update(overrides)
+    with _default_lock:
+        _default_scheduler = UpstreamScheduler(**options)
+    return _default_scheduler
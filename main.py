@@ -7,17 +7,24 @@ main.py — 通用 AI 導入顧問系統 CLI
   2. 選擇部門（可選）
   3. 描述業務痛點
   4. 產出 AI 轉型路徑圖
+
+啟動時只載入輕量的產業對應表（industry_adapter：二進位方案庫或 JSON），
+產業與部門選單、--help 都不需等待 jieba 與 TF-IDF 索引。
+分析引擎（jieba 詞典、TF-IDF 方案庫索引、社群搜尋）由 EngineLoader
+在背景執行緒載入，與用戶選擇、輸入痛點同時進行。
+啟動時間可用 tools/startup_bench.py 量測。
+
+  python main.py                                        # 互動模式
+  python main.py <產業> <部門> <痛點>                     # 非互動模式
+  python main.py --export-n8n <input.jsonl> <output>    # 批次匯出 n8n 工作流
 """
 
+import argparse
 import sys
-from core.industry_adapter import (
-    get_supported_industries,
-    get_departments,
-    compute_dimension_weights,
-    get_industry_context_text,
-)
-from core.matcher import match_tools
-from core.roadmap_generator import generate_roadmap
+import threading
+import time
+
+from core.industry_adapter import get_supported_industries, get_departments
 
 
 BANNER = r"""
@@ -31,6 +38,65 @@ BANNER = r"""
 ╚══════════════════════════════════════════════════════════════╝
 """
 
+# 背景暖機用的痛點：載入 jieba 詞典並建立 TF-IDF 索引與情境向量
+WARM_UP_QUERY = "每天手動整理客戶資料，希望自動寄送週報"
+
+
+# ── 背景載入分析引擎 ──────────────────────────────────────────
+
+class EngineLoader:
+    """
+    在背景執行緒匯入並暖機分析引擎。
+
+    Attributes
+    ----------
+    elapsed : float — 載入耗時（秒），尚未完成時為 None
+    error : BaseException — 載入失敗時的例外，wait() 會重新拋出
+    """
+
+    def __init__(self, warm_up=True):
+        self.warm_up = warm_up
+        self.elapsed = None
+        self.error = None
+        self._thread = threading.Thread(target=self._load, name="engine-loader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            import logging
+            import jieba
+            # 詞典載入訊息會穿插在選單之間
+            jieba.setLogLevel(logging.WARNING)
+
+            from core.roadmap_generator import build_local_stage
+            if self.warm_up:
+                build_local_stage(WARM_UP_QUERY, "")
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+    def wait(self, timeout=None):
+        """
+        等待載入完成。
+
+        Returns
+        -------
+        bool — 是否已完成（timeout 到期時為 False）
+        """
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+# ── 選單 ──────────────────────────────────────────────────────
 
 def select_industry():
     """讓用戶選擇產業"""
@@ -83,9 +149,76 @@ def get_pain_point():
         print("   ⚠️  描述太短，請至少輸入 4 個字。")
 
 
-def run_interactive():
-    """執行互動式流程"""
+# ── 分析與報告 ────────────────────────────────────────────────
+
+def analyze(industry, department, pain_point):
+    """
+    TF-IDF 匹配後產生路徑圖（需已載入分析引擎）。
+
+    Returns
+    -------
+    dict or None — 沒有匹配的方案時為 None
+    """
+    from core.matcher import match_solutions
+    from core.roadmap_generator import generate_roadmap
+
+    # 產業情境以快取的情境向量加權
+    matched = match_solutions(pain_point, top_n=3, context=(industry, department))
+    if not matched:
+        return None
+    return generate_roadmap(matched, industry, department, pain_point)
+
+
+def format_report(roadmap):
+    """將路徑圖轉為命令列輸出的文字報告"""
+    local = roadmap["local"]
+    workflow = local["workflow"]
+    lines = [
+        "",
+        "═" * 64,
+        f"  🗺  n8n 導入路徑圖 — {roadmap['industry']} / {roadmap['department']}",
+        "═" * 64,
+        f"\n💬 痛點：{roadmap['user_query']}",
+        f"📋 分析：{roadmap['pain_summary']}",
+        f"\n🔧 建議工作流：{workflow['name']}",
+    ]
+    if workflow.get("description"):
+        lines.append(f"   {workflow['description']}")
+    for i, node in enumerate(workflow["nodes"], 1):
+        desc = f" — {node['desc']}" if node.get("desc") else ""
+        lines.append(f"   {i}. {node['name']}（{node['type']}）{desc}")
+
+    lines.append(f"\n⭐ 困難度：{local['difficulty_display']} ({local['difficulty']}/5)")
+    lines.extend(f"   · {reason}" for reason in local["difficulty_reasons"])
+
+    lines.append("\n🗓  實施步驟：")
+    for step in local["steps"]:
+        lines.append(f"   {step['step']}. {step['title']}（{step['duration']}）")
+        if step.get("desc"):
+            lines.append(f"      {step['desc']}")
+
+    lines.append(f"\n💰 預估成本：{local['estimated_cost']}")
+
+    if local["alternatives"]:
+        lines.append("\n🔁 相似方案：")
+        for alt in local["alternatives"]:
+            lines.append(f"   · {alt['name']}（相似度 {alt['match_score']:.2f}，{alt['difficulty_display']}）")
+
+    community = roadmap.get("community") or []
+    if community:
+        lines.append("\n🌐 n8n 社群模板：")
+        for wf in community:
+            lines.append(f"   · {wf['name']}  {wf.get('url', '')}".rstrip())
+    lines.append("")
+    return "\n".join(lines)
+
+
+# ── 執行模式 ──────────────────────────────────────────────────
+
+def run_interactive(loader=None):
+    """執行互動式流程；分析引擎在用戶選擇時於背景載入"""
     print(BANNER)
+    loader = loader or EngineLoader().start()
 
     # Step 1: 選擇產業
     industry = select_industry()
@@ -103,73 +236,110 @@ def run_interactive():
 
     # ── 計算與匹配 ──────────────────────────────────────────
     print("\n⏳ 正在分析，請稍候...")
+    loader.wait()
+    roadmap = analyze(industry, department, user_query)
 
-    # 取得維度權重
-    dim_weights = compute_dimension_weights(industry, department)
-
-    # 加入產業情境文字到查詢中增強匹配
-    context = get_industry_context_text(industry, department)
-    enhanced_query = f"{user_query} {context}"
-
-    # 執行 TF-IDF 匹配
-    matched = match_tools(enhanced_query, dimension_weights=dim_weights, top_n=5)
-
-    if not matched:
+    if roadmap is None:
         print("\n❌ 很抱歉，未能找到匹配的工具。請嘗試用不同方式描述您的痛點。")
         return
 
-    # ── 產生路徑圖 ──────────────────────────────────────────
-    roadmap = generate_roadmap(
-        matched_tools=matched,
-        industry_name=industry,
-        department_name=department,
-        user_query=user_query,
-    )
-
     # 輸出報告
-    print(roadmap["full_report"])
+    print(format_report(roadmap))
 
     # ── 詢問是否匯出 ──────────────────────────────────────
     export = input("📥 是否匯出 JSON 格式的路徑圖？(y/n) ").strip().lower()
     if export == "y":
         import json
         import datetime
-        filename = f"roadmap_{industry}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        from core.n8n_export import to_n8n_workflow
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"roadmap_{industry}_{stamp}.json"
         export_data = {
             "industry": roadmap["industry"],
             "department": roadmap["department"],
             "user_query": roadmap["user_query"],
-            "difficulty": roadmap["difficulty"],
-            "primary_dimension": roadmap["primary_dimension"],
-            "top3_tools": roadmap["top3_tools"],
-            "workflow_draft": roadmap["workflow_draft"],
+            "pain_summary": roadmap["pain_summary"],
+            "local": roadmap["local"],
         }
         with open(filename, "w", encoding="utf-8") as f:
             json.dump(export_data, f, ensure_ascii=False, indent=2)
         print(f"\n   ✅ 已匯出至：{filename}")
 
+        # 可直接匯入 n8n 的工作流
+        wf_filename = f"n8n_workflow_{industry}_{stamp}.json"
+        with open(wf_filename, "w", encoding="utf-8") as f:
+            json.dump(to_n8n_workflow(roadmap["local"]["workflow"]), f, ensure_ascii=False, indent=2)
+        print(f"   ✅ n8n 工作流已匯出至：{wf_filename}（可於 n8n 中 Import from File）")
+
     print("\n👋 感謝使用 AI 導入顧問系統！祝您的 AI 轉型之路順利！")
 
 
 def run_non_interactive(industry, department, pain_point):
-    """非互動模式（供測試或批次使用）"""
-    dim_weights = compute_dimension_weights(industry, department)
-    context = get_industry_context_text(industry, department)
-    enhanced_query = f"{pain_point} {context}"
-    matched = match_tools(enhanced_query, dimension_weights=dim_weights, top_n=5)
-    roadmap = generate_roadmap(
-        matched_tools=matched,
-        industry_name=industry,
-        department_name=department,
-        user_query=pain_point,
+    """非互動模式（供測試或批次使用）；沒有匹配的方案時回傳 None"""
+    return analyze(industry, department, pain_point)
+
+
+def run_batch_export(input_path, output_path):
+    """
+    批次匯出 n8n 工作流（只使用本地引擎，不呼叫社群 API）。
+
+    input_path 為 JSONL，每行 {"industry", "department", "pain_point"}；
+    output_path 副檔名為 .tar / .tar.gz 時輸出 tar 封存，否則為單一 JSON 陣列。
+    逐行讀取、逐筆寫出，不會把全部結果留在記憶體。
+    """
+    import json
+    from core.pain_analyzer import analyze_pain_point
+    from core.dynamic_composer import compose_workflow
+    from core.n8n_export import export_workflows
+
+    def _iter_workflows():
+        with open(input_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                industry = item.get("industry", "")
+                pain_point = item.get("pain_point", "")
+                analysis = analyze_pain_point(pain_point, industry, item.get("department", ""))
+                yield compose_workflow(analysis, industry, pain_point)
+
+    return export_workflows(_iter_workflows(), output_path)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="通用 AI 導入顧問系統 CLI（不帶參數時進入互動模式）",
     )
-    return roadmap
+    parser.add_argument("query", nargs="*", metavar="產業 部門 痛點",
+                        help="非互動模式：依序給定產業、部門（「全部門」表示不指定）與痛點")
+    parser.add_argument("--export-n8n", nargs=2, metavar=("INPUT", "OUTPUT"),
+                        help="批次匯出：JSONL 輸入，輸出 .json / .tar / .tar.gz")
+    args = parser.parse_args(argv)
+    if args.query and len(args.query) != 3:
+        parser.error("非互動模式需要 3 個參數：<產業> <部門> <痛點>")
+    return args
 
 
-if __name__ == "__main__":
-    if len(sys.argv) == 4:
+def main(argv=None):
+    args = parse_args(argv)
+    if args.export_n8n:
+        # 批次匯出: python main.py --export-n8n <input.jsonl> <output.json|.tar|.tar.gz>
+        input_path, output_path = args.export_n8n
+        count = run_batch_export(input_path, output_path)
+        print(f"✅ 已匯出 {count} 個 n8n 工作流至：{output_path}")
+    elif args.query:
         # 非互動模式: python main.py <產業> <部門> <痛點>
-        roadmap = run_non_interactive(sys.argv[1], sys.argv[2], sys.argv[3])
-        print(roadmap["full_report"])
+        industry, department, pain_point = args.query
+        department = None if department in ("", "全部門") else department
+        roadmap = run_non_interactive(industry, department, pain_point)
+        if roadmap is None:
+            print("❌ 很抱歉，未能找到匹配的工具。請嘗試用不同方式描述您的痛點。")
+            return 1
+        print(format_report(roadmap))
     else:
         run_interactive()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
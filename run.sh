@@ -42,7 +42,11 @@ if [ -f "requirements.txt" ]; then
     echo -e "${GREEN}✅ Dependencies installed.${NC}"
 fi
 
-# 5. Open Browser & Start Server
+# 5. Compile catalog artifact (mmap-loaded by the server; falls back to JSON if missing)
+echo -e "${BLUE}🗂  Compiling catalog artifact...${NC}"
+python3 -m core.catalog_artifact > /dev/null || echo -e "${YELLOW}⚠️ Catalog build failed; using JSON data.${NC}"
+
+# 6. Open Browser & Start Server
 echo -e "${BLUE}🌐 Opening browser to http://localhost:8080...${NC}"
 if [[ "$OSTYPE" == "darwin"* ]]; then
     open "http://localhost:8080"
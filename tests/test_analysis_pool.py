@@ -0,0 +1,81 @@
+"""
+tests/test_analysis_pool.py — 多痛點分析執行層測試
+"""
+
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.analysis_pool import analyze_many, shutdown_pool
+from core.roadmap_generator import assemble_roadmap, build_local_stage
+
+PAIN_POINTS = ["客戶流失率太高", "每天手動做報表很花時間", "庫存常常不準"]
+
+
+class SlowClient:
+    """社群搜尋永遠不會在截止時間內完成的假客戶端"""
+
+    async def search_and_enrich(self, zh_keywords, industry="", max_results=5, analysis=None):
+        await asyncio.sleep(60)
+        return []
+
+
+class EchoClient:
+    """回傳關鍵字的假客戶端"""
+
+    async def search_and_enrich(self, zh_keywords, industry="", max_results=5, analysis=None):
+        return [{"id": kw} for kw in zh_keywords[:max_results]]
+
+
+def _expected(pp, community):
+    local = build_local_stage(pp, "零售")
+    return assemble_roadmap(local, community, "零售", None, pp)
+
+
+def test_results_match_sequential():
+    """測試平行結果與逐一執行相同，且順序與輸入一致"""
+    results = analyze_many(PAIN_POINTS, "零售", workers=0, client=EchoClient())
+    for pp, roadmap in zip(PAIN_POINTS, results):
+        analysis = build_local_stage(pp, "零售")["analysis"]
+        expected = _expected(pp, [{"id": kw} for kw in analysis["keywords"][:5]])
+        assert roadmap == expected
+    print("✅ test_results_match_sequential passed")
+
+
+def test_deadline_keeps_local_results():
+    """測試逾時時仍回傳已完成的本地結果（社群結果為空）"""
+    build_local_stage(PAIN_POINTS[0], "零售")   # 先載入 jieba 詞典
+    results = analyze_many(PAIN_POINTS[:2], "零售", workers=0, client=SlowClient(), deadline=1)
+    assert [r["community"] for r in results] == [[], []]
+    assert results[0]["local"] == _expected(PAIN_POINTS[0], [])["local"]
+    print("✅ test_deadline_keeps_local_results passed")
+
+
+def test_cancel_check():
+    """測試用戶端斷線時取消整個請求"""
+    try:
+        analyze_many(PAIN_POINTS, "零售", workers=0, client=SlowClient(),
+                     cancel_check=lambda: True)
+    except asyncio.CancelledError:
+        print("✅ test_cancel_check passed")
+        return
+    raise AssertionError("expected CancelledError")
+
+
+def test_process_pool():
+    """測試本地引擎在子程序中執行的結果與本程序相同"""
+    try:
+        results = analyze_many(PAIN_POINTS, "零售", workers=2, community=False)
+    finally:
+        shutdown_pool()
+    assert results == [_expected(pp, []) for pp in PAIN_POINTS]
+    print("✅ test_process_pool passed")
+
+
+if __name__ == "__main__":
+    test_results_match_sequential()
+    test_deadline_keeps_local_results()
+    test_cancel_check()
+    test_process_pool()
+    print("\n🎉 All analysis pool tests passed!")
@@ -0,0 +1,69 @@
+"""
+tests/test_catalog_artifact.py — mmap 二進位方案庫測試
+"""
+
+import sys
+import os
+import json
+import tempfile
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.catalog_artifact import DATA_DIR, TEMPLATES_TABLE, CatalogArtifact, build, data_fingerprint
+from core.enrichment_store import EnrichmentStore
+from core.matcher import fit_index, load_solutions
+
+
+def _build(store=None):
+    path = os.path.join(tempfile.mkdtemp(), "catalog.bin")
+    store = store or EnrichmentStore(":memory:", fetch_detail=lambda _id: None)
+    build(path, store=store)
+    return CatalogArtifact(path)
+
+
+def test_tables_match_json():
+    """測試紀錄表逐筆解碼後與原始 JSON 相同"""
+    catalog = _build()
+    assert catalog.fingerprint == data_fingerprint()
+    with open(os.path.join(DATA_DIR, "industry_mapping.json"), encoding="utf-8") as f:
+        industries = json.load(f)["industries"]
+    mapping = catalog.table("industry_mapping")
+    assert list(mapping) == list(industries)
+    assert mapping["零售"] == industries["零售"]
+    assert "不存在" not in mapping
+    assert list(catalog.table("n8n_solutions")) == load_solutions()
+    print("✅ test_tables_match_json passed")
+
+
+def test_tfidf_zero_copy():
+    """測試 TF-IDF 矩陣與重新計算相同，且陣列直接指向 mmap"""
+    catalog = _build()
+    vectorizer, matrix = fit_index(load_solutions())
+    mapped = catalog.tfidf_matrix()
+    assert mapped.shape == matrix.shape
+    assert all(np.array_equal(getattr(mapped, name), getattr(matrix, name))
+               for name in ("data", "indices", "indptr"))
+    assert not mapped.data.flags.owndata and not mapped.data.flags.writeable
+    assert catalog.vocabulary() == vectorizer.vocabulary_
+    print("✅ test_tfidf_zero_copy passed")
+
+
+def test_template_mirror_fallback():
+    """測試 SQLite 未命中時由模板鏡像讀取"""
+    source = EnrichmentStore(":memory:", fetch_detail=lambda _id: None)
+    source.put(7, "2024-01-01", {"id": 7, "name": "Churn alert", "nodes": []},
+               ["n8n-nodes-base.slack"])
+    catalog = _build(source)
+    store = EnrichmentStore(":memory:", fetch_detail=lambda _id: None,
+                            mirror=catalog.table(TEMPLATES_TABLE))
+    payload, version, _ = store.get(7)
+    assert payload["name"] == "Churn alert" and version == "2024-01-01"
+    assert list(store.iter_node_types()) == [("7", ["n8n-nodes-base.slack"])]
+    print("✅ test_template_mirror_fallback passed")
+
+
+if __name__ == "__main__":
+    test_tables_match_json()
+    test_tfidf_zero_copy()
+    test_template_mirror_fallback()
+    print("\n🎉 All catalog artifact tests passed!")
@@ -0,0 +1,79 @@
+"""
+tests/test_cli_startup.py — CLI 延遲載入與報告輸出測試
+"""
+
+import sys
+import os
+import subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import main
+from core.roadmap_generator import assemble_roadmap, build_local_stage
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENGINE_MODULES = ("jieba", "core.matcher", "core.roadmap_generator", "core.pain_analyzer")
+# 社群搜尋鏈：asyncio、上游排程與 SQLite 儲存
+COMMUNITY_MODULES = ("asyncio", "sqlite3", "core.n8n_community", "core.upstream", "core.rate_limit",
+                     "core.enrichment_store")
+HEAVY_MODULES = ENGINE_MODULES + COMMUNITY_MODULES
+PAIN_POINT = "每天手動整理客戶資料，希望自動寄送週報"
+
+
+def _loaded_after(statement):
+    """在新的直譯器執行 statement，回傳 (已載入的重量級模組, 其餘輸出)"""
+    code = (f"import sys\n{statement}\n"
+            f"print('loaded:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR,
+                            capture_output=True, text=True, check=True)
+    output, _, loaded = result.stdout.rpartition("loaded:")
+    return set(filter(None, loaded.strip().split(","))), output
+
+
+def test_menus_without_heavy_imports():
+    """測試匯入 main 與產生選單不載入分析引擎與社群搜尋鏈"""
+    statement = "import main; main.get_supported_industries(); main.get_departments('零售')"
+    assert _loaded_after(statement)[0] == set()
+    print("✅ test_menus_without_heavy_imports passed")
+
+
+def test_engine_loader():
+    """測試背景載入器完成後分析引擎已就緒"""
+    loaded, _ = _loaded_after("import main; main.EngineLoader().start().wait()")
+    assert set(ENGINE_MODULES) <= loaded
+    loader = main.EngineLoader(warm_up=False).start()
+    assert loader.wait(timeout=60) and loader.elapsed is not None and loader.error is None
+    print("✅ test_engine_loader passed")
+
+
+def test_help_is_light():
+    """測試 --help 不需載入分析引擎與社群搜尋鏈"""
+    statement = ("import runpy\nsys.argv = ['main.py', '--help']\n"
+                 "try:\n    runpy.run_path('main.py', run_name='__main__')\nexcept SystemExit:\n    pass")
+    loaded, output = _loaded_after(statement)
+    assert "--export-n8n" in output
+    assert loaded == set()
+    print("✅ test_help_is_light passed")
+
+
+def test_format_report():
+    """測試文字報告涵蓋工作流、困難度、步驟、成本與相似方案"""
+    local = build_local_stage(PAIN_POINT, "零售")
+    community = [{"name": "Weekly CRM digest", "url": "https://n8n.io/workflows/1"}]
+    roadmap = assemble_roadmap(local, community, "零售", None, PAIN_POINT)
+    report = main.format_report(roadmap)
+    assert PAIN_POINT in report and "零售 / 全部門" in report
+    assert all(node["name"] in report for node in local["workflow"]["nodes"])
+    assert roadmap["local"]["difficulty_display"] in report
+    assert all(step["title"] in report for step in local["steps"])
+    assert roadmap["local"]["estimated_cost"] in report
+    assert all(alt["name"] in report for alt in roadmap["local"]["alternatives"])
+    assert "https://n8n.io/workflows/1" in report
+    print("✅ test_format_report passed")
+
+
+if __name__ == "__main__":
+    test_menus_without_heavy_imports()
+    test_engine_loader()
+    test_help_is_light()
+    test_format_report()
+    print("\n🎉 All CLI startup tests passed!")
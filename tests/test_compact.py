@@ -0,0 +1,72 @@
+"""
+tests/test_compact.py — 精簡記憶體表示測試
+"""
+
+import sys
+import os
+import json
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.compact import CompactSolution, CompactTemplate
+from core.enrichment_store import EnrichmentStore
+from core.matcher import load_solutions
+
+
+TEMPLATE = {
+    "id": 1234,
+    "name": "客戶流失警示",
+    "description": "每日檢查客戶活動並通知業務",
+    "url": "https://n8n.io/workflows/1234",
+    "nodes": [
+        {"name": "排程觸發", "type": "n8n-nodes-base.scheduleTrigger", "desc": "每日執行"},
+        {"name": "Slack", "type": "n8n-nodes-base.slack", "desc": "通知業務"},
+    ],
+    "node_count": 2,
+    "difficulty": 2,
+    "difficulty_display": "★★☆☆☆",
+    "difficulty_reasons": ["節點數少"],
+    "steps": [{"step": 1, "title": "匯入模板", "desc": "複製 JSON", "duration": "1~2 週"}],
+    "categories": ["Sales"],
+}
+
+
+def test_solutions_round_trip():
+    """測試方案庫還原後與原始資料完全相同（含 key 順序）"""
+    for sol in load_solutions():
+        restored = CompactSolution.from_dict(sol).to_dict()
+        assert json.dumps(restored, ensure_ascii=False) == json.dumps(sol, ensure_ascii=False)
+    print("✅ test_solutions_round_trip passed")
+
+
+def test_template_interning_and_extra_keys():
+    """測試重複值共用同一字串物件，未宣告的 key 保留"""
+    data = dict(TEMPLATE, views=42)
+    a = CompactTemplate.from_dict(json.loads(json.dumps(data)))
+    b = CompactTemplate.from_dict(json.loads(json.dumps(data)))
+    assert a.nodes[0].type is b.nodes[0].type
+    assert a.steps[0].duration is b.steps[0].duration
+    assert a.categories[0] is b.categories[0]
+    assert not hasattr(a, "__dict__")
+    assert a.get("views") == 42
+    assert a.to_dict() == data
+    print("✅ test_template_interning_and_extra_keys passed")
+
+
+def test_store_memory_layer():
+    """測試記憶體層命中時回傳獨立的 dict，且依上限淘汰"""
+    store = EnrichmentStore(":memory:", fetch_detail=lambda _id: None, memory_size=1)
+    store.put(1, "v1", TEMPLATE)
+    first = store.get(1)[0]
+    first["views"] = 99
+    assert store.get(1)[0] == TEMPLATE
+    store.put(2, "v1", dict(TEMPLATE, id=2))
+    assert list(store._memory) == ["2"]
+    assert store.get(1)[0] == TEMPLATE   # 由 SQLite 讀回
+    print("✅ test_store_memory_layer passed")
+
+
+if __name__ == "__main__":
+    test_solutions_round_trip()
+    test_template_interning_and_extra_keys()
+    test_store_memory_layer()
+    print("\n🎉 All compact tests passed!")
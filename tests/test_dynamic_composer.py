@@ -0,0 +1,125 @@
+"""
+tests/test_dynamic_composer.py — 動態工作流組合測試（預編譯模板與簽章快取）
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.dynamic_composer import compose_difficulty, compose_steps, compose_workflow
+
+# (analysis, industry, pain_text, 預期節點, 預期名稱, 預期描述, 預期步驟 (title, duration))
+# 預期值由預編譯前（逐次以 str.format 組裝）的實作產生
+CASES = [
+    (
+        {"data_sources": ["CRM"], "actions": ["統計彙總"], "outputs": ["自動報表"],
+         "keywords": ["客戶", "週報"], "complexity": [], "industry_focus": ""},
+        "零售", "每天手動整理客戶資料",
+        [("排程觸發", "Schedule Trigger", "每日定時自動執行工作流"),
+         ("讀取 CRM 資料", "HTTP Request / CRM API", "從 CRM 系統取得客戶行為與交易紀錄"),
+         ("數據統計彙總", "Code Node / Aggregate", "對「客戶」數據進行統計計算與趨勢彙總"),
+         ("自動產出報表", "Google Sheets / Code Node", "將客戶分析結果自動整理成結構化報表"),
+         ("執行紀錄追蹤", "Google Sheets / Database", "記錄每次客戶分析的執行結果，方便後續追蹤與優化")],
+        "零售客戶統計彙總自動化",
+        "針對「客戶」問題，自動進行 統計彙總，並透過 自動報表 將結果即時傳達給相關人員。",
+        [("需求確認與資料盤點", "1 週"),
+         ("串接資料來源（CRM）", "1~2 週"),
+         ("建構核心邏輯（統計彙總）", "1~2 週"),
+         ("設定輸出通道（自動報表）", "1 週"),
+         ("端到端測試與微調", "1~2 週"),
+         ("正式上線與監控", "持續維護")],
+    ),
+    (
+        {"data_sources": ["IoT/感測器", "資料庫", "ERP"], "actions": ["異常偵測", "分類判斷", "預測分析"],
+         "outputs": ["LINE 通知", "Email 通知", "資料儲存"], "keywords": ["設備", "故障"],
+         "complexity": ["即時處理", "大量資料"], "industry_focus": "設備稼動"},
+        "製造", "設備故障常常來不及發現",
+        [("Webhook 觸發", "Webhook", "接收即時事件通知，立即啟動處理流程"),
+         ("感測器數據接收", "MQTT / Webhook", "接收 IoT 感測器的設備運行數據"),
+         ("查詢資料庫", "Postgres / MySQL", "查詢資料庫取得相關業務數據"),
+         ("異常偵測引擎", "Code Node / OpenAI", "自動偵測「設備稼動」中的異常模式與偏差值"),
+         ("AI 分類與判斷", "OpenAI / Code Node", "自動將「設備稼動」分類為不同等級或類別"),
+         ("條件分流", "IF / Switch Node", "根據設備稼動風險評分結果，將資料分流至不同處理路徑"),
+         ("LINE 推播通知", "HTTP Request (LINE API)", "透過 LINE 推播設備稼動分析結果給相關人員"),
+         ("Email 通知", "Send Email / Gmail", "自動發送設備稼動分析結果通知郵件給相關負責人"),
+         ("執行紀錄追蹤", "Google Sheets / Database", "記錄每次設備稼動分析的執行結果，方便後續追蹤與優化")],
+        "製造設備稼動異常偵測自動化",
+        "針對「設備稼動」問題，自動進行 異常偵測與分類判斷，並透過 LINE 通知與Email 通知 將結果即時傳達給相關人員。",
+        [("需求確認與資料盤點", "1 週"),
+         ("串接資料來源（IoT/感測器、資料庫）", "1~2 週"),
+         ("建構核心邏輯（異常偵測、分類判斷）", "2~3 週"),
+         ("設定條件分流與閾值", "1 週"),
+         ("設定輸出通道（LINE 通知、Email 通知）", "1 週"),
+         ("端到端測試與微調", "1~2 週"),
+         ("正式上線與監控", "持續維護")],
+    ),
+    (
+        {"data_sources": [], "actions": ["文字分析"], "outputs": ["自動回覆"],
+         "keywords": ["我們", "客服"], "complexity": [], "industry_focus": ""},
+        "", "客服回覆太慢",
+        [("Webhook 觸發", "Webhook", "收到客戶請求時即時啟動工作流"),
+         ("文字語意分析", "OpenAI / Code Node", "對「客服」進行語意理解、摘要或情緒分析"),
+         ("自動回覆 / Chatbot", "HTTP Request / Webhook Response", "自動產生客服分析結果回覆給客戶"),
+         ("執行紀錄追蹤", "Google Sheets / Database", "記錄每次客服分析的執行結果，方便後續追蹤與優化")],
+        "客服文字分析自動化",
+        "針對「客服」問題，自動進行 文字分析，並透過 自動回覆 將結果即時傳達給相關人員。",
+        [("需求確認與資料盤點", "1 週"),
+         ("建構核心邏輯（文字分析）", "1~2 週"),
+         ("設定輸出通道（自動回覆）", "1 週"),
+         ("端到端測試與微調", "1~2 週"),
+         ("正式上線與監控", "持續維護")],
+    ),
+]
+
+
+def _compose(analysis, industry, pain_text):
+    workflow = compose_workflow(analysis, industry, pain_text)
+    difficulty, _ = compose_difficulty(analysis, len(workflow["nodes"]))
+    return workflow, compose_steps(analysis, workflow["nodes"], difficulty)
+
+
+def test_compose_workflow_nodes():
+    """測試觸發器、資料源、處理、分流、輸出與日誌節點依簽章組裝"""
+    for analysis, industry, pain_text, nodes, name, description, _ in CASES:
+        workflow = compose_workflow(analysis, industry, pain_text)
+        assert [(n["name"], n["type"], n["desc"]) for n in workflow["nodes"]] == nodes
+        assert workflow["name"] == name
+        assert workflow["description"] == description
+    print("✅ test_compose_workflow_nodes passed")
+
+
+def test_compose_steps():
+    """測試步驟依資料源、動作、分流與輸出產生，編號連續"""
+    for analysis, industry, pain_text, _, _, _, expected in CASES:
+        _, steps = _compose(analysis, industry, pain_text)
+        assert [(s["title"], s["duration"]) for s in steps] == expected
+        assert [s["step"] for s in steps] == list(range(1, len(expected) + 1))
+    _, steps = _compose(*CASES[1][:3])
+    assert steps[0]["desc"] == ("盤點「設備稼動」相關數據的來源與格式，確認可用的 IoT/感測器、資料庫，"
+                                "並定義預期的自動化目標。")
+    print("✅ test_compose_steps passed")
+
+
+def test_cached_results_are_fresh_copies():
+    """測試重複呼叫回傳新的 dict，修改不會影響快取"""
+    analysis, industry, pain_text, nodes, name, _, expected = CASES[0]
+    workflow, steps = _compose(analysis, industry, pain_text)
+    workflow["name"] = "changed"
+    workflow["nodes"][0]["desc"] = "changed"
+    workflow["nodes"].append({"name": "extra", "type": "x", "desc": ""})
+    steps[0]["title"] = "changed"
+    steps.pop()
+
+    again, again_steps = _compose(analysis, industry, pain_text)
+    assert again is not workflow and again["nodes"][0] is not workflow["nodes"][0]
+    assert again["name"] == name
+    assert [(n["name"], n["type"], n["desc"]) for n in again["nodes"]] == nodes
+    assert [(s["title"], s["duration"]) for s in again_steps] == expected
+    print("✅ test_cached_results_are_fresh_copies passed")
+
+
+if __name__ == "__main__":
+    test_compose_workflow_nodes()
+    test_compose_steps()
+    test_cached_results_are_fresh_copies()
+    print("\n🎉 All dynamic composer tests passed!")
@@ -0,0 +1,83 @@
+"""
+tests/test_enrichment_store.py — 社群模板增強結果儲存測試
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.enrichment_store import EnrichmentStore, template_version
+
+
+def _detail(updated_at, name="Customer churn alert"):
+    return {
+        "name": name,
+        "description": "Notify the team when a customer churns",
+        "updatedAt": updated_at,
+        "workflow": {"nodes": [
+            {"type": "n8n-nodes-base.scheduleTrigger", "name": "Schedule Trigger"},
+            {"type": "n8n-nodes-base.slack", "name": "Slack"},
+        ]},
+    }
+
+
+class FakeUpstream:
+    """記錄上游呼叫次數的假 API"""
+
+    def __init__(self, detail):
+        self.detail = detail
+        self.calls = 0
+
+    def __call__(self, wf_id):
+        self.calls += 1
+        return self.detail
+
+
+def test_hit_skips_upstream():
+    """測試命中時不呼叫上游"""
+    upstream = FakeUpstream(_detail("2024-01-01"))
+    store = EnrichmentStore(":memory:", fetch_detail=upstream)
+    first = store.get_enriched(42)
+    second = store.get_enriched(42)
+    assert first == second
+    assert first["node_count"] == 2
+    assert upstream.calls == 1
+    print("✅ test_hit_skips_upstream passed")
+
+
+def test_revalidate_only_recomputes_on_change():
+    """測試背景確認只在模板版本變更時重新計算"""
+    upstream = FakeUpstream(_detail("2024-01-01"))
+    store = EnrichmentStore(":memory:", fetch_detail=upstream, revalidate_seconds=-1)
+    store.get_enriched(7)
+    store.wait_idle()
+    assert store.get(7)[1] == "2024-01-01"
+
+    # 版本不變：仍回傳原結果
+    store.get_enriched(7)
+    store.wait_idle()
+    assert store.get(7)[1] == "2024-01-01"
+
+    # 上游更新：背景重新計算
+    upstream.detail = _detail("2024-02-01", name="Customer churn report")
+    stale = store.get_enriched(7)
+    store.wait_idle()
+    payload, version, _ = store.get(7)
+    assert version == "2024-02-01"
+    assert payload["name"] != stale["name"]
+    print("✅ test_revalidate_only_recomputes_on_change passed")
+
+
+def test_version_fallback_hash():
+    """測試無 updatedAt 時以內容雜湊作為版本"""
+    detail = _detail(None)
+    assert template_version(detail).startswith("sha1:")
+    assert template_version(detail) == template_version(_detail(None))
+    print("✅ test_version_fallback_hash passed")
+
+
+if __name__ == "__main__":
+    test_hit_skips_upstream()
+    test_revalidate_only_recomputes_on_change()
+    test_version_fallback_hash()
+    print("\n🎉 All enrichment store tests passed!")
@@ -0,0 +1,98 @@
+"""
+tests/test_estimator.py — 向量化估算引擎測試
+"""
+
+import random
+import subprocess
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.dynamic_composer import compose_workflow, compose_difficulty, compose_cost, compose_steps
+from core.estimator import (
+    batch_cost,
+    estimate_portfolio,
+    features_from_analyses,
+    format_cost,
+    COMPLEXITY_FACTORS,
+)
+from core.pain_analyzer import DATA_SOURCE_MAP, ACTION_MAP, OUTPUT_MAP, COMPLEXITY_MAP
+
+
+def _random_analyses(n, seed=42):
+    rng = random.Random(seed)
+    analyses = []
+    for _ in range(n):
+        analyses.append({
+            "keywords": ["客戶", "流失"],
+            "data_sources": rng.sample(list(DATA_SOURCE_MAP), rng.randint(0, 3)),
+            "actions": rng.sample(list(ACTION_MAP), rng.randint(0, 3)),
+            "outputs": rng.sample(list(OUTPUT_MAP), rng.randint(0, 2)),
+            "complexity": rng.sample(list(COMPLEXITY_MAP), rng.randint(0, 4)),
+            "industry_focus": "",
+        })
+    return analyses
+
+
+def _week_range(duration):
+    """將「1~2 週」解析為 (1, 2)"""
+    numbers = duration.replace("週", "").strip().split("~")
+    return int(numbers[0]), int(numbers[-1])
+
+
+def test_difficulty_matches_scalar():
+    """測試向量化困難度與 compose_difficulty 一致"""
+    analyses = _random_analyses(200)
+    node_counts = [len(compose_workflow(a, "零售")["nodes"]) for a in analyses]
+    features = features_from_analyses(analyses, node_counts)
+    for i, a in enumerate(analyses):
+        expected, _ = compose_difficulty(a, node_counts[i])
+        assert features["difficulty"][i] == expected, f"Mismatch at {i}"
+    print("✅ test_difficulty_matches_scalar passed")
+
+
+def test_cost_matches_scalar():
+    """測試向量化成本與 compose_cost 的字串一致"""
+    node_counts = [n for n in range(2, 12) for _ in range(1, 6)]
+    difficulty = [d for _ in range(2, 12) for d in range(1, 6)]
+    lower, upper = batch_cost(node_counts, difficulty)
+    for i in range(len(node_counts)):
+        assert format_cost(lower[i], upper[i]) == compose_cost(node_counts[i], difficulty[i])
+    print("✅ test_cost_matches_scalar passed")
+
+
+def test_composer_without_numpy():
+    """測試單份估算（dynamic_composer）不載入 NumPy"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = ("import sys; from core.dynamic_composer import compose_cost; compose_cost(5, 3); "
+            "print('numpy' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=root,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+    print("✅ test_composer_without_numpy passed")
+
+
+def test_duration_matches_steps():
+    """測試工期加總與 compose_steps 的步驟週數一致"""
+    analyses = _random_analyses(100, seed=7)
+    node_counts = [len(compose_workflow(a)["nodes"]) for a in analyses]
+    features = features_from_analyses(analyses, node_counts)
+    result = estimate_portfolio(node_counts, features["difficulty"], features["stage_flags"])
+    for i, a in enumerate(analyses):
+        steps = compose_steps(a, [], 1)
+        ranges = [_week_range(s["duration"]) for s in steps if "週" in s["duration"] and "持續" not in s["duration"]]
+        assert result["weeks_lower"][i] == sum(r[0] for r in ranges)
+        assert result["weeks_upper"][i] == sum(r[1] for r in ranges)
+    totals = result["totals"]
+    assert totals["count"] == 100
+    assert totals["cost_lower"] <= totals["cost_upper"]
+    assert len(features["factors"][0]) == len(COMPLEXITY_FACTORS)
+    print("✅ test_duration_matches_steps passed")
+
+
+if __name__ == "__main__":
+    test_difficulty_matches_scalar()
+    test_cost_matches_scalar()
+    test_composer_without_numpy()
+    test_duration_matches_steps()
+    print("\n🎉 All estimator tests passed!")
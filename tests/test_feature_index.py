@@ -0,0 +1,95 @@
+"""
+tests/test_feature_index.py — 節點類型特徵索引測試
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.feature_index import (
+    FeatureIndex,
+    classify_node_type,
+    families_for_analysis,
+    mask_to_families,
+    FAMILY_BIT,
+)
+
+
+def _build_index():
+    index = FeatureIndex()
+    index.add(1, ["n8n-nodes-base.scheduleTrigger", "n8n-nodes-base.postgres",
+                  "n8n-nodes-base.openAi", "n8n-nodes-base.slack"])
+    index.add(2, ["n8n-nodes-base.webhook", "n8n-nodes-base.postgres"] + ["n8n-nodes-base.set"] * 10)
+    index.add(3, ["n8n-nodes-base.webhook", "@n8n/n8n-nodes-langchain.agent", "n8n-nodes-base.if"])
+    index.add(4, ["n8n-nodes-base.postgres", "@n8n/n8n-nodes-langchain.openAi"], node_count=-1)
+    return index
+
+
+def test_classify_node_type():
+    """測試節點 type 的家族分類"""
+    assert mask_to_families(classify_node_type("n8n-nodes-base.postgres")) == ["postgres"]
+    assert "ai" in mask_to_families(classify_node_type("@n8n/n8n-nodes-langchain.agent"))
+    assert classify_node_type("n8n-nodes-base.if") == FAMILY_BIT["decision"]
+    # "if" 不應以子字串命中
+    assert not classify_node_type("n8n-nodes-base.notifier") & FAMILY_BIT["decision"]
+    print("✅ test_classify_node_type passed")
+
+
+def test_structural_query():
+    """測試「Postgres + AI，少於 10 個節點」的查詢"""
+    index = _build_index()
+    hits = index.query(all_of=["postgres", "ai"], max_nodes=9)
+    # 模板 4 的節點數未知，不會被數量條件排除
+    assert hits == ["1", "4"], hits
+    assert index.query(all_of=["postgres"], none_of=["ai"]) == ["2"]
+    assert index.query(any_of=["decision", "chat"]) == ["1", "3"]
+    print("✅ test_structural_query passed")
+
+
+def test_update_replaces_bits():
+    """測試更新模板時會清除舊的家族 bit"""
+    index = _build_index()
+    index.add(1, ["n8n-nodes-base.gmail"])
+    assert "1" not in index.query(all_of=["postgres"])
+    assert index.query(all_of=["email"]) == ["1"]
+    assert index.features(1)["family_counts"] == {"email": 1}
+    print("✅ test_update_replaces_bits passed")
+
+
+def test_search_update_keeps_detail_entry():
+    """測試 search 結果（節點數未知）不覆蓋詳情建立的項目，但可更新其他 search 項目"""
+    index = _build_index()
+    before = index.features(1)
+    index.add(1, ["n8n-nodes-base.gmail"], node_count=-1)
+    assert index.features(1) == before
+    assert index.query(all_of=["postgres", "ai"]) == ["1", "4"]
+    assert index.query(all_of=["email"]) == []
+
+    index.add(4, ["n8n-nodes-base.gmail"], node_count=-1)
+    assert index.query(all_of=["email"]) == ["4"]
+    assert index.features(4)["family_counts"] == {"email": 1}
+    # 取得詳情後覆蓋 search 項目
+    index.add(4, ["n8n-nodes-base.postgres", "n8n-nodes-base.slack"])
+    assert index.query(all_of=["email"]) == []
+    assert index.features(4)["node_count"] == 2
+    print("✅ test_search_update_keeps_detail_entry passed")
+
+
+def test_analysis_overlap():
+    """測試痛點結構與模板家族的重疊分數"""
+    index = _build_index()
+    wanted = families_for_analysis({
+        "data_sources": ["資料庫"], "actions": ["預測分析"], "outputs": ["Slack 通知"],
+    })
+    assert index.overlap(1, wanted) == 3
+    assert index.overlap(3, wanted) == 1
+    print("✅ test_analysis_overlap passed")
+
+
+if __name__ == "__main__":
+    test_classify_node_type()
+    test_structural_query()
+    test_update_replaces_bits()
+    test_search_update_keeps_detail_entry()
+    test_analysis_overlap()
+    print("\n🎉 All feature index tests passed!")
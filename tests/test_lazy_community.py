@@ -0,0 +1,100 @@
+"""
+tests/test_lazy_community.py — lazy 模式社群摘要與分頁測試
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.analysis_pool import analyze_many, paginate
+from core.enrichment_store import EnrichmentStore
+from core.feature_index import FeatureIndex
+from core.n8n_async import AsyncN8nClient
+from core.pain_analyzer import analyze_pain_point
+from core.search_planner import QueryStats
+from tools.n8n_stub import start_stub
+
+PAIN_POINT = "每天手動整理客戶資料，希望自動寄送週報"
+
+
+class CandidateClient:
+    """回傳固定數量摘要的假客戶端"""
+
+    def __init__(self, count):
+        self.count = count
+
+    async def search_candidates(self, zh_keywords, industry="", analysis=None):
+        return [{"id": i, "name": f"wf{i}", "enriched": False} for i in range(self.count)]
+
+    async def search_and_enrich(self, zh_keywords, industry="", max_results=5, analysis=None):
+        raise AssertionError("lazy mode must not fetch details")
+
+
+def test_paginate():
+    """測試分頁不重疊、涵蓋所有項目，且 page_size 有上下限"""
+    items = list(range(12))
+    pages = []
+    page = 1
+    while True:
+        chunk, info = paginate(items, page, 5)
+        pages.extend(chunk)
+        if not info["has_more"]:
+            break
+        page += 1
+    assert pages == items and info == {"page": 3, "page_size": 5, "total": 12, "has_more": False}
+    assert paginate(items, 9, 5) == ([], {"page": 9, "page_size": 5, "total": 12, "has_more": False})
+    assert paginate(items, 0, 1000)[1]["page_size"] == 20
+    print("✅ test_paginate passed")
+
+
+def test_search_candidates_skips_details():
+    """測試摘要不抓詳情；已增強的模板帶上困難度，搜尋結果重用快取"""
+    server, api_base = start_stub()
+    try:
+        store = EnrichmentStore(":memory:", fetch_detail=lambda _id: None)
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = QueryStats(os.path.join(tmp, "stats.json"))
+            make_client = lambda: AsyncN8nClient(  # noqa: E731
+                api_base, store=store, index=FeatureIndex(), stats=stats,
+            )
+            analysis = analyze_pain_point(PAIN_POINT, "零售")
+            keywords = analysis["keywords"]
+
+            candidates = asyncio.run(make_client().search_candidates(keywords, "零售", analysis))
+            assert len(candidates) > 5
+            assert all(store.get(c["id"]) is None for c in candidates)
+            assert not any(c["enriched"] for c in candidates)
+            scores = [c["relevance"] for c in candidates]
+            assert scores == sorted(scores, reverse=True)
+            assert all(c["url"] == f"https://n8n.io/workflows/{c['id']}" for c in candidates)
+
+            # 完整增強後，相同候選的摘要直接帶上困難度（不需再呼叫上游）
+            enriched = asyncio.run(make_client().search_and_enrich(keywords, "零售", 5, analysis))
+            requests = server.config.requests
+            again = asyncio.run(make_client().search_candidates(keywords, "零售", analysis))
+            assert server.config.requests == requests
+            by_id = {c["id"]: c for c in again}
+            for wf in enriched:
+                summary = by_id[wf["id"]]
+                assert summary["enriched"] and summary["difficulty"] == wf["difficulty"]
+    finally:
+        server.shutdown()
+    print("✅ test_search_candidates_skips_details passed")
+
+
+def test_analyze_many_lazy():
+    """測試 lazy 模式的社群結果只有第一頁，並附上分頁資訊"""
+    roadmap, = analyze_many([PAIN_POINT], "零售", workers=0, client=CandidateClient(12),
+                            lazy=True, page_size=5)
+    assert [wf["id"] for wf in roadmap["community"]] == [0, 1, 2, 3, 4]
+    assert roadmap["community_page"] == {"page": 1, "page_size": 5, "total": 12, "has_more": True}
+    print("✅ test_analyze_many_lazy passed")
+
+
+if __name__ == "__main__":
+    test_paginate()
+    test_search_candidates_skips_details()
+    test_analyze_many_lazy()
+    print("\n🎉 All lazy community tests passed!")
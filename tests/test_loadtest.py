@@ -0,0 +1,47 @@
+"""
+tests/test_loadtest.py — 壓力測試工具測試
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from tools.loadtest import find_saturation, percentile, summarize, synthetic_traffic
+
+
+def test_synthetic_traffic():
+    """測試合成流量可重現且涵蓋三種端點"""
+    traffic = synthetic_traffic(100, seed=7)
+    assert traffic == synthetic_traffic(100, seed=7)
+    paths = {r["path"].split("?")[0] for r in traffic}
+    assert paths == {"/api/analyze", "/api/departments", "/api/community/{id}"}
+    for r in traffic:
+        if r["method"] == "POST":
+            assert r["body"]["pain_points"]
+    print("✅ test_synthetic_traffic passed")
+
+
+def test_summary_and_saturation():
+    """測試百分位數、錯誤率與飽和點判斷"""
+    assert percentile([1.0, 2.0, 3.0, 4.0, 5.0], 50) == 3.0
+    samples = [("analyze", 200, 0.1)] * 8 + [("analyze", 503, 0.2), ("departments", 0, 0.3)]
+    result = summarize(samples, 2.0, concurrency=1)
+    assert result["requests"] == 10
+    assert result["throughput"] == 5.0
+    assert abs(result["error_rate"] - 0.2) < 1e-9
+    assert result["endpoints"]["departments"]["error_rate"] == 1.0
+
+    steps = [
+        {"concurrency": 1, "throughput": 10.0, "error_rate": 0.0},
+        {"concurrency": 2, "throughput": 19.0, "error_rate": 0.0},
+        {"concurrency": 4, "throughput": 20.0, "error_rate": 0.0},
+        {"concurrency": 8, "throughput": 20.5, "error_rate": 0.1},
+    ]
+    assert find_saturation(steps) == 2
+    assert find_saturation(steps[:2]) is None
+    print("✅ test_summary_and_saturation passed")
+
+
+if __name__ == "__main__":
+    test_synthetic_traffic()
+    test_summary_and_saturation()
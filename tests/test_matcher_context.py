@@ -0,0 +1,63 @@
+"""
+tests/test_matcher_context.py — 匹配引擎產業情境向量測試
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.matcher import get_context_vector, match_solutions
+
+QUERY = "希望能自動整理資料並通知相關人員"
+
+
+def _ids(results):
+    return [r["solution"]["id"] for r in results]
+
+
+def test_context_changes_ranking():
+    """測試加入產業情境後排序偏向該產業的方案"""
+    bare = _ids(match_solutions(QUERY, top_n=5))
+    manufacturing = _ids(match_solutions(QUERY, top_n=5, context=("製造", None)))
+    assert bare[0] == "data_entry"
+    assert manufacturing[0] == "quality_inspection"
+    assert manufacturing != bare
+    retail = _ids(match_solutions(QUERY, top_n=5, context=("零售", "採購")))
+    assert retail[0] == "inventory_alert"
+    print("✅ test_context_changes_ranking passed")
+
+
+def test_zero_weight_equals_bare_query():
+    """測試 context_weight=0 或 context=None 與只查詢痛點的結果相同"""
+    bare = match_solutions(QUERY, top_n=5)
+    assert match_solutions(QUERY, top_n=5, context=None) == bare
+    assert match_solutions(QUERY, top_n=5, context=("製造", None), context_weight=0) == bare
+    # 查無情境文字的產業視同沒有情境
+    assert get_context_vector("不存在的產業") is None
+    assert match_solutions(QUERY, top_n=5, context=("不存在的產業", None)) == bare
+    print("✅ test_zero_weight_equals_bare_query passed")
+
+
+def test_context_vector_cached():
+    """測試相同 (產業, 部門) 的情境向量只建立一次，跨查詢重複使用"""
+    get_context_vector.cache_clear()
+    first = match_solutions(QUERY, top_n=3, context=("金融", "風控"))
+    vector = get_context_vector("金融", "風控")
+    for query in (QUERY, "客戶流失率太高，希望能預測哪些客戶會離開"):
+        match_solutions(query, top_n=3, context=("金融", "風控"))
+    assert match_solutions(QUERY, top_n=3, context=("金融", "風控")) == first
+    info = get_context_vector.cache_info()
+    assert info.misses == 1 and info.hits == 4
+    assert get_context_vector("金融", "風控") is vector
+    # 空字串部門與 None 共用同一個快取項目
+    match_solutions(QUERY, top_n=3, context=("金融", ""))
+    match_solutions(QUERY, top_n=3, context=("金融", None))
+    assert get_context_vector.cache_info().misses == 2
+    print("✅ test_context_vector_cached passed")
+
+
+if __name__ == "__main__":
+    test_context_changes_ranking()
+    test_zero_weight_equals_bare_query()
+    test_context_vector_cached()
+    print("\n🎉 All matcher context tests passed!")
@@ -0,0 +1,179 @@
+"""
+tests/test_n8n_community.py — 社群模板增強測試（單次節點走訪、描述截斷、翻譯）
+"""
+
+import sys
+import os
+import copy
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import core.n8n_community as n8n_community
+from core.n8n_community import (
+    DESC_DISPLAY_CHARS,
+    DESC_SCAN_CHARS,
+    DISPLAY_NODES,
+    EN_TO_ZH,
+    _clean_description,
+    _clean_markdown,
+    enrich_workflow,
+    translate_to_zh,
+)
+
+
+def _node(name, node_type, **params):
+    return {"name": name, "type": f"n8n-nodes-base.{node_type}", "parameters": params}
+
+
+# 18 個節點，其中 sticky note 與 noOp 不計入
+TEMPLATE = {
+    "id": 4242,
+    "name": "AI lead scoring with Slack alerts",
+    "description": "",
+    "categories": [{"id": 1, "name": "Sales"}],
+    "workflow": {"nodes": [
+        _node("Sticky Note", "stickyNote"),
+        _node("Schedule Trigger", "scheduleTrigger"),
+        _node("Fetch leads", "httpRequest", url="https://api.hubspot.com/crm/v3/objects/contacts"),
+        _node("Enrich company", "httpRequest", url="https://api.clearbit.com/v2/companies/find"),
+        _node("Post to webhook", "httpRequest"),
+        _node("OpenAI", "openAi"),
+        _node("Summarize", "openAi"),
+        _node("Is hot lead?", "if"),
+        _node("Route by region", "switch"),
+        _node("Save lead", "postgres"),
+        _node("Format message", "code"),
+        _node("Notify sales", "slack"),
+        _node("Email owner", "gmail"),
+        _node("Update sheet", "googleSheets"),
+        _node("Wait", "wait"),
+        _node("Merge", "merge"),
+        _node("Set fields", "set"),
+        _node("No Operation", "noOp"),
+    ]},
+}
+
+FILLER = ("This template is **battle tested** in production and works with any "
+          "[CRM](https://example.com/crm) that exposes a REST API. ")
+LONG_DESCRIPTION = (
+    "## Who is this for\n"
+    + "".join(f"Paragraph {i}: {FILLER * 3}\n\n" for i in range(40))
+    + "## How it works\n"
+    "1. **Fetch** new leads from the CRM every hour.\n"
+    "2. Enrich each company with [Clearbit](https://clearbit.com).\n"
+    "3. Score the lead with OpenAI and summarize the reasoning.\n"
+    "4. Send hot leads to Slack and email the owner.\n"
+    "## Set up steps\n"
+    "- Add your OpenAI API key and HubSpot OAuth credentials\n"
+    "1. This numbered line is outside the How it works section.\n"
+)
+# 開頭是清理後幾乎沒有文字的圖片行，第一次掃描範圍不足 200 字
+IMAGE_HEAVY_DESCRIPTION = (
+    "".join(f"![screenshot {i}](https://example.com/{'x' * 80}/{i}.png)\n" for i in range(40))
+    + FILLER * 20
+)
+
+
+def _enrich(description, nodes=None, wf_id=None):
+    detail = copy.deepcopy(TEMPLATE)
+    detail["description"] = description
+    if nodes is not None:
+        detail["workflow"]["nodes"] = detail["workflow"]["nodes"][:nodes]
+    return enrich_workflow(detail, wf_id=wf_id)
+
+
+def test_many_nodes_profile():
+    """測試超過 12 個節點：全部計入困難度，只顯示前 12 個"""
+    wf = _enrich(LONG_DESCRIPTION)
+    assert wf["node_count"] == 16
+    assert len(wf["nodes"]) == DISPLAY_NODES
+    assert [n["type"] for n in wf["nodes"][:3]] == ["Schedule Trigger", "Http Request", "Http Request"]
+    assert wf["nodes"][-1]["type"] == "Gmail"
+    assert wf["difficulty"] == 5 and wf["difficulty_display"] == "★★★★★"
+    assert wf["difficulty_reasons"] == [
+        "工作流包含 16 個節點，流程複雜度高",
+        "包含 4 個 AI 節點，需要設定 AI 模型與 Prompt",
+        "需要串接 3 個外部 API，整合複雜度較高",
+        "包含 2 個條件分流，邏輯分支多",
+        "需要設定資料庫連線，需有資料庫管理經驗",
+        "需要設定外部服務的認證憑證（API Key / OAuth）",
+    ]
+    assert wf["url"] == "https://n8n.io/workflows/4242" and wf["categories"] == ["Sales"]
+    print("✅ test_many_nodes_profile passed")
+
+
+def test_steps_from_how_it_works_section():
+    """測試只從 How it works 段落提取步驟；不足 3 步時依節點結構產生"""
+    wf = _enrich(LONG_DESCRIPTION)
+    assert [s["step"] for s in wf["steps"]] == [1, 2, 3, 4]
+    assert all(s["duration"] == "" and len(s["title"]) <= 60 for s in wf["steps"])
+    assert wf["steps"][0]["desc"] == translate_to_zh("Fetch new leads from the CRM every hour")
+    assert not any("outside" in s["desc"] for s in wf["steps"])
+
+    # 只有一個步驟、5 個節點（含 AI 與 HTTP）
+    small = _enrich("Short **intro**.\n## How it works\n1. Only one step\n", nodes=6, wf_id=7)
+    assert small["node_count"] == 5 and small["url"] == "https://n8n.io/workflows/7"
+    assert small["difficulty"] == 3
+    assert [s["duration"] for s in small["steps"]] == [
+        "10 分鐘", "30~60 分鐘", "1~2 小時", "1~3 小時", "2~4 小時", "持續",
+    ]
+    print("✅ test_steps_from_how_it_works_section passed")
+
+
+def test_description_truncation():
+    """測試只處理前段原文的描述與完整處理相同，且截斷至 200 字"""
+    for description in (LONG_DESCRIPTION, IMAGE_HEAVY_DESCRIPTION):
+        assert len(description) > DESC_SCAN_CHARS
+        clean = _clean_description(description)
+        assert clean == _clean_markdown(description)
+        assert clean.endswith("...") and len(clean) <= DESC_DISPLAY_CHARS + 3
+        assert "**" not in clean and "](" not in clean
+    assert _clean_description("Short **intro**.") == "Short intro."
+    assert _clean_description("") == ""
+    wf = _enrich(LONG_DESCRIPTION)
+    assert wf["description"] == translate_to_zh(_clean_markdown(LONG_DESCRIPTION))
+    print("✅ test_description_truncation passed")
+
+
+def test_description_scan_bounded():
+    """測試長描述只清理前段原文，不因倍增掃描而處理整份描述"""
+    scanned = []
+    strip = n8n_community._strip_markdown
+
+    def spy(text):
+        scanned.append(len(text))
+        return strip(text)
+
+    n8n_community._strip_markdown = spy
+    try:
+        huge = FILLER * 1200                          # 約 160 KB、每行都有空白的英文描述
+        huge = "\n".join(huge[i:i + 120] for i in range(0, len(huge), 120))
+        assert _clean_description(huge).endswith("...")
+        assert scanned and max(scanned) <= DESC_SCAN_CHARS
+        assert len(scanned) == 1
+
+        scanned.clear()
+        mixed = IMAGE_HEAVY_DESCRIPTION + huge       # 開頭清理後不足 200 字，需倍增一次以上
+        clean = _clean_description(mixed)
+        assert len(scanned) >= 2 and max(scanned) <= 4 * DESC_SCAN_CHARS
+        assert sum(scanned) < len(mixed) // 10
+    finally:
+        n8n_community._strip_markdown = strip
+    assert clean == _clean_markdown(mixed)
+    print("✅ test_description_scan_bounded passed")
+
+
+def test_translate_longest_phrase_first():
+    """測試翻譯先替換長片語（不被其子字串搶先替換），且不分大小寫"""
+    assert translate_to_zh("Workflow Automation") == EN_TO_ZH["workflow automation"]
+    assert translate_to_zh("AUTOMATED") == EN_TO_ZH["automated"]
+    assert translate_to_zh("") == ""
+    print("✅ test_translate_longest_phrase_first passed")
+
+
+if __name__ == "__main__":
+    test_many_nodes_profile()
+    test_steps_from_how_it_works_section()
+    test_description_truncation()
+    test_description_scan_bounded()
+    test_translate_longest_phrase_first()
+    print("\n🎉 All n8n community tests passed!")
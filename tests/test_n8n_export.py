@@ -0,0 +1,86 @@
+"""
+tests/test_n8n_export.py — n8n 工作流匯出測試
+"""
+
+import io
+import json
+import sys
+import os
+import tarfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.dynamic_composer import compose_workflow
+from core.n8n_export import to_n8n_workflow, write_json_array, write_tar
+
+
+ANALYSIS = {
+    "keywords": ["客戶", "流失"],
+    "data_sources": ["CRM", "資料庫"],
+    "actions": ["預測分析"],
+    "outputs": ["Email 通知", "LINE 通知"],
+    "complexity": [],
+    "industry_focus": "客戶",
+}
+
+
+def _workflow():
+    return compose_workflow(ANALYSIS, "零售", "客戶流失率太高")
+
+
+def test_nodes_and_connections():
+    """測試節點與連線結構可被 n8n 匯入"""
+    wf = to_n8n_workflow(_workflow())
+    names = [n["name"] for n in wf["nodes"]]
+    assert len(names) == len(set(names)), "Node names must be unique"
+    assert wf["nodes"][0]["type"] == "n8n-nodes-base.scheduleTrigger"
+    for node in wf["nodes"]:
+        assert node["id"]
+        assert len(node["position"]) == 2
+        assert isinstance(node["parameters"], dict)
+    for source, conn in wf["connections"].items():
+        assert source in names
+        for branch in conn["main"]:
+            for link in branch:
+                assert link["node"] in names
+    print("✅ test_nodes_and_connections passed")
+
+
+def test_decision_branches():
+    """測試 IF 節點同時有 true / false 兩個分支"""
+    wf = to_n8n_workflow(_workflow())
+    if_nodes = [n for n in wf["nodes"] if n["type"] == "n8n-nodes-base.if"]
+    assert len(if_nodes) == 1
+    assert len(wf["connections"][if_nodes[0]["name"]]["main"]) == 2
+    print("✅ test_decision_branches passed")
+
+
+def test_stable_ids():
+    """測試相同工作流每次匯出的節點 id 相同"""
+    ids_a = [n["id"] for n in to_n8n_workflow(_workflow())["nodes"]]
+    ids_b = [n["id"] for n in to_n8n_workflow(_workflow())["nodes"]]
+    assert ids_a == ids_b
+    print("✅ test_stable_ids passed")
+
+
+def test_streaming_writers():
+    """測試 JSON 陣列與 tar 串流寫出"""
+    buf = io.StringIO()
+    count = write_json_array((to_n8n_workflow(_workflow()) for _ in range(3)), buf)
+    assert count == 3
+    assert len(json.loads(buf.getvalue())) == 3
+
+    raw = io.BytesIO()
+    named = ((f"wf_{i}.json", to_n8n_workflow(_workflow())) for i in range(3))
+    assert write_tar(named, raw) == 3
+    raw.seek(0)
+    with tarfile.open(fileobj=raw) as tar:
+        assert len(tar.getnames()) == 3
+    print("✅ test_streaming_writers passed")
+
+
+if __name__ == "__main__":
+    test_nodes_and_connections()
+    test_decision_branches()
+    test_stable_ids()
+    test_streaming_writers()
+    print("\n🎉 All n8n export tests passed!")
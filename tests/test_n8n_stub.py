@@ -0,0 +1,137 @@
+"""
+tests/test_n8n_stub.py — 本地 n8n API 替身測試
+"""
+
+import sys
+import os
+import asyncio
+import random
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core import n8n_community
+from core.enrichment_store import EnrichmentStore
+from core.feature_index import FeatureIndex
+from core.n8n_async import AsyncN8nClient, fetch_json
+from core.search_planner import QueryStats
+from tools.n8n_stub import Fixtures, StubConfig, parse_latency, start_stub
+
+
+class _UsingStub:
+    """啟動替身並把 n8n_community.API_BASE 指向它"""
+
+    def __init__(self, config=None):
+        self.config = config
+
+    def __enter__(self):
+        self.server, self.api_base = start_stub(self.config)
+        self.original = n8n_community.API_BASE
+        n8n_community.API_BASE = self.api_base
+        return self
+
+    def __exit__(self, *exc):
+        n8n_community.API_BASE = self.original
+        self.server.shutdown()
+
+
+def test_stub_serves_n8n_api():
+    """測試替身回傳的格式可由 n8n_community 解析並增強"""
+    with _UsingStub():
+        results = n8n_community.search_workflows("customer report", rows=4)
+        assert len(results) == 4
+        assert results == n8n_community.search_workflows("customer report", rows=4)
+        detail = n8n_community.get_workflow_detail(results[0]["id"])
+        enriched = n8n_community.enrich_workflow(detail, wf_id=results[0]["id"])
+        assert enriched["steps"]
+        assert n8n_community.get_workflow_detail(999999) is None
+    print("✅ test_stub_serves_n8n_api passed")
+
+
+def test_record_and_replay_fixtures():
+    """測試錄製模式寫入 fixture，之後僅憑 fixture 重播相同回應"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fixtures.json")
+        upstream, upstream_base = start_stub()
+        try:
+            with _UsingStub(StubConfig(fixtures=Fixtures(path, record_base=upstream_base),
+                                       synthetic=False)):
+                recorded = n8n_community.search_workflows("sales crm", rows=3)
+                recorded_detail = n8n_community.get_workflow_detail(recorded[0]["id"])
+        finally:
+            upstream.shutdown()
+        assert len(recorded) == 3 and recorded_detail
+
+        with _UsingStub(StubConfig(fixtures=Fixtures(path), synthetic=False)):
+            assert n8n_community.search_workflows("sales crm", rows=3) == recorded
+            assert n8n_community.get_workflow_detail(recorded[0]["id"]) == recorded_detail
+            # 未錄製的查詢與模板：空結果 / 404
+            assert n8n_community.search_workflows("never recorded") == []
+            missing = next(i for i in range(1, 1000) if str(i) not in Fixtures(path).workflows)
+            assert n8n_community.get_workflow_detail(missing) is None
+    print("✅ test_record_and_replay_fixtures passed")
+
+
+def test_error_bursts():
+    """測試每 N 個請求中連續 M 個回傳 5xx，且錯誤率注入可重現"""
+    with _UsingStub(StubConfig(burst_every=4, burst_length=2)) as stub:
+        ok = [bool(n8n_community.search_workflows("burst")) for _ in range(8)]
+        assert ok == [False, False, True, True] * 2
+        assert stub.server.config.stats()["errors"] == 4
+
+    with _UsingStub(StubConfig(error_rate=1.0, error_statuses=(500, 502))) as stub:
+        assert n8n_community.search_workflows("anything") == []
+        assert stub.server.config.errors == stub.server.config.requests == 1
+    print("✅ test_error_bursts passed")
+
+
+def test_timeouts_and_slow_body():
+    """測試不回應（用戶端逾時）與慢速本體（內容不變、耗時變長）"""
+    store = EnrichmentStore(":memory:", fetch_detail=lambda _id: None)
+    stats = QueryStats(os.path.join(tempfile.gettempdir(), "n8n-stub-test-stats.json"))
+
+    with _UsingStub(StubConfig(timeout_rate=1.0, hang_seconds=1.0)) as stub:
+        client = AsyncN8nClient(stub.api_base, timeout=0.2, store=store, index=FeatureIndex(),
+                                stats=stats)
+        start = time.perf_counter()
+        assert asyncio.run(client.search_workflows("hang")) == []
+        assert time.perf_counter() - start < 0.9
+        assert stub.server.config.timeouts == 1
+
+    with _UsingStub() as stub:
+        fast = asyncio.run(fetch_json(f"{stub.api_base}/workflows/7"))
+    with _UsingStub(StubConfig(slow_body_rate=1.0, slow_chunk_bytes=256,
+                               slow_chunk_interval_ms=20)) as stub:
+        start = time.perf_counter()
+        slow = asyncio.run(fetch_json(f"{stub.api_base}/workflows/7"))
+        assert time.perf_counter() - start >= 0.04
+        assert stub.server.config.slow_bodies == 1
+    assert slow == fast
+    print("✅ test_timeouts_and_slow_body passed")
+
+
+def test_latency_distributions():
+    """測試延遲分佈解析"""
+    rng = random.Random(1)
+    assert parse_latency("fixed:120")(rng) == 120
+    assert parse_latency("80")(rng) == 80
+    assert all(50 <= parse_latency("uniform:50:60")(rng) <= 60 for _ in range(100))
+    samples = sorted(parse_latency("lognormal:100:0.5")(rng) for _ in range(2001))
+    assert 85 < samples[1000] < 115
+    assert min(parse_latency("normal:10:50")(rng) for _ in range(200)) == 0.0
+    mean = sum(parse_latency("exp:40")(rng) for _ in range(4000)) / 4000
+    assert 35 < mean < 45
+    try:
+        parse_latency("pareto:1")
+        assert False, "unknown distribution should raise"
+    except ValueError:
+        pass
+    print("✅ test_latency_distributions passed")
+
+
+if __name__ == "__main__":
+    test_stub_serves_n8n_api()
+    test_record_and_replay_fixtures()
+    test_error_bursts()
+    test_timeouts_and_slow_body()
+    test_latency_distributions()
@@ -0,0 +1,71 @@
+"""
+tests/test_pain_analyzer.py — 痛點文字分析器測試
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import jieba.analyse
+
+from core.pain_analyzer import (
+    ACTION_MAP,
+    DATA_SOURCE_MAP,
+    TOP_K,
+    _detect,
+    _infer_actions,
+    _scan_hints,
+    _tfidf_keywords,
+    _tokenize,
+    analyze_pain_point,
+)
+
+TEXTS = [
+    "每天都要手動從 ERP 匯出庫存報表到 Excel，再整理成週報寄給主管，希望用 LINE 通知",
+    "客戶流失率太高，不知道哪些會員要離開",
+    "online 訂單很多，客服回覆太慢",
+    "",
+]
+
+
+def test_keywords_match_extract_tags():
+    """測試共用 token 的 TF-IDF 排序與 jieba.analyse.extract_tags 相同"""
+    for text in TEXTS:
+        assert _tfidf_keywords(_tokenize(text), TOP_K) == jieba.analyse.extract_tags(text, topK=TOP_K)
+    print("✅ test_keywords_match_extract_tags passed")
+
+
+def test_scan_matches_substring_detection():
+    """測試一次掃描的結果與逐一子字串比對相同（含重疊與英文子字串）"""
+    for text in TEXTS:
+        low = text.lower()
+        found = _scan_hints(low)
+        for table in (DATA_SOURCE_MAP, ACTION_MAP):
+            expected = [c for c, kws in table.items() if any(kw in low for kw in kws)]
+            assert _detect(found, table) == expected
+    # "line" 是 "online" 的子字串，與原本的 `kw in text` 行為一致
+    assert "社群媒體" in _detect(_scan_hints("online"), DATA_SOURCE_MAP)
+    print("✅ test_scan_matches_substring_detection passed")
+
+
+def test_infer_actions_on_keywords():
+    """測試動作推斷只在單一關鍵字內比對，不會跨關鍵字拼接"""
+    assert _infer_actions(["客戶流失", "報表"]) == ["預測分析", "統計彙總"]
+    assert _infer_actions(["分", "類"]) == ["統計彙總"]
+    print("✅ test_infer_actions_on_keywords passed")
+
+
+def test_analysis_returns_fresh_lists():
+    """測試推斷的預設值不會被呼叫端修改而影響下次結果"""
+    first = analyze_pain_point("想改善", "零售")
+    first["data_sources"].append("X")
+    assert "X" not in analyze_pain_point("想改善", "零售")["data_sources"]
+    print("✅ test_analysis_returns_fresh_lists passed")
+
+
+if __name__ == "__main__":
+    test_keywords_match_extract_tags()
+    test_scan_matches_substring_detection()
+    test_infer_actions_on_keywords()
+    test_analysis_returns_fresh_lists()
+    print("\n🎉 All pain analyzer tests passed!")
@@ -0,0 +1,132 @@
+"""
+tests/test_prefetch.py — 社群模板預熱測試
+"""
+
+import sys
+import os
+import asyncio
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import fcntl
+
+from core.enrichment_store import EnrichmentStore
+from core.feature_index import FeatureIndex
+from core.n8n_async import AsyncN8nClient
+from core.pain_analyzer import analyze_pain_point
+from core.prefetch import Prefetcher, scenarios
+from core.search_planner import QueryStats
+from core.upstream import PRIORITY_BACKGROUND, current_priority
+from tools.n8n_stub import start_stub
+
+MAPPING = {
+    "零售": {"departments": {
+        "店務管理": {"typical_pain_points": ["排班效率低", "庫存盤點耗時"]},
+        "採購": {"typical_pain_points": ["庫存盤點耗時", "補貨效率低"]},
+    }},
+    "金融": {"departments": {"客服": {"typical_pain_points": ["客訴處理慢"]}}},
+}
+
+
+class IdleScheduler:
+    def __init__(self, wait=0.0):
+        self.wait = wait
+
+    def estimated_wait(self, level):
+        return self.wait
+
+
+class RecordingClient:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def search_and_enrich(self, zh_keywords, industry="", max_results=5, analysis=None,
+                                early_stop=True):
+        assert not early_stop
+        self.calls.append((industry, tuple(zh_keywords), current_priority()))
+        return []
+
+
+def test_scenarios_dedupe():
+    """測試同一產業的相同痛點只預熱一次"""
+    items = scenarios(MAPPING)
+    assert [(i, p) for i, _, p in items] == [
+        ("零售", "排班效率低"), ("零售", "庫存盤點耗時"), ("零售", "補貨效率低"), ("金融", "客訴處理慢"),
+    ]
+    assert len(scenarios()) > 0
+    print("✅ test_scenarios_dedupe passed")
+
+
+def test_run_once_uses_background_priority():
+    """測試預熱使用與分析請求相同的關鍵字，並以背景優先順序送出"""
+    calls = []
+    prefetcher = Prefetcher(client_factory=lambda: RecordingClient(calls), scheduler=IdleScheduler())
+    summary = prefetcher.run_once(scenarios(MAPPING))
+    assert summary["warmed"] == 4 and summary["failed"] == 0
+    assert calls[0] == ("零售", tuple(analyze_pain_point("排班效率低", "零售", "店務管理")["keywords"]),
+                        PRIORITY_BACKGROUND)
+    assert all(priority == PRIORITY_BACKGROUND for _, _, priority in calls)
+
+    # 上游忙碌且被要求停止時不再送出
+    calls.clear()
+    busy = Prefetcher(client_factory=lambda: RecordingClient(calls), scheduler=IdleScheduler(60))
+    busy.stop()
+    assert busy.run_once(scenarios(MAPPING))["warmed"] == 0
+    assert calls == []
+    print("✅ test_run_once_uses_background_priority passed")
+
+
+def test_run_if_due_coordinates_processes():
+    """測試檔案鎖與上次完成時間：同時只有一個程序預熱，週期內不重跑"""
+    with tempfile.TemporaryDirectory() as tmp:
+        calls = []
+        make = lambda: Prefetcher(  # noqa: E731
+            client_factory=lambda: RecordingClient(calls), scheduler=IdleScheduler(),
+            interval=3600, state_path=os.path.join(tmp, "state.json"),
+            lock_path=os.path.join(tmp, "prefetch.lock"),
+        )
+        with open(os.path.join(tmp, "prefetch.lock"), "a") as held:
+            fcntl.flock(held, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            assert make().run_if_due() is None
+            fcntl.flock(held, fcntl.LOCK_UN)
+        assert calls == []
+
+        first = make()
+        first.run_once = lambda items=None: {"scenarios": 1, "warmed": 1, "failed": 0, "elapsed": 0}
+        assert first.run_if_due()["warmed"] == 1
+        assert make().last_run() > 0
+        assert make().run_if_due() is None     # 週期內不重跑
+    print("✅ test_run_if_due_coordinates_processes passed")
+
+
+def test_prefetch_warms_caches():
+    """測試預熱後，相同情境的分析請求不再呼叫上游"""
+    server, api_base = start_stub()
+    try:
+        store = EnrichmentStore(":memory:", fetch_detail=lambda _id: None)
+        index = FeatureIndex()
+        with tempfile.TemporaryDirectory() as tmp:
+            stats = QueryStats(os.path.join(tmp, "stats.json"))
+            make_client = lambda: AsyncN8nClient(api_base, store=store, index=index, stats=stats)  # noqa: E731
+            items = scenarios(MAPPING)[:2]
+            Prefetcher(client_factory=make_client, scheduler=IdleScheduler()).run_once(items)
+            warmed_requests = server.config.requests
+            assert warmed_requests > 0
+
+            industry, department, pain = items[0]
+            analysis = analyze_pain_point(pain, industry, department)
+            results = asyncio.run(make_client().search_and_enrich(
+                analysis["keywords"], industry, 5, analysis,
+            ))
+            assert results
+            assert server.config.requests == warmed_requests
+    finally:
+        server.shutdown()
+    print("✅ test_prefetch_warms_caches passed")
+
+
+if __name__ == "__main__":
+    test_scenarios_dedupe()
+    test_run_once_uses_background_priority()
+    test_run_if_due_coordinates_processes()
+    test_prefetch_warms_caches()
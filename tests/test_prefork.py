@@ -0,0 +1,92 @@
+"""
+tests/test_prefork.py — pre-fork 多程序伺服器測試
+"""
+
+import sys
+import os
+import signal
+import subprocess
+import time
+import urllib.request
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.prefork import _exit_code, supports_prefork
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 回傳 worker pid 的最小伺服器
+SERVER = """
+import os, sys
+sys.path.insert(0, {root!r})
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from core.prefork import PreforkServer
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = str(os.getpid()).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+server = HTTPServer(("127.0.0.1", 0), Handler)
+print(server.server_address[1], flush=True)
+PreforkServer(server, workers=2, max_requests=3).serve_forever()
+"""
+
+
+def _get(port):
+    for _ in range(50):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as resp:
+                return int(resp.read())
+        except OSError:
+            time.sleep(0.1)
+    raise AssertionError("server did not respond")
+
+
+def test_workers_share_socket_and_recycle():
+    """測試多個 worker 共用 socket，處理上限後由新 worker 取代，SIGTERM 後全部結束"""
+    if not supports_prefork():
+        return
+    proc = subprocess.Popen([sys.executable, "-c", SERVER.format(root=ROOT)],
+                            stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(proc.stdout.readline())
+        pids = [_get(port) for _ in range(12)]
+        # 2 個 worker、每個最多 3 個請求 → 12 個請求至少由 4 個程序處理
+        assert len(set(pids)) >= 4
+        assert proc.pid not in pids
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=15) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+    print("✅ test_workers_share_socket_and_recycle passed")
+
+
+def test_exit_code():
+    """測試 waitpid 狀態轉換：正常結束為結束碼，被訊號終止為負的訊號編號"""
+    if not supports_prefork():
+        return
+    for code in (0, 3):
+        pid = os.fork()
+        if pid == 0:
+            os._exit(code)
+        assert _exit_code(os.waitpid(pid, 0)[1]) == code
+    pid = os.fork()
+    if pid == 0:
+        time.sleep(10)
+        os._exit(0)
+    os.kill(pid, signal.SIGKILL)
+    assert _exit_code(os.waitpid(pid, 0)[1]) == -signal.SIGKILL
+    print("✅ test_exit_code passed")
+
+
+if __name__ == "__main__":
+    test_workers_share_socket_and_recycle()
+    test_exit_code()
+    print("\n🎉 All prefork tests passed!")
@@ -0,0 +1,137 @@
+"""
+tests/test_profiling.py — 請求剖析與全伺服器取樣測試
+"""
+
+import sys
+import os
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core import profiling
+from core.analysis_pool import analyze_many
+
+PAIN_POINTS = ["客戶流失率太高", "每天手動做報表很花時間"]
+
+
+def test_requested_mode():
+    """測試由查詢字串或標頭取得剖析模式"""
+    assert profiling.requested_mode({}, {}) is None
+    assert profiling.requested_mode({"profile": ["1"]}, {}) == "sample"
+    assert profiling.requested_mode({"profile": ["0"]}, {"X-Profile": "cprofile"}) is None
+    assert profiling.requested_mode({}, {"X-Profile": "CProfile"}) == "cprofile"
+    assert profiling.requested_mode({"profile": ["perf"]}, {}) == "perf"
+    print("✅ test_requested_mode passed")
+
+
+def test_stages_of():
+    """測試堆疊依模組歸屬階段（巢狀時皆計入）"""
+    stack = ("threading:run", "core.roadmap_generator:build_local_stage",
+             "core.pain_analyzer:analyze_pain_point", "jieba:cut", "core.matcher:match_solutions")
+    assert profiling.stages_of(stack) == ["pain_analyzer", "matcher"]
+    assert profiling.stages_of(("threading:run",)) == []
+    print("✅ test_stages_of passed")
+
+
+def _uncached(pain_points, count=10):
+    # 每次不同的文字，避免 lru_cache 讓本地引擎快到取樣不到
+    return [f"{pp}（第 {i} 分店）" for pp in pain_points for i in range(count)]
+
+
+def _profile(mode):
+    with tempfile.TemporaryDirectory() as tmp:
+        with profiling.profile_request(mode, interval=0.001) as profile:
+            assert profiling.current() is profile
+            results = analyze_many(_uncached(PAIN_POINTS), "零售", workers=0, community=False)
+        assert profiling.current() is None
+        assert all(results)
+        path = profile.save("req", out_dir=tmp)
+        assert os.path.getsize(path) > 0
+        with open(path, "rb") as f:
+            content = f.read()
+    return profile.report(), content
+
+
+def test_sample_request_profile():
+    """測試取樣剖析涵蓋執行本地引擎的執行緒，並輸出 collapsed stacks"""
+    report, folded = _profile("sample")
+    assert report["mode"] == "sample" and report["samples"] > 0
+    assert report["stages"] and set(report["stages"]) <= set(profiling.STAGE_MODULES.values())
+    line = folded.decode("utf-8").splitlines()[0]
+    stack, count = line.rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+    print("✅ test_sample_request_profile passed")
+
+
+def test_cprofile_request_profile():
+    """測試 cProfile 合併各執行緒的結果並依階段歸屬"""
+    report, _ = _profile("cprofile")
+    assert report["mode"] == "cprofile" and report["top_functions"]
+    assert {"pain_analyzer", "matcher", "dynamic_composer"} <= set(report["stages"])
+    assert report["stages"]["pain_analyzer"] <= report["duration_ms"] * 20
+    print("✅ test_cprofile_request_profile passed")
+
+
+def test_server_sampler():
+    """測試全伺服器取樣寫出週期檔案並只保留最新幾個"""
+    with tempfile.TemporaryDirectory() as tmp:
+        sampler = profiling.ServerSampler(period=3600, interval=0.001, out_dir=tmp, max_files=1)
+        sampler.profiler.start()
+        try:
+            analyze_many(_uncached(PAIN_POINTS[:1]), "零售", workers=0, community=False)
+            first = sampler.flush()
+            assert first and os.path.getsize(first) > 0
+            analyze_many(_uncached(PAIN_POINTS[1:]), "零售", workers=0, community=False)
+            second = sampler.flush()
+        finally:
+            sampler.stop()
+        assert os.listdir(tmp) == [os.path.basename(second)]
+    print("✅ test_server_sampler passed")
+
+
+def _touch(directory, name, age):
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("a;b 1\n")
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_prune_across_workers():
+    """測試已結束 worker 的 server 檔案與單一請求的剖析檔都只保留最新幾個"""
+    with tempfile.TemporaryDirectory() as tmp:
+        # 已汰換的 worker（pid 不同）留下的檔案，由舊到新
+        for i in range(5):
+            _touch(tmp, f"server-1-20240101-00000{i}-{i:06d}.folded", age=100 - i)
+        for i in range(4):
+            _touch(tmp, f"req-{i}.prof", age=100 - i)
+        _touch(tmp, "notes.txt", age=1000)
+
+        sampler = profiling.ServerSampler(period=3600, interval=0.001, out_dir=tmp, max_files=2)
+        sampler.profiler.start()
+        try:
+            analyze_many(_uncached(PAIN_POINTS[:1]), "零售", workers=0, community=False)
+            path = sampler.flush()
+        finally:
+            sampler.stop()
+        server_files = sorted(f for f in os.listdir(tmp) if f.startswith("server-"))
+        assert server_files == sorted(["server-1-20240101-000004-000004.folded", os.path.basename(path)])
+        assert len([f for f in os.listdir(tmp) if f.startswith("req-")]) == 4
+
+        with profiling.profile_request("cprofile") as profile:
+            sum(range(1000))
+        saved = profile.save("req-new", out_dir=tmp, max_files=2)
+        assert sorted(f for f in os.listdir(tmp) if f.startswith("req-")) == \
+            ["req-3.prof", os.path.basename(saved)]
+        assert "notes.txt" in os.listdir(tmp) and len(server_files) == 2
+    print("✅ test_prune_across_workers passed")
+
+
+if __name__ == "__main__":
+    test_requested_mode()
+    test_stages_of()
+    test_sample_request_profile()
+    test_cprofile_request_profile()
+    test_server_sampler()
+    test_prune_across_workers()
+    print("\n🎉 All profiling tests passed!")
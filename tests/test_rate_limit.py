@@ -0,0 +1,197 @@
+"""
+tests/test_rate_limit.py — 限流與公平排隊測試
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.rate_limit import FairQueue, RateLimited, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket():
+    """測試 token bucket 的扣除、補充與等待時間"""
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2.0, capacity=4, clock=clock)
+    assert bucket.take(4, clock.now)
+    assert not bucket.take(1, clock.now)
+    assert bucket.wait_time(1, clock.now) == 0.5
+    clock.now += 1.0
+    assert bucket.available(clock.now) == 2.0
+    clock.now += 100
+    assert bucket.available(clock.now) == 4
+    print("✅ test_token_bucket passed")
+
+
+def test_per_client_buckets():
+    """測試每個 IP 各自計數，且痛點不足時不扣除請求 token"""
+    clock = FakeClock()
+    limiter = RateLimiter(requests_per_minute=60, request_burst=3,
+                          units_per_minute=60, unit_burst=5, clock=clock)
+    limiter.admit("a", units=4)
+    try:
+        limiter.admit("a", units=4)
+        assert False, "unit bucket should be exhausted"
+    except RateLimited as e:
+        assert e.scope == "pain_points"
+        assert abs(e.retry_after - 3.0) < 1e-9
+        assert e.retry_after_header == "3"
+        assert e.to_dict()["code"] == "rate_limited"
+    # 上一次被拒絕沒有扣除請求 token：還可以再送 2 個
+    limiter.admit("a")
+    limiter.admit("a")
+    try:
+        limiter.admit("a")
+        assert False, "request bucket should be exhausted"
+    except RateLimited as e:
+        assert e.scope == "requests"
+    # 其他用戶端不受影響
+    limiter.admit("b", units=5)
+    clock.now += 1.0
+    limiter.admit("a")
+    print("✅ test_per_client_buckets passed")
+
+
+class FakeScheduler:
+    def __init__(self, wait):
+        self.wait = wait
+
+    def estimated_wait(self, level):
+        return self.wait
+
+
+def test_upstream_backpressure():
+    """測試上游排程器排隊過長時拒絕需要上游呼叫的請求"""
+    clock = FakeClock()
+    scheduler = FakeScheduler(25.0)
+    limiter = RateLimiter(max_upstream_wait=10.0, scheduler=scheduler, clock=clock)
+    try:
+        limiter.admit("a", units=1, upstream=True)
+        assert False, "upstream queue should be too long"
+    except RateLimited as e:
+        assert e.scope == "upstream" and e.retry_after == 15.0
+    limiter.admit("a")   # 不需上游的請求不受影響
+    scheduler.wait = 2.0
+    limiter.admit("a", units=1, upstream=True)
+    print("✅ test_upstream_backpressure passed")
+
+
+def test_fair_queue_interleaves_clients():
+    """測試重度用戶端排隊時，後到的輕度用戶端優先取得空位"""
+    queue = FairQueue(max_active=1, max_queued_per_client=10, timeout=5)
+    order = []
+    gate = threading.Event()
+
+    def run(client, cost):
+        with queue.slot(client, cost):
+            order.append(client)
+            gate.wait()
+
+    holder = threading.Thread(target=run, args=("heavy", 5))
+    holder.start()
+    while queue.snapshot()["active"] == 0:
+        time.sleep(0.01)
+    threads = []
+    for client in ["heavy", "heavy", "heavy", "light", "light"]:
+        t = threading.Thread(target=run, args=(client, 5 if client == "heavy" else 1))
+        t.start()
+        threads.append(t)
+        time.sleep(0.02)
+    assert queue.snapshot()["queued"] == 5
+    gate.set()
+    for t in [holder] + threads:
+        t.join()
+    # 輕度用戶端的兩個請求排在重度用戶端其餘請求之前
+    assert order[:3] == ["heavy", "light", "light"], order
+    print("✅ test_fair_queue_interleaves_clients passed")
+
+
+def test_fair_queue_limits():
+    """測試每個用戶端的排隊上限與等待逾時"""
+    queue = FairQueue(max_active=1, max_queued_per_client=1, timeout=0.2)
+    release = threading.Event()
+    errors = []
+
+    def hold():
+        with queue.slot("a"):
+            release.wait()
+
+    def wait_slot(client):
+        try:
+            with queue.slot(client):
+                pass
+        except RateLimited as e:
+            errors.append((client, e.scope))
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    while queue.snapshot()["active"] == 0:
+        time.sleep(0.01)
+    waiter = threading.Thread(target=wait_slot, args=("b",))
+    waiter.start()
+    time.sleep(0.05)
+    wait_slot("b")            # 排隊數已達上限，立即拒絕
+    waiter.join()             # 等待逾時
+    assert errors == [("b", "queue"), ("b", "queue")]
+    assert queue.snapshot() == {"active": 1, "queued": 0}
+    release.set()
+    holder.join()
+    with queue.slot("b"):
+        pass
+    print("✅ test_fair_queue_limits passed")
+
+
+def test_fair_queue_timeout_not_charged():
+    """測試逾時未執行的請求不會讓該用戶端之後的請求排到後面"""
+    queue = FairQueue(max_active=1, max_queued_per_client=10, timeout=0.1)
+    release = threading.Event()
+    order = []
+
+    def hold():
+        with queue.slot("holder"):
+            release.wait()
+
+    def run(client, cost=1):
+        try:
+            with queue.slot(client, cost):
+                order.append(client)
+        except RateLimited:
+            order.append(f"{client}:timeout")
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    while queue.snapshot()["active"] == 0:
+        time.sleep(0.01)
+    run("heavy", cost=50)                 # 排隊逾時，從未執行
+    queue.timeout = 5
+    threads = []
+    for client in ("heavy", "light"):
+        t = threading.Thread(target=run, args=(client,))
+        t.start()
+        threads.append(t)
+        while queue.snapshot()["queued"] < len(threads):
+            time.sleep(0.01)
+    release.set()
+    for t in [holder] + threads:
+        t.join()
+    assert order == ["heavy:timeout", "heavy", "light"], order
+    print("✅ test_fair_queue_timeout_not_charged passed")
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_per_client_buckets()
+    test_upstream_backpressure()
+    test_fair_queue_interleaves_clients()
+    test_fair_queue_limits()
+    test_fair_queue_timeout_not_charged()
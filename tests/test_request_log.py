@@ -0,0 +1,119 @@
+"""
+tests/test_request_log.py — 結構化請求日誌測試
+"""
+
+import sys
+import os
+import io
+import json
+import asyncio
+import logging
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core import request_log
+from core.n8n_async import UpstreamError
+
+
+def _configure(sample_rate=0.0, slow_ms=1000):
+    stream = io.StringIO()
+    handler = request_log.configure(sample_rate=sample_rate, slow_ms=slow_ms, stream=stream)
+    return handler, stream
+
+
+def _records(handler, stream):
+    handler.stop()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def _reset():
+    root = logging.getLogger()
+    root.removeHandler(request_log._handler)
+    request_log._handler = None
+    root.setLevel(logging.WARNING)
+
+
+def test_sampling_keeps_slow_and_failed():
+    """測試取樣率為 0 時只寫出失敗或慢的請求"""
+    handler, stream = _configure(sample_rate=0.0, slow_ms=1000)
+    try:
+        request, token = request_log.begin("GET", "/api/industries")
+        assert not request_log.finish(request, token, 200)
+
+        request, token = request_log.begin("POST", "/api/analyze")
+        assert request_log.finish(request, token, 429)
+
+        request, token = request_log.begin("POST", "/api/analyze")
+        request.start -= 2.0          # 模擬 2 秒的請求
+        assert request_log.finish(request, token, 200)
+
+        records = _records(handler, stream)
+    finally:
+        _reset()
+    assert [(r["status"], r["level"]) for r in records] == [(429, "WARNING"), (200, "WARNING")]
+    assert records[1]["duration_ms"] >= 2000
+    assert all(r["logger"] == "n8n_consultant.access" for r in records)
+    print("✅ test_sampling_keeps_slow_and_failed passed")
+
+
+def test_stages_and_upstream_across_tasks():
+    """測試 asyncio task 中的階段耗時與上游狀態碼累計到同一個請求"""
+    handler, stream = _configure(sample_rate=1.0)
+
+    async def _call(fail):
+        with request_log.stage("community"):
+            try:
+                with request_log.upstream_call():
+                    if fail:
+                        raise UpstreamError(503, "http://stub/api")
+            except UpstreamError:
+                pass
+
+    async def _all():
+        await asyncio.gather(*(_call(fail) for fail in (False, False, True)))
+
+    try:
+        request, token = request_log.begin("POST", "/api/analyze", request_id="abc", client="10.0.0.1")
+        request_log.annotate(pain_points=3)
+        asyncio.run(_all())
+        with request_log.stage("respond"):
+            pass
+        assert request_log.finish(request, token, 200)
+        assert request_log.current() is None
+        record, = _records(handler, stream)
+    finally:
+        _reset()
+    assert record["request_id"] == "abc" and record["client"] == "10.0.0.1"
+    assert record["pain_points"] == 3
+    assert set(record["stages"]) == {"community", "respond"}
+    assert record["upstream"]["calls"] == 3
+    assert record["upstream"]["statuses"] == {"200": 2, "503": 1}
+    print("✅ test_stages_and_upstream_across_tasks passed")
+
+
+def test_module_errors_are_json():
+    """測試模組的錯誤記錄（含例外）以 JSON 寫出；佇列已滿時丟棄而不阻塞"""
+    handler, stream = _configure()
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.getLogger("core.n8n_async").exception("Search error for %r", "crm")
+        record, = _records(handler, stream)
+
+        full = request_log.AsyncQueueHandler(logging.NullHandler(), maxsize=1)
+        full.listener.stop()
+        for _ in range(3):
+            full.enqueue(logging.makeLogRecord({"msg": "x"}))
+        assert full.dropped == 2
+    finally:
+        _reset()
+    assert record["msg"] == "Search error for 'crm'"
+    assert record["level"] == "ERROR" and "ValueError: boom" in record["exc"]
+    print("✅ test_module_errors_are_json passed")
+
+
+if __name__ == "__main__":
+    test_sampling_keeps_slow_and_failed()
+    test_stages_and_upstream_across_tasks()
+    test_module_errors_are_json()
+    print("\n🎉 All request log tests passed!")
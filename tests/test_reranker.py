@@ -0,0 +1,53 @@
+"""
+tests/test_reranker.py — 社群候選重排序測試
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.feature_index import FeatureIndex, families_for_analysis
+from core.reranker import rerank, select_for_detail
+
+
+CANDIDATES = [
+    {"id": 1, "name": "Post tweets from RSS feed", "totalViews": 90000},
+    {"id": 2, "name": "Predict customer churn and alert on Slack", "totalViews": 800},
+    {"id": 3, "name": "Customer support chatbot", "totalViews": 5000},
+    {"id": 4, "name": "Sync Postgres rows to Google Sheets", "totalViews": 300},
+]
+
+
+def test_lexical_beats_raw_views():
+    """測試相關的模板排在熱門但無關的模板之前"""
+    ranked = rerank(CANDIDATES, "customer churn retention prediction forecast")
+    assert ranked[0][1]["id"] == 2
+    assert ranked[-1][1]["id"] in (1, 4)
+    print("✅ test_lexical_beats_raw_views passed")
+
+
+def test_structure_signal():
+    """測試節點結構重疊會提高分數"""
+    index = FeatureIndex()
+    index.add(4, ["n8n-nodes-base.postgres", "n8n-nodes-base.googleSheets"])
+    wanted = families_for_analysis({"data_sources": ["資料庫"], "outputs": ["Google Sheets"]})
+    without = {wf["id"]: s for s, wf, _ in rerank(CANDIDATES, "report", 0, index)}
+    with_structure = {wf["id"]: s for s, wf, _ in rerank(CANDIDATES, "report", wanted, index)}
+    assert with_structure[4] > without[4]
+    print("✅ test_structure_signal passed")
+
+
+def test_select_for_detail():
+    """測試低分候選不抓詳情，但至少保留 3 個"""
+    ranked = [(0.9, {"id": 1}, {}), (0.5, {"id": 2}, {}), (0.05, {"id": 3}, {}),
+              (0.04, {"id": 4}, {}), (0.01, {"id": 5}, {})]
+    assert [wf["id"] for _, wf, _ in select_for_detail(ranked, 5)] == [1, 2, 3]
+    assert [wf["id"] for _, wf, _ in select_for_detail(ranked, 5, min_results=0)] == [1, 2]
+    print("✅ test_select_for_detail passed")
+
+
+if __name__ == "__main__":
+    test_lexical_beats_raw_views()
+    test_structure_signal()
+    test_select_for_detail()
+    print("\n🎉 All reranker tests passed!")
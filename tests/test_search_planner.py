@@ -0,0 +1,153 @@
+"""
+tests/test_search_planner.py — 社群搜尋查詢規劃測試
+"""
+
+import sys
+import os
+import asyncio
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.enrichment_store import EnrichmentStore
+from core.feature_index import FeatureIndex
+from core.n8n_async import FIRST_WAVE, AsyncN8nClient
+from core.search_planner import EXPLORE_EVERY, MIN_SAMPLES, MIN_YIELD_RATE, QueryStats, plan_queries
+
+
+class FakeClient(AsyncN8nClient):
+    """依查詢字串回傳固定結果的假客戶端，記錄實際完成的查詢"""
+
+    def __init__(self, responses, delays, stats):
+        super().__init__(store=EnrichmentStore(":memory:", fetch_detail=lambda _id: None),
+                         index=FeatureIndex(), stats=stats)
+        self.responses = responses
+        self.delays = delays
+        self.started = []
+        self.completed = []
+
+    async def search_workflows(self, query, rows=8):
+        self.started.append(query)
+        await asyncio.sleep(self.delays.get(query, 0))
+        self.completed.append(query)
+        return self.responses.get(query, [])
+
+    async def get_workflow_detail(self, workflow_id):
+        return None
+
+
+def test_plan_dedupes_queries():
+    """測試候選查詢一次產生並去重"""
+    plans = plan_queries(["客服", "預測"], "零售")
+    queries = [q for _, q in plans]
+    assert len(queries) == len(set(queries))
+    assert plans[0][0] == "full"
+    assert "retail ecommerce workflow automation" in queries
+    assert "customer service support" in queries
+    print("✅ test_plan_dedupes_queries passed")
+
+
+def test_stats_skip_low_yield_forms():
+    """測試長期無結果的查詢形式會被跳過，full 永遠保留"""
+    stats = QueryStats(path=None)
+    for _ in range(MIN_SAMPLES):
+        stats.record("industry_auto", 0, 0)
+        stats.record("full", 0, 0)
+    forms = [form for form, _ in plan_queries(["客服", "預測"], "零售", stats)]
+    assert "industry_auto" not in forms
+    assert "full" in forms
+    print("✅ test_stats_skip_low_yield_forms passed")
+
+
+def test_skipped_form_explored_and_recovers():
+    """測試被跳過的形式定期仍會發出，恢復有結果後不再被跳過"""
+    stats = QueryStats(path=None)
+    for _ in range(MIN_SAMPLES):
+        stats.record("industry_auto", 0, 0)      # 例如短暫的上游故障
+
+    issued = []
+    for round_no in range(1, EXPLORE_EVERY * MIN_SAMPLES):
+        forms = [form for form, _ in plan_queries(["客服", "預測"], "零售", stats)]
+        if "industry_auto" in forms:
+            issued.append(round_no)
+            stats.record("industry_auto", 3, 0)   # 上游已恢復；結果與其他查詢重複也算有結果
+        if stats.yield_rate("industry_auto") >= MIN_YIELD_RATE:
+            break
+    assert issued[:2] == [EXPLORE_EVERY, 2 * EXPLORE_EVERY]
+    assert stats.yield_rate("industry_auto") >= MIN_YIELD_RATE
+    for _ in range(EXPLORE_EVERY):
+        assert "industry_auto" in [form for form, _ in plan_queries(["客服", "預測"], "零售", stats)]
+    print("✅ test_skipped_form_explored_and_recovers passed")
+
+
+def test_late_duplicate_results_count_as_yield():
+    """測試較晚完成、結果都已被取得的查詢仍計為有結果"""
+    stats = QueryStats(path=None)
+    stats.record("keyword", 5, 0)
+    stats.record("keyword", 0, 0)
+    assert stats.yield_rate("keyword") == 0.5
+    print("✅ test_late_duplicate_results_count_as_yield passed")
+
+
+def test_early_stop_cancels_slow_queries():
+    """測試高分候選足夠時不等待其餘查詢"""
+    stats = QueryStats(path=None)
+    full = plan_queries(["客服"], "零售")[0][1]
+    responses = {full: [{"id": i, "name": f"Retail customer service support bot {i}", "totalViews": 1000 * i}
+                        for i in range(1, 6)]}
+    delays = {q: 5 for _, q in plan_queries(["客服"], "零售") if q != full}
+    client = FakeClient(responses, delays, stats)
+    asyncio.run(client.search_and_enrich(["客服"], "零售", max_results=3))
+    assert client.completed == [full]
+    assert stats.snapshot()["full"]["new"] == 5
+    print("✅ test_early_stop_cancels_slow_queries passed")
+
+
+def _strong(prefix, count):
+    return [{"id": f"{prefix}{i}", "name": f"Retail customer service support bot {i}", "totalViews": 1000 * i}
+            for i in range(1, count + 1)]
+
+
+def test_first_wave_only_when_sufficient():
+    """測試第一批查詢已足夠時不發出其餘查詢"""
+    plans = plan_queries(["客服", "預測"], "零售")
+    assert len(plans) > FIRST_WAVE
+    responses = {q: _strong(form, 3) for form, q in plans[:FIRST_WAVE]}
+    client = FakeClient(responses, {}, QueryStats(path=None))
+    asyncio.run(client.search_and_enrich(["客服", "預測"], "零售", max_results=5))
+    assert client.started == [q for _, q in plans[:FIRST_WAVE]]
+    print("✅ test_first_wave_only_when_sufficient passed")
+
+
+def test_rest_issued_when_first_wave_short_or_slow():
+    """測試第一批不足或超過期限時發出其餘查詢；early_stop=False 時一次全部發出"""
+    plans = plan_queries(["客服", "預測"], "零售")
+    queries = [q for _, q in plans]
+
+    # 第一批沒有結果
+    client = FakeClient({queries[-1]: _strong("k", 5)}, {}, QueryStats(path=None))
+    asyncio.run(client.search_and_enrich(["客服", "預測"], "零售", max_results=5))
+    assert sorted(client.started) == sorted(queries)
+
+    # 第一批太慢：期限到了就發出其餘查詢，不等第一批完成
+    delays = {q: 5 for q in queries[:FIRST_WAVE]}
+    client = FakeClient({queries[-1]: _strong("k", 5)}, delays, QueryStats(path=None))
+    asyncio.run(client.search_and_enrich(["客服", "預測"], "零售", max_results=5))
+    assert sorted(client.started) == sorted(queries)
+    assert queries[-1] in client.completed
+    assert not set(queries[:FIRST_WAVE]) & set(client.completed)
+
+    # 預熱：同時發出
+    client = FakeClient({}, {}, QueryStats(path=None))
+    asyncio.run(client.search_and_enrich(["客服", "預測"], "零售", max_results=5, early_stop=False))
+    assert client.started == queries
+    print("✅ test_rest_issued_when_first_wave_short_or_slow passed")
+
+
+if __name__ == "__main__":
+    test_plan_dedupes_queries()
+    test_stats_skip_low_yield_forms()
+    test_skipped_form_explored_and_recovers()
+    test_late_duplicate_results_count_as_yield()
+    test_early_stop_cancels_slow_queries()
+    test_first_wave_only_when_sufficient()
+    test_rest_issued_when_first_wave_short_or_slow()
+    print("\n🎉 All search planner tests passed!")
@@ -0,0 +1,99 @@
+"""
+tests/test_tfidf.py — 字元 n-gram TF-IDF 引擎測試（與 scikit-learn 的分數對照）
+"""
+
+import sys
+import os
+import subprocess
+import numpy as np
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.matcher import TFIDF_PARAMS, build_solution_corpus, fit_index, load_solutions, match_solutions
+from core.tfidf import CharTfidf
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 以 scikit-learn TfidfVectorizer + cosine_similarity 實作時的 Top-3 結果
+SKLEARN_TOP3 = [
+    ("每天手動整理客戶資料，希望自動寄送週報", None,
+     [("auto_report", 0.2411), ("data_entry", 0.1059), ("customer_churn", 0.0302)]),
+    ("客戶流失率太高", ("零售", None),
+     [("customer_churn", 0.3844), ("auto_customer_service", 0.1545), ("inventory_alert", 0.084)]),
+    ("品質檢測靠人工，常常漏檢", ("製造", "品質管控"),
+     [("quality_inspection", 0.3121), ("social_monitoring", 0.0343), ("quote_automation", 0.0304)]),
+    ("報表產出太慢", ("金融", "風控"),
+     [("auto_report", 0.1465), ("quote_automation", 0.0806), ("invoice_processing", 0.071)]),
+    ("Need to automate invoice processing and email alerts", None,
+     [("quote_automation", 0.1199), ("competitor_analysis", 0.0856), ("meeting_summary", 0.0593)]),
+    ("Need to automate invoice processing and email alerts", ("物流", "倉儲管理"),
+     [("quote_automation", 0.1072), ("inventory_alert", 0.0987), ("competitor_analysis", 0.0934)]),
+    ("xyz", None, []),
+]
+
+
+def test_char_wb_ngrams():
+    """測試 n-gram 不跨越詞邊界，短詞只計一次"""
+    vectorizer = CharTfidf(ngram_range=(2, 4))
+    assert vectorizer.analyze("AB  c") == [" a", "ab", "b ", " ab", "ab ", " ab ", " c", "c ", " c "]
+    assert vectorizer.analyze("") == []
+    print("✅ test_char_wb_ngrams passed")
+
+
+def test_scores_match_sklearn():
+    """測試 Top-3 方案與相似度和 scikit-learn 版本相同"""
+    for query, context, expected in SKLEARN_TOP3:
+        results = match_solutions(query, top_n=3, context=context)
+        got = [(r["solution"]["id"], r["similarity"]) for r in results]
+        assert got == expected, (query, got)
+    print("✅ test_scores_match_sklearn passed")
+
+
+def test_max_features():
+    """測試詞彙數上限保留出現次數最多的 n-gram，且欄位依字串排序"""
+    vectorizer = CharTfidf(ngram_range=(2, 2), max_features=2)
+    matrix = vectorizer.fit_transform(["aaa b", "aaa"])
+    assert vectorizer.vocabulary_ == {" a": 0, "aa": 1}
+    assert matrix.shape == (2, 2)
+    assert np.allclose(np.linalg.norm(matrix.toarray(), axis=1), 1.0)
+    print("✅ test_max_features passed")
+
+
+def test_matrix_matches_sklearn():
+    """已安裝 scikit-learn 時，逐項比對詞彙、idf 與文件矩陣"""
+    try:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+    except ImportError:
+        print("⏭  test_matrix_matches_sklearn skipped (scikit-learn not installed)")
+        return
+    corpus = build_solution_corpus(load_solutions())
+    reference = TfidfVectorizer(**TFIDF_PARAMS)
+    expected = reference.fit_transform(corpus)
+    vectorizer, matrix = fit_index(load_solutions())
+    assert vectorizer.vocabulary_ == reference.vocabulary_
+    assert np.allclose(vectorizer.idf_, reference.idf_)
+    assert np.allclose(matrix.toarray(), expected.toarray())
+    query = "每天手動整理客戶資料"
+    dense = np.zeros(matrix.shape[1])
+    for col, weight in vectorizer.transform(query).items():
+        dense[col] = weight
+    assert np.allclose(dense, reference.transform([query]).toarray()[0])
+    print("✅ test_matrix_matches_sklearn passed")
+
+
+def test_matcher_without_sklearn():
+    """測試匹配引擎不匯入 scikit-learn / scipy"""
+    code = ("import sys; from core.matcher import match_solutions; match_solutions('客戶流失率太高'); "
+            "print(','.join(m for m in ('sklearn', 'scipy') if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+    print("✅ test_matcher_without_sklearn passed")
+
+
+if __name__ == "__main__":
+    test_char_wb_ngrams()
+    test_scores_match_sklearn()
+    test_max_features()
+    test_matrix_matches_sklearn()
+    test_matcher_without_sklearn()
+    print("\n🎉 All TF-IDF tests passed!")
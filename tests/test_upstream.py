@@ -0,0 +1,186 @@
+"""
+tests/test_upstream.py — 上游呼叫排程器測試
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from core.upstream import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_SEARCH,
+    UpstreamBusy, UpstreamScheduler, priority,
+)
+
+
+class FakeUpstream:
+    """記錄送出順序的假上游；gate 未開啟前每個呼叫都會卡住"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    async def __call__(self, url):
+        self.calls.append(url)
+        while not self.gate.is_set():
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(self.delay)
+        if url.endswith("/fail"):
+            raise RuntimeError("boom")
+        return {"url": url}
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_priority_order():
+    """測試空位先給優先順序高的呼叫"""
+    upstream = FakeUpstream()
+    upstream.gate.clear()
+    scheduler = UpstreamScheduler(rate=1000, burst=1000, max_in_flight=1, fetch=upstream)
+    first = scheduler.submit("/blocker")
+    _wait_for(lambda: upstream.calls)
+    futures = [
+        scheduler.submit("/prefetch", PRIORITY_BACKGROUND),
+        scheduler.submit("/search", PRIORITY_SEARCH),
+        scheduler.submit("/detail", PRIORITY_INTERACTIVE),
+    ]
+    upstream.gate.set()
+    for f in [first] + futures:
+        f.result(timeout=2)
+    assert upstream.calls == ["/blocker", "/detail", "/search", "/prefetch"]
+    print("✅ test_priority_order passed")
+
+
+def test_dedup_and_priority_upgrade():
+    """測試相同 URL 共用一次呼叫，且較高優先順序的呼叫者會提升排隊中的呼叫"""
+    upstream = FakeUpstream()
+    upstream.gate.clear()
+    scheduler = UpstreamScheduler(rate=1000, burst=1000, max_in_flight=1, fetch=upstream)
+    blocker = scheduler.submit("/blocker")
+    _wait_for(lambda: upstream.calls)
+    search = scheduler.submit("/search", PRIORITY_SEARCH)
+    background = scheduler.submit("/shared", PRIORITY_BACKGROUND)
+    interactive = scheduler.submit("/shared", PRIORITY_INTERACTIVE)
+    upstream.gate.set()
+    assert background.result(timeout=2) == interactive.result(timeout=2) == {"url": "/shared"}
+    search.result(timeout=2)
+    blocker.result(timeout=2)
+    assert upstream.calls == ["/blocker", "/shared", "/search"]
+    assert scheduler.counters["deduped"] == 1
+    print("✅ test_dedup_and_priority_upgrade passed")
+
+
+def test_cancel_and_errors():
+    """測試所有呼叫者取消後不再送出，錯誤傳給所有呼叫者"""
+    upstream = FakeUpstream()
+    upstream.gate.clear()
+    scheduler = UpstreamScheduler(rate=1000, burst=1000, max_in_flight=1, fetch=upstream)
+    blocker = scheduler.submit("/blocker")
+    _wait_for(lambda: upstream.calls)
+    a = scheduler.submit("/dropped")
+    b = scheduler.submit("/dropped")
+    a.cancel()
+    b.cancel()
+    failing = [scheduler.submit("/fail"), scheduler.submit("/fail")]
+    upstream.gate.set()
+    blocker.result(timeout=2)
+    for f in failing:
+        try:
+            f.result(timeout=2)
+            assert False, "error should propagate"
+        except RuntimeError:
+            pass
+    assert "/dropped" not in upstream.calls
+    assert scheduler.counters["abandoned"] == 1
+    print("✅ test_cancel_and_errors passed")
+
+
+def test_backpressure_and_rate():
+    """測試排隊上限（UpstreamBusy）與全域速率"""
+    upstream = FakeUpstream()
+    upstream.gate.clear()
+    scheduler = UpstreamScheduler(rate=1000, burst=1000, max_in_flight=1, fetch=upstream,
+                                  max_queued={PRIORITY_BACKGROUND: 2})
+    blocker = scheduler.submit("/blocker")
+    _wait_for(lambda: upstream.calls)
+    queued = [scheduler.submit(f"/bg{i}", PRIORITY_BACKGROUND) for i in range(2)]
+    try:
+        scheduler.submit("/bg2", PRIORITY_BACKGROUND)
+        assert False, "background queue should be full"
+    except UpstreamBusy as e:
+        assert e.retry_after > 0
+    # 高優先順序的呼叫不受背景佇列上限影響
+    detail = scheduler.submit("/detail", PRIORITY_INTERACTIVE)
+    assert scheduler.estimated_wait(PRIORITY_BACKGROUND) > scheduler.estimated_wait(PRIORITY_INTERACTIVE)
+    upstream.gate.set()
+    for f in [blocker, detail] + queued:
+        f.result(timeout=2)
+
+    paced = UpstreamScheduler(rate=20, burst=1, fetch=FakeUpstream())
+    start = time.perf_counter()
+    for f in [paced.submit(f"/p{i}") for i in range(5)]:
+        f.result(timeout=2)
+    assert time.perf_counter() - start >= 0.18
+    print("✅ test_backpressure_and_rate passed")
+
+
+def test_priority_context_and_async():
+    """測試以 contextvar 指定優先順序，並可在其他 event loop 中等待"""
+    upstream = FakeUpstream()
+    upstream.gate.clear()
+    scheduler = UpstreamScheduler(rate=1000, burst=1000, max_in_flight=1, fetch=upstream)
+    blocker = scheduler.submit("/blocker")
+    _wait_for(lambda: upstream.calls)
+    with priority(PRIORITY_BACKGROUND):
+        background = scheduler.submit("/background")
+    search = scheduler.submit("/default")
+
+    async def interactive():
+        with priority(PRIORITY_INTERACTIVE):
+            task = asyncio.ensure_future(scheduler.fetch_async("/detail"))
+            await asyncio.sleep(0.05)
+            upstream.gate.set()
+            return await task
+
+    assert asyncio.run(interactive()) == {"url": "/detail"}
+    for f in (blocker, background, search):
+        f.result(timeout=2)
+    assert upstream.calls == ["/blocker", "/detail", "/default", "/background"]
+    assert scheduler.fetch("/sync") == {"url": "/sync"}
+    print("✅ test_priority_context_and_async passed")
+
+
+def test_fetch_timeout_abandons_call():
+    """測試同步 fetch 逾時拋出 concurrent.futures.TimeoutError 並中止進行中的呼叫"""
+    upstream = FakeUpstream()
+    upstream.gate.clear()
+    scheduler = UpstreamScheduler(rate=1000, burst=1000, max_in_flight=1, fetch=upstream)
+    try:
+        scheduler.fetch("/slow", timeout=0.05)
+        assert False, "fetch should time out"
+    except FutureTimeout:
+        pass
+    _wait_for(lambda: scheduler.snapshot()["in_flight"] == 0)
+    assert scheduler.counters["abandoned"] == 1
+    upstream.gate.set()
+    assert scheduler.fetch("/slow") == {"url": "/slow"}
+    print("✅ test_fetch_timeout_abandons_call passed")
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_dedup_and_priority_upgrade()
+    test_cancel_and_errors()
+    test_backpressure_and_rate()
+    test_priority_context_and_async()
+    test_fetch_timeout_abandons_call()
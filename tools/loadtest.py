@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+loadtest.py — web_server.py 的壓力測試工具
+
+以指定的並行數或到達率重播 /api/analyze、/api/departments、/api/community/<id>
+流量，回報吞吐量、延遲百分位數、錯誤率，並可逐級提高並行數找出飽和點。
+
+流量來源：
+  --replay FILE     每行一筆 {"method", "path", "body"} 的 JSONL（錄製的流量）
+  （預設）          由 industry_mapping 的典型痛點合成的流量；--dump 可存成 JSONL
+
+負載模型：
+  --concurrency N   封閉式：N 個用戶端各自送出下一個請求前等待回應
+  --rate R          開放式：每秒平均 R 個請求（Poisson 到達），不等待回應
+  --steps 1,2,4,8   依序以各並行數執行，回報飽和點（吞吐量不再明顯成長）
+
+目標伺服器：
+  --target URL      既有的伺服器
+  --spawn-server    啟動本地 n8n 替身（tools/n8n_stub.py）與 web_server.py 子程序，
+                    n8n API 經由 N8N_API_BASE 導向替身，快取目錄為暫存目錄
+
+  python tools/loadtest.py --spawn-server --stub-latency lognormal:200:0.5 --steps 1,2,4,8,16
+  python tools/loadtest.py --target http://localhost:8080 --rate 5 --duration 60
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from urllib.parse import quote
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from tools.n8n_stub import (  # noqa: E402
+    TEMPLATE_COUNT, add_fault_arguments, config_from_args, start_stub,
+)
+
+# 合成流量的組成比例
+DEFAULT_MIX = {"analyze": 0.6, "departments": 0.25, "community": 0.15}
+# 每個 /api/analyze 請求的痛點數範圍
+PAIN_POINTS_PER_REQUEST = (1, 3)
+# 單一請求的用戶端逾時（秒）
+REQUEST_TIMEOUT = 60.0
+# 逐級測試時，吞吐量成長低於此比例即視為飽和
+SATURATION_GAIN = 0.10
+# --spawn-server 時替身的預設故障設定
+STUB_DEFAULTS = {"latency": "lognormal:150:0.5", "error_rate": 0.02}
+# 等待伺服器啟動的秒數上限
+SPAWN_TIMEOUT = 60.0
+
+
+# ── 流量 ──
+
+def synthetic_traffic(count, mix=None, seed=None):
+    """
+    由產業對照表的典型痛點合成請求。
+
+    Returns
+    -------
+    list[dict] — 每筆含 method, path, body（body 為 dict 或 None）
+    """
+    from core.industry_adapter import load_industry_mapping
+
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    industries = []
+    for industry, info in load_industry_mapping().items():
+        departments = info.get("departments", {})
+        for department, dept in departments.items():
+            industries.append((industry, department, list(dept.get("typical_pain_points", []))))
+
+    kinds, weights = zip(*mix.items())
+    requests = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        industry, department, pains = rng.choice(industries)
+        if kind == "analyze" and pains:
+            n = rng.randint(*PAIN_POINTS_PER_REQUEST)
+            requests.append({"method": "POST", "path": "/api/analyze", "body": {
+                "industry": industry,
+                "department": rng.choice([department, ""]),
+                "pain_points": rng.sample(pains, min(n, len(pains))),
+            }})
+        elif kind == "departments":
+            requests.append({"method": "GET",
+                             "path": f"/api/departments?industry={quote(industry)}",
+                             "body": None})
+        else:
+            # id 為 None：送出時從先前 /api/analyze 回應中出現過的模板挑選
+            requests.append({"method": "GET", "path": "/api/community/{id}", "body": None})
+    return requests
+
+
+def load_replay(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def dump_traffic(requests, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+# ── 執行 ──
+
+class Recorder:
+    """收集每個請求的結果（執行緒安全）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = []        # (kind, status, latency)
+        self.community_ids = []
+
+    def add(self, kind, status, latency):
+        with self.lock:
+            self.samples.append((kind, status, latency))
+
+    def remember_ids(self, ids):
+        with self.lock:
+            self.community_ids.extend(ids)
+            del self.community_ids[:-1000]
+
+    def pick_id(self, rng):
+        with self.lock:
+            if self.community_ids:
+                return rng.choice(self.community_ids)
+        return rng.randint(1, TEMPLATE_COUNT)
+
+
+def _kind(path):
+    return path.split("?", 1)[0].rstrip("/").split("/")[2] if path.startswith("/api/") else "static"
+
+
+def send_request(target, request, recorder, rng):
+    """送出單一請求並記錄狀態碼與延遲（連線錯誤記為狀態 0）"""
+    parts = urllib.parse.urlsplit(target)
+    path = request["path"]
+    if "{id}" in path:
+        path = path.replace("{id}", str(recorder.pick_id(rng)))
+    body = request.get("body")
+    payload = json.dumps(body, ensure_ascii=False).encode("utf-8") if body is not None else None
+    headers = {"Content-Type": "application/json"} if payload is not None else {}
+
+    kind = _kind(path)
+    start = time.perf_counter()
+    status = 0
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=REQUEST_TIMEOUT)
+    try:
+        conn.request(request.get("method", "GET"), path, body=payload, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        status = response.status
+        if kind == "analyze" and status == 200:
+            ids = [c["id"] for r in json.loads(data).get("results", [])
+                   for c in r.get("community", []) if c.get("id")]
+            recorder.remember_ids(ids)
+    except (OSError, http.client.HTTPException, ValueError):
+        pass
+    finally:
+        conn.close()
+    recorder.add(kind, status, time.perf_counter() - start)
+
+
+def run_closed(target, requests, concurrency, duration, seed=None):
+    """封閉式負載：concurrency 個用戶端循環送出 requests，直到 duration 秒"""
+    recorder = Recorder()
+    cursor = [0]
+    lock = threading.Lock()
+    end = time.perf_counter() + duration
+
+    def client(i):
+        rng = random.Random(None if seed is None else seed + i)
+        while time.perf_counter() < end:
+            with lock:
+                request = requests[cursor[0] % len(requests)]
+                cursor[0] += 1
+            send_request(target, request, recorder, rng)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(recorder.samples, time.perf_counter() - started, concurrency=concurrency)
+
+
+def run_open(target, requests, rate, duration, seed=None):
+    """開放式負載：以 Poisson 到達率 rate（每秒）送出，每個請求一個執行緒"""
+    recorder = Recorder()
+    rng = random.Random(seed)
+    threads = []
+    started = time.perf_counter()
+    next_at = started
+    i = 0
+    while True:
+        next_at += rng.expovariate(rate)
+        if next_at - started >= duration:
+            break
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        t = threading.Thread(
+            target=send_request,
+            args=(target, requests[i % len(requests)], recorder, random.Random(rng.random())),
+            daemon=True,
+        )
+        t.start()
+        threads.append(t)
+        i += 1
+    for t in threads:
+        t.join()
+    return summarize(recorder.samples, time.perf_counter() - started, rate=rate)
+
+
+# ── 報告 ──
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _stats(samples, elapsed):
+    latencies = sorted(latency for _, _, latency in samples)
+    errors = sum(1 for _, status, _ in samples if status == 0 or status >= 500)
+    return {
+        "requests": len(samples),
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "max_ms": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def summarize(samples, elapsed, **load):
+    """
+    Returns
+    -------
+    dict — 整體與各端點的 throughput（req/s）、error_rate、p50/p95/p99/max（毫秒）
+    """
+    by_kind = {}
+    for sample in samples:
+        by_kind.setdefault(sample[0], []).append(sample)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        **load,
+        "elapsed": elapsed,
+        **_stats(samples, elapsed),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "endpoints": {kind: _stats(s, elapsed) for kind, s in sorted(by_kind.items())},
+    }
+
+
+def find_saturation(steps):
+    """
+    回傳第一個吞吐量成長低於 SATURATION_GAIN 的並行數（未飽和時為 None）。
+    錯誤率明顯上升也視為飽和。
+    """
+    for prev, cur in zip(steps, steps[1:]):
+        gain = (cur["throughput"] - prev["throughput"]) / prev["throughput"] if prev["throughput"] else 0
+        if gain < SATURATION_GAIN or cur["error_rate"] > prev["error_rate"] + 0.05:
+            return prev["concurrency"]
+    return None
+
+
+def format_report(result):
+    load = (f"concurrency={result['concurrency']}" if "concurrency" in result
+            else f"rate={result['rate']}/s")
+    lines = [
+        f"  {load}  {result['requests']} requests in {result['elapsed']:.1f}s  "
+        f"statuses={result['statuses']}",
+        f"    {'endpoint':<12}{'req/s':>8}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}",
+    ]
+    rows = [("all", result)] + list(result["endpoints"].items())
+    for name, s in rows:
+        lines.append(
+            f"    {name:<12}{s['throughput']:>8.2f}{s['error_rate'] * 100:>6.1f}%"
+            f"{s['p50_ms']:>8.0f}ms{s['p95_ms']:>7.0f}ms{s['p99_ms']:>7.0f}ms{s['max_ms']:>7.0f}ms"
+        )
+    return "\n".join(lines)
+
+
+# ── 目標伺服器 ──
+
+def _wait_ready(target, timeout=SPAWN_TIMEOUT):
+    parts = urllib.parse.urlsplit(target)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            conn.request("GET", "/api/industries")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+        finally:
+            conn.close()
+    return False
+
+
+def spawn_server(port, api_base, server_args=(), cache_dir=None):
+    """
+    以子程序啟動 web_server.py，n8n API 指向 api_base。
+
+    Returns
+    -------
+    subprocess.Popen
+    """
+    env = dict(os.environ, N8N_API_BASE=api_base, PYTHONUNBUFFERED="1")
+    if cache_dir:
+        env["N8N_CONSULTANT_CACHE_DIR"] = cache_dir
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "web_server.py"), "--port", str(port), *server_args],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    if not _wait_ready(f"http://127.0.0.1:{port}"):
+        proc.terminate()
+        raise RuntimeError("web_server.py did not become ready")
+    return proc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for web_server.py")
+    parser.add_argument("--target", default="http://127.0.0.1:8080")
+    parser.add_argument("--replay", help="錄製流量 JSONL")
+    parser.add_argument("--requests", type=int, default=200, help="合成流量筆數")
+    parser.add_argument("--dump", help="把使用的流量存成 JSONL")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=None, help="開放式負載的每秒請求數")
+    parser.add_argument("--steps", help="逐級並行數，如 1,2,4,8")
+    parser.add_argument("--duration", type=float, default=20.0, help="每一級的秒數")
+    parser.add_argument("--json", dest="json_out", help="把結果寫成 JSON 檔")
+    parser.add_argument("--spawn-server", action="store_true")
+    parser.add_argument("--port", type=int, default=18080, help="--spawn-server 的埠號")
+    parser.add_argument("--server-args", default="--no-rate-limit --no-prefetch",
+                        help="傳給 web_server.py 的參數（預設停用限流與背景預熱：所有流量"
+                             "來自同一 IP，且結果不受預熱進度影響）")
+    # 替身的故障注入參數（--stub-latency、--stub-burst-every …，見 tools/n8n_stub.py）
+    add_fault_arguments(parser, prefix="stub-")
+    args = parser.parse_args(argv)
+
+    requests = load_replay(args.replay) if args.replay else synthetic_traffic(args.requests, seed=args.seed)
+    if args.dump:
+        dump_traffic(requests, args.dump)
+
+    proc = stub = None
+    target = args.target
+    with tempfile.TemporaryDirectory(prefix="n8n-loadtest-") as cache_dir:
+        try:
+            if args.spawn_server:
+                stub, api_base = start_stub(config_from_args(
+                    args, prefix="stub-", seed=args.seed, **STUB_DEFAULTS,
+                ))
+                proc = spawn_server(args.port, api_base, args.server_args.split(), cache_dir)
+                target = f"http://127.0.0.1:{args.port}"
+
+            print(f"  target: {target}  ({len(requests)} requests in traffic)")
+            if args.rate:
+                results = [run_open(target, requests, args.rate, args.duration, args.seed)]
+            else:
+                levels = [int(s) for s in args.steps.split(",")] if args.steps else [args.concurrency]
+                results = [run_closed(target, requests, c, args.duration, args.seed) for c in levels]
+            for result in results:
+                print(format_report(result))
+
+            report = {"target": target, "results": results}
+            if len(results) > 1:
+                report["saturation_concurrency"] = find_saturation(results)
+                print(f"  saturation: concurrency={report['saturation_concurrency'] or 'not reached'}")
+            if stub is not None:
+                report["stub"] = stub.config.stats()
+                print(f"  stub: {report['stub']}")
+            if args.json_out:
+                with open(args.json_out, "w", encoding="utf-8") as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=15)
+            if stub is not None:
+                stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+n8n_stub.py — 本地 n8n 公開 API 替身（效能與整合測試用）
+
+實作 /api/templates/search 與 /api/workflows/{id}，讓 n8n_community /
+n8n_async 的並行、快取與錯誤處理可以離線、可重現地測試。
+
+回應來源：
+  1. 錄製的 fixture 檔（--fixtures）：{"search": {查詢字串: 回應}, "workflows": {id: 回應}}
+  2. --record URL：fixture 未命中時轉送到真正的上游，並把回應寫回 fixture 檔
+  3. 以上皆無時，回傳依 id / 查詢字串決定的合成資料（--no-synthetic 則回傳空結果 / 404）
+
+故障注入：
+  --latency SPEC        延遲分佈（毫秒）：fixed:100、uniform:50:250、normal:150:40、
+                        lognormal:150:0.6（中位數, sigma）、exp:150（平均）
+  --error-rate P        以機率 P 回傳 5xx（--error-status 指定狀態碼）
+  --burst-every N --burst-length M   每 N 個請求中連續 M 個回傳 5xx
+  --timeout-rate P      以機率 P 不回應，--hang-seconds 秒後直接關閉連線
+  --slow-body-rate P    以機率 P 分段慢速送出回應本體
+  --config FILE         以 JSON 檔設定上述參數（鍵名同 StubConfig 參數）
+
+  python tools/n8n_stub.py --port 5680 --latency lognormal:150:0.6 --burst-every 50 --burst-length 5
+  N8N_API_BASE=http://127.0.0.1:5680/api python web_server.py
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 合成模板使用的節點類型
+NODE_TYPES = (
+    "n8n-nodes-base.scheduleTrigger", "n8n-nodes-base.webhook", "n8n-nodes-base.httpRequest",
+    "n8n-nodes-base.postgres", "n8n-nodes-base.googleSheets", "n8n-nodes-base.if",
+    "@n8n/n8n-nodes-langchain.openAi", "n8n-nodes-base.slack", "n8n-nodes-base.gmail",
+    "n8n-nodes-base.code",
+)
+TEMPLATE_COUNT = 500
+# 錄製模式向上游請求的逾時（秒）
+RECORD_TIMEOUT = 15
+
+
+def _seed(text):
+    return int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def synthetic_search(query, rows):
+    """依查詢字串決定的搜尋結果"""
+    rng = random.Random(_seed(query))
+    words = query.split() or ["workflow"]
+    workflows = []
+    for wf_id in rng.sample(range(1, TEMPLATE_COUNT + 1), min(rows, TEMPLATE_COUNT)):
+        nodes = rng.sample(NODE_TYPES, rng.randint(2, 5))
+        workflows.append({
+            "id": wf_id,
+            "name": f"{' '.join(rng.sample(words, min(2, len(words)))).title()} automation #{wf_id}",
+            "totalViews": rng.randint(10, 50000),
+            "user": {"username": f"creator{wf_id % 37}"},
+            "nodes": [{"name": t} for t in nodes],
+        })
+    return {"totalWorkflows": len(workflows), "workflows": workflows}
+
+
+def synthetic_detail(wf_id):
+    """依 id 決定的模板詳情（n8n API 的 data.attributes 格式）"""
+    rng = random.Random(wf_id)
+    nodes = [
+        {"type": t, "name": t.rsplit(".", 1)[-1], "parameters": {}}
+        for t in rng.sample(NODE_TYPES, rng.randint(3, 8))
+    ]
+    steps = "\n".join(f"{i}. Step {i} configures {n['name']}" for i, n in enumerate(nodes, 1))
+    return {"data": {"id": wf_id, "attributes": {
+        "name": f"Synthetic workflow #{wf_id}",
+        "description": f"## How it works\n{steps}\n\n## Set up\nConnect your credentials.",
+        "updatedAt": "2024-01-01T00:00:00.000Z",
+        "workflow": {"nodes": nodes},
+        "categories": {"data": [{"attributes": {"name": "Sales"}}]},
+    }}}
+
+
+def parse_latency(spec):
+    """
+    解析延遲分佈設定。
+
+    Returns
+    -------
+    callable(rng) -> float — 每次呼叫抽樣一個延遲（毫秒，不小於 0）
+    """
+    kind, _, rest = str(spec).partition(":")
+    if not rest:
+        kind, rest = "fixed", kind
+    args = [float(x) for x in rest.split(":")]
+    if kind == "fixed":
+        return lambda rng: args[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        mu = math.log(max(args[0], 1e-6))
+        return lambda rng: rng.lognormvariate(mu, args[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    raise ValueError(f"unknown latency distribution: {spec!r}")
+
+
+class Fixtures:
+    """
+    錄製的上游回應。
+
+    Parameters
+    ----------
+    path : str, optional — fixture JSON 檔（不存在時視為空）
+    record_base : str, optional — 未命中時轉送的上游 API 位址；取得的回應寫回 path
+    """
+
+    def __init__(self, path=None, record_base=None):
+        self.path = path
+        self.record_base = record_base.rstrip("/") if record_base else None
+        self.search = {}
+        self.workflows = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.search = data.get("search", {})
+            self.workflows = {str(k): v for k, v in data.get("workflows", {}).items()}
+
+    def get_search(self, query):
+        if query not in self.search and self.record_base:
+            url = f"{self.record_base}/templates/search?" + urllib.parse.urlencode(
+                {"search": query, "rows": 20, "page": 1})
+            self._record(self.search, query, url)
+        return self.search.get(query)
+
+    def get_workflow(self, wf_id):
+        key = str(wf_id)
+        if key not in self.workflows and self.record_base:
+            self._record(self.workflows, key, f"{self.record_base}/workflows/{key}")
+        return self.workflows.get(key)
+
+    def _record(self, table, key, url):
+        req = urllib.request.Request(url, headers={
+            "User-Agent": "n8n-ai-consultant/1.0", "Accept": "application/json",
+        })
+        try:
+            with urllib.request.urlopen(req, timeout=RECORD_TIMEOUT) as resp:
+                table[key] = json.loads(resp.read().decode("utf-8"))
+        except Exception as e:
+            print(f"[n8n_stub] Record error for {url}: {e}")
+            return
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"search": self.search, "workflows": self.workflows}, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+
+class Fault:
+    __slots__ = ("delay", "status", "hang", "slow")
+
+    def __init__(self, delay=0.0, status=None, hang=False, slow=False):
+        self.delay = delay      # 回應前的延遲（秒）
+        self.status = status    # 注入的錯誤狀態碼（None = 正常）
+        self.hang = hang        # 不回應，直接關閉連線
+        self.slow = slow        # 分段慢速送出本體
+
+
+class StubConfig:
+    """
+    Parameters
+    ----------
+    latency : str — 延遲分佈（見 parse_latency）
+    error_rate : float — 隨機回傳錯誤的機率
+    error_statuses : tuple[int] — 隨機挑選的錯誤狀態碼
+    burst_every, burst_length : int — 每 burst_every 個請求中，前 burst_length 個回傳錯誤
+    timeout_rate : float — 不回應的機率
+    hang_seconds : float — 不回應時保持連線的秒數
+    slow_body_rate : float — 慢速送出本體的機率
+    slow_chunk_bytes, slow_chunk_interval_ms — 慢速送出的分段大小與間隔
+    fixtures : Fixtures, optional
+    synthetic : bool — fixture 未命中時是否回傳合成資料
+    seed : int, optional
+    """
+
+    def __init__(self, latency="fixed:0", error_rate=0.0, error_statuses=(503,),
+                 burst_every=0, burst_length=0, timeout_rate=0.0, hang_seconds=30.0,
+                 slow_body_rate=0.0, slow_chunk_bytes=256, slow_chunk_interval_ms=100.0,
+                 fixtures=None, synthetic=True, seed=None):
+        self.latency = latency
+        self._sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.slow_body_rate = slow_body_rate
+        self.slow_chunk_bytes = slow_chunk_bytes
+        self.slow_chunk_interval_ms = slow_chunk_interval_ms
+        self.fixtures = fixtures or Fixtures()
+        self.synthetic = synthetic
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.slow_bodies = 0
+
+    def next_fault(self):
+        """抽樣本次請求的故障並更新計數"""
+        with self.lock:
+            index = self.requests
+            self.requests += 1
+            fault = Fault(delay=self._sample_latency(self.rng) / 1000.0)
+            in_burst = self.burst_every and index % self.burst_every < self.burst_length
+            if in_burst or self.rng.random() < self.error_rate:
+                fault.status = self.rng.choice(self.error_statuses)
+                self.errors += 1
+            elif self.rng.random() < self.timeout_rate:
+                fault.hang = True
+                self.timeouts += 1
+            elif self.rng.random() < self.slow_body_rate:
+                fault.slow = True
+                self.slow_bodies += 1
+        return fault
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "errors": self.errors,
+                    "timeouts": self.timeouts, "slow_bodies": self.slow_bodies}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        config = self.server.config
+        fault = config.next_fault()
+        if fault.delay:
+            time.sleep(fault.delay)
+        if fault.hang:
+            time.sleep(config.hang_seconds)
+            self.close_connection = True
+            return
+        if fault.status:
+            return self._send(fault.status, {"error": "injected failure"})
+
+        status, body = self._route(config)
+        self._send(status, body, slow=fault.slow)
+
+    def _route(self, config):
+        url = urlparse(self.path)
+        if url.path == "/api/templates/search":
+            qs = parse_qs(url.query)
+            query = qs.get("search", [""])[0]
+            rows = int(qs.get("rows", ["6"])[0])
+            recorded = config.fixtures.get_search(query)
+            if recorded is not None:
+                recorded = dict(recorded, workflows=recorded.get("workflows", [])[:rows])
+                return 200, recorded
+            if config.synthetic:
+                return 200, synthetic_search(query, rows)
+            return 200, {"totalWorkflows": 0, "workflows": []}
+        if url.path.startswith("/api/workflows/"):
+            wf_id = url.path.rsplit("/", 1)[1]
+            recorded = config.fixtures.get_workflow(wf_id)
+            if recorded is not None:
+                return 200, recorded
+            if config.synthetic and wf_id.isdigit() and 0 < int(wf_id) <= TEMPLATE_COUNT:
+                return 200, synthetic_detail(int(wf_id))
+        return 404, {"error": "not found"}
+
+    def _send(self, status, body, slow=False):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        config = self.server.config
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if not slow:
+                self.wfile.write(payload)
+                return
+            step = max(1, config.slow_chunk_bytes)
+            for start in range(0, len(payload), step):
+                self.wfile.write(payload[start:start + step])
+                self.wfile.flush()
+                time.sleep(config.slow_chunk_interval_ms / 1000.0)
+        except ConnectionError:
+            # 用戶端提早結束（逾時或社群搜尋提早停止並取消其餘查詢）
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(config=None, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.config = config or StubConfig()
+    return server
+
+
+def start_stub(config=None, host="127.0.0.1", port=0):
+    """
+    在背景執行緒啟動替身伺服器。
+
+    Returns
+    -------
+    tuple: (server, api_base) — api_base 可直接設為 N8N_API_BASE
+    """
+    server = make_server(config, host, port)
+    threading.Thread(target=server.serve_forever, name="n8n-stub", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api"
+
+
+def add_fault_arguments(parser, prefix=""):
+    """加入故障注入參數（loadtest.py 以 prefix="stub-" 共用）"""
+    parser.add_argument(f"--{prefix}config", help="JSON 設定檔")
+    parser.add_argument(f"--{prefix}fixtures", help="錄製的 fixture JSON 檔")
+    parser.add_argument(f"--{prefix}record", help="fixture 未命中時轉送並錄製的上游 API 位址")
+    parser.add_argument(f"--{prefix}no-synthetic", action="store_true",
+                        help="fixture 未命中時不回傳合成資料")
+    parser.add_argument(f"--{prefix}latency", default=None, help="延遲分佈，如 lognormal:150:0.6")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=None)
+    parser.add_argument(f"--{prefix}error-status", type=int, action="append", default=None)
+    parser.add_argument(f"--{prefix}burst-every", type=int, default=None)
+    parser.add_argument(f"--{prefix}burst-length", type=int, default=None)
+    parser.add_argument(f"--{prefix}timeout-rate", type=float, default=None)
+    parser.add_argument(f"--{prefix}hang-seconds", type=float, default=None)
+    parser.add_argument(f"--{prefix}slow-body-rate", type=float, default=None)
+
+
+def config_from_args(args, prefix="", seed=None, **defaults):
+    """
+    由 add_fault_arguments 的參數建立 StubConfig；命令列參數優先於設定檔，
+    設定檔優先於 defaults。
+    """
+    attr = prefix.replace("-", "_")
+
+    def value(name):
+        return getattr(args, attr + name)
+
+    overrides = dict(defaults)
+    if value("config"):
+        with open(value("config"), encoding="utf-8") as f:
+            overrides.update(json.load(f))
+    for name, key in (("latency", "latency"), ("error_rate", "error_rate"),
+                      ("error_status", "error_statuses"), ("burst_every", "burst_every"),
+                      ("burst_length", "burst_length"), ("timeout_rate", "timeout_rate"),
+                      ("hang_seconds", "hang_seconds"), ("slow_body_rate", "slow_body_rate")):
+        if value(name) is not None:
+            overrides[key] = value(name)
+    if value("no_synthetic"):
+        overrides["synthetic"] = False
+    fixtures_path = value("fixtures") or overrides.pop("fixtures", None)
+    record = value("record") or overrides.pop("record", None)
+    overrides["fixtures"] = Fixtures(fixtures_path, record)
+    if seed is not None:
+        overrides.setdefault("seed", seed)
+    return StubConfig(**overrides)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local n8n API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5680)
+    parser.add_argument("--seed", type=int, default=None)
+    add_fault_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = make_server(config_from_args(args, seed=args.seed), args.host, args.port)
+    print(f"  n8n stub: http://{args.host}:{args.port}/api")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"  {server.config.stats()}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+startup_bench.py — CLI 啟動時間量測
+
+每一項都在新的子程序中執行（不受本程序已匯入模組影響），取多次中的最小值：
+  python            空的直譯器（基準）
+  import main       匯入 main.py
+  --help            python main.py --help
+  first menu        python main.py 到印出第一個「請輸入編號」提示
+  engines ready     EngineLoader 載入並暖機分析引擎（背景執行緒的工作量）
+另以 python -X importtime 列出 import main 與分析引擎累計最久的模組。
+
+  python tools/startup_bench.py
+  python tools/startup_bench.py --runs 10 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 第一個選單的提示文字
+MENU_PROMPT = "請輸入編號"
+# -X importtime 列出的模組數
+TOP_IMPORTS = 10
+
+CASES = {
+    "python": ["-c", "pass"],
+    "import main": ["-c", "import main"],
+    "--help": ["main.py", "--help"],
+    "engines ready": ["-c", "import main; main.EngineLoader().start().wait()"],
+}
+
+
+def _env():
+    env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+def time_command(args):
+    """執行一次，回傳牆鐘秒數"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT_DIR, env=_env(), check=True,
+                   stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def time_first_menu(timeout=60.0):
+    """啟動互動模式，回傳印出第一個選單提示的秒數"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=ROOT_DIR, env=_env(),
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        output = b""
+        while MENU_PROMPT.encode("utf-8") not in output:
+            chunk = proc.stdout.read1(4096)
+            if not chunk or time.perf_counter() - start > timeout:
+                raise RuntimeError("main.py exited before showing the industry menu")
+            output += chunk
+        return time.perf_counter() - start
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def import_times(statement, top=TOP_IMPORTS):
+    """
+    python -X importtime 的結果中累計時間最久的模組。
+
+    Returns
+    -------
+    list of (module, cumulative_ms, self_ms)
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            cwd=ROOT_DIR, env=_env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((module.strip(), int(cumulative_us) / 1000, int(self_us) / 1000))
+    rows.sort(key=lambda row: row[1], reverse=True)
+    return rows[:top]
+
+
+def run(runs=5):
+    """
+    Returns
+    -------
+    dict with: timings {項目: {min_ms, median_ms}}, imports {敘述: [...]}
+    """
+    timings = {}
+    for name, args in CASES.items():
+        samples = sorted(time_command(args) for _ in range(runs))
+        timings[name] = samples
+    timings["first menu"] = sorted(time_first_menu() for _ in range(runs))
+    return {
+        "runs": runs,
+        "timings": {
+            name: {"min_ms": round(s[0] * 1000, 1), "median_ms": round(s[len(s) // 2] * 1000, 1)}
+            for name, s in timings.items()
+        },
+        "imports": {
+            statement: [
+                {"module": module, "cumulative_ms": round(cum, 1), "self_ms": round(own, 1)}
+                for module, cum, own in import_times(statement)
+            ]
+            for statement in ("import main", "import core.roadmap_generator")
+        },
+    }
+
+
+def print_report(result):
+    print(f"\n{'項目':<16}{'min (ms)':>12}{'median (ms)':>14}")
+    for name, timing in result["timings"].items():
+        print(f"{name:<16}{timing['min_ms']:>12.1f}{timing['median_ms']:>14.1f}")
+    for statement, rows in result["imports"].items():
+        print(f"\n-X importtime: {statement}")
+        for row in rows:
+            print(f"  {row['cumulative_ms']:>9.1f} ms  {row['module']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup benchmark for main.py")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", dest="json_out", help="把結果寫成 JSON 檔")
+    args = parser.parse_args(argv)
+
+    result = run(args.runs)
+    print_report(result)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,31 +4,99 @@ web_server.py — n8n AI 導入顧問系統 Web 介面
 
 輕量級 HTTP Server，純 Python 標準庫，無需 Flask。
 提供 JSON API 供前端 AJAX 呼叫。
+
+  python web_server.py                       # 單一程序
+  python web_server.py --workers auto        # pre-fork：每個 CPU 一個 worker
+  python web_server.py --workers 4 --max-requests 500
 """
 
+import argparse
+import asyncio
 import json
+import logging
 import os
 import re
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+import select
+import socket
+from contextlib import contextmanager, nullcontext
+from http.server import HTTPServer, SimpleHTTPRequestHandler, ThreadingHTTPServer
 from urllib.parse import parse_qs
 
 from core.industry_adapter import (
     get_supported_industries,
     get_departments,
     get_department_info,
-    get_industry_context_text,
 )
-from core.matcher import match_solutions
-from core.roadmap_generator import generate_roadmap
-from core.n8n_community import get_workflow_detail, enrich_workflow
+from core import n8n_community, profiling, request_log
+from core.matcher import get_context_vector, match_solutions
+from core.analysis_pool import COMMUNITY_PAGE_SIZE, analyze_many, default_workers, paginate
+from core.enrichment_store import get_store
+from core.n8n_async import run_sync
+from core.pain_analyzer import analyze_pain_point
+from core.prefetch import start_background
+from core.prefork import MAX_REQUESTS, PreforkServer, supports_prefork
+from core.rate_limit import RateLimited, configure as configure_rate_limit, get_limiter
+from core.upstream import PRIORITY_INTERACTIVE, configure as configure_upstream, priority
+
+log = logging.getLogger(__name__)
 
 PORT = 8080
+# /api/analyze 的子程序數（None = analysis_pool 預設；由命令列覆寫）
+POOL_WORKERS = None
+# 是否接受 /api/analyze?profile=…（由命令列開啟）
+PROFILING_ENABLED = False
+# lazy 模式的社群摘要分頁（與 /api/analyze 同樣計入痛點單位與上游預算）
+CANDIDATES_PATH = "/api/community/candidates?"
+
+
+def route_name(path):
+    """請求日誌用的路由名稱（去掉查詢字串，模板 id 以 <id> 表示）"""
+    route = path.split("?", 1)[0]
+    return re.sub(r"^/api/community/\d+$", "/api/community/<id>", route)
 
 
 class ConsultantHandler(SimpleHTTPRequestHandler):
     """自訂 HTTP Handler，處理靜態檔案與 API 路由"""
 
     def do_GET(self):
+        with self._request_log():
+            self._handle_get()
+
+    def do_POST(self):
+        with self._request_log():
+            self._handle_post()
+
+    @contextmanager
+    def _request_log(self):
+        """請求日誌：未送出回應即結束（用戶端斷線）時記為 499，例外時為 500"""
+        self._status = None
+        request, token = request_log.begin(
+            self.command, route_name(self.path),
+            request_id=self.headers.get("X-Request-Id"), client=self.client_address[0],
+        )
+        status = None
+        try:
+            yield
+            status = self._status or 499
+        except Exception:
+            status = 500
+            log.exception("Unhandled error for %s %s", self.command, self.path)
+            raise
+        finally:
+            request_log.finish(request, token, status or 500)
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        self._status = code
+        request = request_log.current()
+        if request is not None:
+            self.send_header("X-Request-Id", request.request_id)
+
+    def _handle_get(self):
+        # 社群摘要分頁與 /api/analyze 一樣會分析痛點並呼叫上游，在路由內依痛點單位限流
+        if self.path.startswith("/api/") and not self.path.startswith(CANDIDATES_PATH) \
+                and not self._admit():
+            return
         if self.path == "/" or self.path == "/index.html":
             self.path = "/web/index.html"
             return SimpleHTTPRequestHandler.do_GET(self)
@@ -49,21 +117,65 @@ class ConsultantHandler(SimpleHTTPRequestHandler):
                         "primary_dimensions": info["primary_dimensions"],
                     }
             self._send_json({"departments": departments, "details": dept_details})
+        elif self.path.startswith(CANDIDATES_PATH):
+            # ── lazy 模式的社群摘要分頁 ──
+            qs = parse_qs(self.path.split("?", 1)[1])
+            pain_point = qs.get("pain_point", [""])[0].strip()
+            if len(pain_point) < 2:
+                self._send_json({"error": "缺少痛點描述"}, status=400)
+                return
+            try:
+                page = int(qs.get("page", ["1"])[0])
+                page_size = int(qs.get("page_size", [str(COMMUNITY_PAGE_SIZE)])[0])
+            except ValueError:
+                self._send_json({"error": "page / page_size 必須為整數"}, status=400)
+                return
+            industry = qs.get("industry", [""])[0]
+            department = qs.get("department", [""])[0]
+            # 與 /api/analyze 相同的限流（一個痛點單位、上游預算、公平排隊）、分析與查詢；
+            # 搜尋結果多半已在快取中
+            if not self._admit(units=1, upstream=True):
+                return
+            try:
+                with self._queue_slot(cost=1):
+                    analysis = analyze_pain_point(pain_point, industry, department)
+                    with priority(PRIORITY_INTERACTIVE):
+                        candidates = run_sync(
+                            lambda client: client.search_candidates(
+                                analysis.get("keywords", []), industry, analysis,
+                            ),
+                            cancel_check=self._client_disconnected,
+                        )
+            except RateLimited as e:
+                self._send_rate_limited(e)
+                return
+            except asyncio.CancelledError:
+                return
+            items, page_info = paginate(candidates, page, page_size)
+            self._send_json({"pain_point": pain_point, "items": items, **page_info})
         elif re.match(r'^/api/community/(\d+)$', self.path):
             # ── 社群工作流詳情 ──
             wf_id = re.match(r'^/api/community/(\d+)$', self.path).group(1)
-            detail = get_workflow_detail(int(wf_id))
-            if detail:
-                enriched = enrich_workflow(detail, wf_id=int(wf_id))
-                if enriched:
-                    self._send_json(enriched)
-                    return
+            # 使用者正在等待的詳情頁：上游呼叫優先於分析與背景工作
+            with priority(PRIORITY_INTERACTIVE):
+                enriched = get_store().get_enriched(int(wf_id))
+            if enriched:
+                self._send_json(enriched)
+                return
             self._send_json({"error": "工作流不存在"}, status=404)
         else:
             self.send_error(404)
 
-    def do_POST(self):
-        if self.path == "/api/analyze":
+    def _handle_post(self):
+        path, _, query = self.path.partition("?")
+        if path == "/api/analyze":
+            self._profile = None
+            profile_mode = None
+            if PROFILING_ENABLED:
+                profile_mode = profiling.requested_mode(parse_qs(query), self.headers)
+                if profile_mode is not None and profile_mode not in profiling.MODES:
+                    self._send_json({"error": f"profile 必須為 {' / '.join(profiling.MODES)}"}, status=400)
+                    return
             content_length = int(self.headers.get("Content-Length", 0))
             body = self.rfile.read(content_length).decode("utf-8")
             data = json.loads(body)
@@ -82,25 +194,51 @@ class ConsultantHandler(SimpleHTTPRequestHandler):
                 self._send_json({"error": "缺少痛點描述"}, status=400)
                 return
 
-            # 對每個痛點獨立分析
-            results = []
-            for pp in pain_points:
-                pp = pp.strip()
-                if len(pp) < 2:
-                    continue
+            pain_points = [pp.strip() for pp in pain_points if len(pp.strip()) >= 2]
+            # lazy：社群結果只回傳第一頁摘要，詳情與其他頁按需取得
+            lazy = bool(data.get("lazy"))
+            try:
+                page_size = int(data.get("page_size", COMMUNITY_PAGE_SIZE))
+            except (TypeError, ValueError):
+                self._send_json({"error": "page_size 必須為整數"}, status=400)
+                return
 
-                context = get_industry_context_text(industry, department or None)
-                enhanced_query = f"{pp} {context}"
-                matched = match_solutions(enhanced_query, top_n=3)
+            # ── 限流：請求數與痛點數 bucket、上游預算，再依公平排隊取得執行空位 ──
+            limiter = get_limiter()
+            if limiter is not None and len(pain_points) > limiter.unit_burst:
+                self._send_json({
+                    "error": f"單次最多分析 {limiter.unit_burst} 個痛點",
+                    "code": "too_many_pain_points",
+                    "max_pain_points": limiter.unit_burst,
+                }, status=413)
+                return
+            request_log.annotate(pain_points=len(pain_points), lazy=lazy)
+            if not self._admit(units=len(pain_points), upstream=True):
+                return
 
-                roadmap = generate_roadmap(
-                    matched_solutions=matched,
-                    industry_name=industry,
-                    department_name=department or None,
-                    user_query=pp,
-                )
+            # 各痛點的本地引擎交給子程序池平行執行，社群搜尋在本程序同時進行
+            try:
+                if limiter is None:
+                    roadmaps = self._analyze(pain_points, industry, department, lazy, page_size,
+                                             profile_mode)
+                else:
+                    with limiter.queue.slot(self.client_address[0], cost=len(pain_points)):
+                        roadmaps = self._analyze(pain_points, industry, department, lazy, page_size,
+                                                 profile_mode)
+            except RateLimited as e:
+                self._send_rate_limited(e)
+                return
+            except asyncio.CancelledError:
+                # 用戶端已斷線，不必再回應
+                return
 
-                results.append({
+            results = []
+            timed_out = []
+            for pp, roadmap in zip(pain_points, roadmaps):
+                if roadmap is None:
+                    timed_out.append(pp)
+                    continue
+                result = {
                     "pain_point": pp,
                     "pain_summary": roadmap.get("pain_summary", ""),
                     "detected_keywords": roadmap.get("detected_keywords", []),
@@ -110,38 +248,187 @@ class ConsultantHandler(SimpleHTTPRequestHandler):
                     "detected_complexity": roadmap.get("detected_complexity", []),
                     "local": roadmap["local"],
                     "community": roadmap["community"],
-                })
+                }
+                if "community_page" in roadmap:
+                    result["community_page"] = roadmap["community_page"]
+                results.append(result)
 
-            self._send_json({
+            response = {
                 "industry": industry,
                 "department": department or "全部門",
                 "results": results,
-            })
+            }
+            if timed_out:
+                response["timed_out"] = timed_out
+            if self._profile is not None:
+                request = request_log.current()
+                response["profile"] = {
+                    **self._profile.report(),
+                    "request_stages": {k: round(v, 1) for k, v in request.stages.items()},
+                    "path": self._profile.save(request.request_id),
+                }
+            self._send_json(response)
         else:
             self.send_error(404)
 
-    def _send_json(self, data, status=200):
-        response = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
-        self.send_response(status)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
-        self.send_header("Content-Length", str(len(response)))
-        self.end_headers()
-        self.wfile.write(response)
+    def _analyze(self, pain_points, industry, department, lazy=False, page_size=COMMUNITY_PAGE_SIZE,
+                 profile_mode=None):
+        def run(workers):
+            return analyze_many(
+                pain_points, industry, department or None,
+                cancel_check=self._client_disconnected, workers=workers,
+                lazy=lazy, page_size=page_size,
+            )
+
+        if profile_mode is None:
+            return run(POOL_WORKERS)
+        # 剖析的請求在本程序執行本地引擎，pain_analyzer / matcher / dynamic_composer 才會被取樣
+        with profiling.profile_request(profile_mode) as profile:
+            roadmaps = run(0)
+        self._profile = profile
+        return roadmaps
+
+    def _admit(self, units=0, upstream=False):
+        """限流檢查；超過限制時送出 429 並回傳 False"""
+        limiter = get_limiter()
+        if limiter is None:
+            return True
+        try:
+            limiter.admit(self.client_address[0], units=units, upstream=upstream)
+        except RateLimited as e:
+            self._send_rate_limited(e)
+            return False
+        return True
+
+    def _queue_slot(self, cost):
+        """公平排隊的執行空位；未啟用限流時不排隊"""
+        limiter = get_limiter()
+        if limiter is None:
+            return nullcontext()
+        return limiter.queue.slot(self.client_address[0], cost=cost)
+
+    def _send_rate_limited(self, error):
+        self._send_json(error.to_dict(), status=429,
+                        headers={"Retry-After": error.retry_after_header})
+
+    def _send_json(self, data, status=200, headers=None):
+        with request_log.stage("respond"):
+            response = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(response)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(response)
+
+    def _client_disconnected(self):
+        """檢查用戶端是否已關閉連線（socket 可讀但讀不到資料）"""
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            if not readable:
+                return False
+            return self.connection.recv(1, socket.MSG_PEEK) == b""
+        except (OSError, ValueError):
+            return True
 
     def log_message(self, format, *args):
-        """簡化日誌"""
-        print(f"  [{self.client_address[0]}] {args[0]}")
+        """存取日誌由 request_log 以結構化記錄寫出；此處只留給除錯"""
+        log.debug("[%s] %s", self.client_address[0], format % args)
+
+
+def warm_up():
+    """
+    預先載入 jieba 詞典、方案庫索引、各產業情境向量與翻譯規則。
+    pre-fork 模式下由主程序在 fork 前執行，worker 共用這些記憶體。
+    不可在此開啟 SQLite 或網路連線（無法跨 fork 共用）。
+    """
+    from core.n8n_community import translate_to_zh
+    from core.pain_analyzer import analyze_pain_point
+
+    analyze_pain_point("每天手動整理客戶資料，希望自動寄送週報")
+    match_solutions("客戶流失", top_n=1)
+    for industry in get_supported_industries():
+        get_context_vector(industry, None)
+        for department in get_departments(industry):
+            get_context_vector(industry, department)
+    translate_to_zh("Send an email when a new row is added to Google Sheets")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="n8n AI 導入顧問系統 Web Server")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", default="1",
+                        help="worker 程序數（'auto' = CPU 數；1 = 單一程序）")
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS,
+                        help="每個 worker 處理多少請求後汰換（0 = 不汰換）")
+    parser.add_argument("--pool-workers", type=int, default=None,
+                        help="每個程序分析痛點用的子程序數（預設：單一程序時為 CPU 數，"
+                             "pre-fork 時為 0）")
+    parser.add_argument("--n8n-api-base", default=None,
+                        help="n8n API 位址（預設取環境變數 N8N_API_BASE，否則為 api.n8n.io；"
+                             "可指向 tools/n8n_stub.py）")
+    parser.add_argument("--no-prefetch", action="store_true",
+                        help="不在背景預熱常見產業情境的社群模板")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="停用每個 IP 的限流、上游預算與公平排隊（壓力測試用）")
+    parser.add_argument("--allow-profiling", action="store_true",
+                        help="接受 /api/analyze?profile=sample|cprofile（或 X-Profile 標頭）剖析單一請求")
+    parser.add_argument("--sample-profile-every", type=float, default=0,
+                        help="全伺服器取樣：每隔幾秒把 collapsed stacks 寫到 .cache/profiles（0 = 停用）")
+    parser.add_argument("--log-level", default="INFO",
+                        help="日誌等級（JSON lines 寫到 stderr）")
+    parser.add_argument("--log-sample", type=float, default=request_log.SAMPLE_RATE,
+                        help="成功請求寫出存取日誌的比例（慢或失敗的請求一定寫出）")
+    parser.add_argument("--log-slow-ms", type=float, default=request_log.SLOW_MS,
+                        help="超過此毫秒數的請求視為慢請求")
+    args = parser.parse_args(argv)
+    args.workers = os.cpu_count() or 1 if args.workers == "auto" else int(args.workers)
+    if args.pool_workers is None:
+        args.pool_workers = 0 if args.workers > 1 else default_workers()
+    return args
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    POOL_WORKERS = args.pool_workers
+    PROFILING_ENABLED = args.allow_profiling
+    if args.n8n_api_base:
+        n8n_community.API_BASE = args.n8n_api_base.rstrip("/")
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
-    server = HTTPServer(("0.0.0.0", PORT), ConsultantHandler)
+    request_log.configure(args.log_level.upper(), sample_rate=args.log_sample, slow_ms=args.log_slow_ms)
+    prefork = args.workers > 1 and supports_prefork()
+    configure_rate_limit(workers=args.workers if prefork else 1, enabled=not args.no_rate_limit)
+    configure_upstream(workers=args.workers if prefork else 1)
+    # 單一程序時以執行緒處理請求（公平排隊需要多個請求同時等待）；
+    # pre-fork 的 worker 各自一次處理一個請求
+    server_class = HTTPServer if prefork else ThreadingHTTPServer
+    server = server_class(("0.0.0.0", args.port), ConsultantHandler)
+    server.daemon_threads = True
     print(f"\n  🤖 n8n AI 導入顧問系統 — Web Server")
-    print(f"  🌐 http://localhost:{PORT}")
+    print(f"  🌐 http://localhost:{args.port}")
     print(f"  📂 Serving from: {os.getcwd()}")
+    print(f"  🔌 n8n API: {n8n_community.API_BASE}")
+    if prefork:
+        print(f"  🧵 Pre-fork: {args.workers} workers (recycle after {args.max_requests} requests)")
     print(f"  ⏹  Press Ctrl+C to stop\n")
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
+    # 背景預熱常見情境（低優先順序；pre-fork 時每個 worker 啟動，檔案鎖確保只有一個在跑）
+    # 與全伺服器取樣（pre-fork 時每個 worker 各自寫出）
+    start_prefetch = (lambda: None) if args.no_prefetch else start_background
+
+    def start_background_tasks():
+        start_prefetch()
+        if args.sample_profile_every > 0:
+            profiling.ServerSampler(args.sample_profile_every).start()
+
+    if prefork:
+        PreforkServer(server, args.workers, warm_up=warm_up, max_requests=args.max_requests,
+                      post_fork=start_background_tasks).serve_forever()
         print("\n  👋 Server stopped.")
-        server.server_close()
+    else:
+        start_background_tasks()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n  👋 Server stopped.")
+            server.server_close()